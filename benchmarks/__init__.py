@@ -0,0 +1 @@
+"""Micro-benchmarks of the client's hot paths, run with `python -m benchmarks`"""
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+
+from . import bench_interpreter, bench_serialization, bench_time
+from .harness import Suite, compare, load, save
+
+_DEFAULT_SIZES = "1000,100000,1000000"
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                   description="Runs the client's micro-benchmarks.")
+  parser.add_argument("--filter", help="only run the benchmarks whose name contains it")
+  parser.add_argument("--sizes", default=_DEFAULT_SIZES,
+                      help="comma separated numbers of rows of the pandas benchmarks")
+  parser.add_argument("--min-time", type=float, default=1.,
+                      help="minimum duration of each benchmark, in seconds")
+  parser.add_argument("--quick", action="store_true",
+                      help="only run the smallest sizes, for a short time")
+  parser.add_argument("--output", help="JSON file the results are written to")
+  parser.add_argument("--baseline", help="JSON results to compare with")
+  parser.add_argument("--threshold", type=float, default=0.2,
+                      help="slowdown ratio over the baseline considered a regression")
+  args = parser.parse_args(argv)
+
+  sizes = [int(size) for size in args.sizes.split(",")]
+  min_time = args.min_time
+  if args.quick:
+    sizes = sizes[:1]
+    min_time = min(min_time, 0.1)
+
+  suite = Suite(args.filter, min_time)
+  modules = [bench_interpreter, bench_time, bench_serialization]
+  try:
+    from . import bench_pandas
+    modules.append(bench_pandas)
+  except ImportError:
+    sys.stdout.write("pandas isn't installed, skipping its benchmarks.\n")
+  for module in modules:
+    module.run(suite, sizes)
+
+  if args.output:
+    save(suite.results, args.output)
+
+  if args.baseline:
+    if not os.path.exists(args.baseline):
+      # Not comparing would let regressions through unnoticed
+      sys.stderr.write("No baseline found at {}, record one first with"
+                       " `make benchmark-baseline`.\n".format(args.baseline))
+      return 2
+    regressions = compare(suite.results, load(args.baseline), args.threshold)
+    for name, slowdown in regressions:
+      sys.stdout.write("REGRESSION {}: {:.0%} slower than the baseline\n"
+                       .format(name, slowdown))
+    if regressions:
+      return 1
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,61 @@
+import json
+import os
+import random
+import sys
+
+from craftai import Interpreter, Time
+
+from .trees import deep_tree, wide_tree
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+TREES_DIR = os.path.join(HERE, "..", "tests", "data", "interpreter", "trees")
+EXPECS_DIR = os.path.join(HERE, "..", "tests", "data", "interpreter", "expectations")
+
+def _corpus():
+  """Yields the trees of the interpreter test suite with the arguments of
+  their successful expectations"""
+  if not os.path.isdir(TREES_DIR) or not os.listdir(TREES_DIR):
+    sys.stdout.write("The interpreter test suite isn't checked out, skipping the"
+                     " benchmarks of its trees (`git submodule update --init`).\n")
+    return
+  for tree_file in sorted(os.listdir(TREES_DIR)):
+    with open(os.path.join(TREES_DIR, tree_file)) as f:
+      tree = json.load(f)
+    with open(os.path.join(EXPECS_DIR, tree_file)) as f:
+      expectations = json.load(f)
+    args_list = []
+    for expectation in expectations:
+      if expectation.get("error"):
+        continue
+      exp_time = expectation.get("time")
+      args = [expectation["context"]]
+      if exp_time:
+        args.append(Time(exp_time["t"], exp_time["tz"]))
+      args_list.append(args)
+    if args_list:
+      yield tree_file, tree, args_list
+
+def run(suite, _sizes):
+  for tree_file, tree, args_list in _corpus():
+    def decide_expectations(tree=tree, args_list=args_list):
+      for args in args_list:
+        Interpreter.decide(tree, [dict(args[0])] + args[1:])
+    suite.add("interpreter.decide.corpus.{}".format(tree_file),
+              decide_expectations, len(args_list))
+
+  rand = random.Random(0)
+  contexts = [{"x": rand.random()} for _ in range(1000)]
+  for depth in [5, 20]:
+    suite.add("interpreter.decide.deep_{}".format(depth),
+              lambda tree: [Interpreter.decide(tree, [context]) for context in contexts],
+              len(contexts),
+              setup=lambda depth=depth: deep_tree(depth))
+
+  for width in [10, 1000]:
+    # The last values are the slowest to match
+    wide_contexts = [{"e": "value_{}".format(width - 1 - i % 10)} for i in range(1000)]
+    suite.add("interpreter.decide.wide_{}".format(width),
+              lambda tree, contexts=wide_contexts: [Interpreter.decide(tree, [context])
+                                                    for context in contexts],
+              len(wide_contexts),
+              setup=lambda width=width: wide_tree(width))
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from craftai.pandas.client import operations_from_df
+from craftai.pandas.interpreter import Interpreter
+
+from .trees import mixed_tree
+
+def contexts_df(rows):
+  rand = np.random.RandomState(0)
+  enum_values = np.array(["value_{}".format(i) for i in range(4)], dtype=object)
+  df = pd.DataFrame({
+    "x": rand.random_sample(rows),
+    "e": enum_values[rand.randint(0, len(enum_values), rows)]
+  }, index=pd.date_range("2016-03-23", periods=rows, freq="s", tz="UTC"))
+  # Sparse columns are the usual case
+  df.loc[df.index[::3], "x"] = np.nan
+  return df
+
+def run(suite, sizes):
+  for rows in sizes:
+    suite.add("pandas.operations_from_df.{}".format(rows),
+              lambda df: list(operations_from_df(df, 200)),
+              rows,
+              setup=lambda rows=rows: contexts_df(rows))
+    suite.add("pandas.decide_from_contexts_df.{}".format(rows),
+              lambda inputs: Interpreter.decide_from_contexts_df(inputs[0],
+                                                                 inputs[1].ffill().bfill()),
+              rows,
+              setup=lambda rows=rows: (mixed_tree(8, 4), contexts_df(rows)))
@@ -0,0 +1,35 @@
+from craftai.errors import CraftAiBadRequestError
+from craftai.json_codec import _CODECS, get_codec, iter_json_array
+
+def operations(count):
+  return [{
+    "timestamp": 1458741230 + i,
+    "context": {
+      "presence": ["none", "occupant"][i % 2],
+      "lightIntensity": i * 0.25,
+      "lightbulbColor": ["black", "red", "green"][i % 3]
+    }
+  } for i in range(count)]
+
+def run(suite, _sizes):
+  for codec_class in _CODECS:
+    try:
+      codec = get_codec(codec_class.name)
+    except CraftAiBadRequestError:
+      # Not installed
+      continue
+    for count in [200, 10000]:
+      chunk = operations(count)
+      data = codec.dumps(chunk)
+      suite.add("serialization.{}.dumps.{}".format(codec.name, count),
+                lambda codec=codec, chunk=chunk: codec.dumps(chunk),
+                count)
+      suite.add("serialization.{}.loads.{}".format(codec.name, count),
+                lambda codec=codec, data=data: codec.loads(data),
+                count)
+
+  data = get_codec("json").dumps(operations(10000))
+  chunks = [data[i:i + 64 * 1024] for i in range(0, len(data), 64 * 1024)]
+  suite.add("serialization.iter_json_array.10000",
+            lambda: sum(1 for _ in iter_json_array(chunks)),
+            10000)
@@ -0,0 +1,18 @@
+from craftai import Time
+
+_COUNT = 1000
+_TIMESTAMP = 1458741230
+
+def run(suite, _sizes):
+  suite.add("time.from_int",
+            lambda: [Time(_TIMESTAMP + i) for i in range(_COUNT)],
+            _COUNT)
+  suite.add("time.from_int_with_offset",
+            lambda: [Time(_TIMESTAMP + i, "+02:00") for i in range(_COUNT)],
+            _COUNT)
+  suite.add("time.from_string",
+            lambda: [Time("2016-03-23T14:53:50+0100") for _ in range(_COUNT)],
+            _COUNT)
+  suite.add("time.to_dict",
+            lambda time=Time(_TIMESTAMP, "+02:00"): [time.to_dict() for _ in range(_COUNT)],
+            _COUNT)
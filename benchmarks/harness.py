@@ -0,0 +1,89 @@
+import functools
+import json
+import platform
+import sys
+import time
+
+import craftai
+
+# Each benchmark is run for at least this many seconds, in several rounds
+_MIN_TIME = 1.
+_ROUNDS = 5
+
+class Suite(object):
+  """Collects named benchmarks and measures them"""
+  def __init__(self, name_filter=None, min_time=_MIN_TIME):
+    self.name_filter = name_filter
+    self.min_time = min_time
+    self.results = {}
+
+  def add(self, name, function, items=1, setup=None):
+    """Measures `function`, which processes `items` items per call
+
+    With `setup`, the inputs of the benchmark are only built when it is
+    run, `function` being given the value returned by `setup`.
+    """
+    if self.name_filter and self.name_filter not in name:
+      return
+    if setup is not None:
+      seconds = measure(functools.partial(function, setup()), self.min_time)
+    else:
+      seconds = measure(function, self.min_time)
+    self.results[name] = {
+      "seconds": seconds,
+      "items": items,
+      "items_per_second": items / seconds if seconds else None
+    }
+    sys.stdout.write("{:<60} {:>12.6f}s {:>14.1f} items/s\n"
+                     .format(name, seconds, self.results[name]["items_per_second"] or 0))
+    sys.stdout.flush()
+
+def measure(function, min_time=_MIN_TIME):
+  """Returns the median duration of a call, in seconds
+
+  Calls are grouped in rounds lasting about `min_time / _ROUNDS` seconds
+  so that fast functions aren't measured below the timer's resolution.
+  """
+  start = time.time()
+  function()
+  first_duration = time.time() - start
+
+  number = max(1, int(min_time / _ROUNDS / max(first_duration, 1e-9)))
+  # Functions slower than the budget are only measured once more
+  rounds = _ROUNDS if first_duration * _ROUNDS < min_time * 2 else 1
+  durations = []
+  for _ in range(rounds):
+    start = time.time()
+    for _ in range(number):
+      function()
+    durations.append((time.time() - start) / number)
+  durations.sort()
+  return durations[len(durations) // 2]
+
+def save(results, path):
+  with open(path, "w") as f:
+    json.dump({
+      "environment": {
+        "craftai": craftai.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform()
+      },
+      "results": results
+    }, f, indent=2, sort_keys=True)
+
+def load(path):
+  with open(path) as f:
+    return json.load(f)["results"]
+
+def compare(results, baseline, threshold):
+  """Returns the benchmarks slower than in the baseline by more than
+  `threshold`, a ratio, with their slowdown"""
+  regressions = []
+  for name, result in sorted(results.items()):
+    if name not in baseline or not baseline[name]["seconds"]:
+      continue
+    slowdown = result["seconds"] / baseline[name]["seconds"] - 1
+    if slowdown > threshold:
+      regressions.append((name, slowdown))
+  return regressions
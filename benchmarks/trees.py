@@ -0,0 +1,49 @@
+"""Synthetic decision trees, in the API's format"""
+
+def _tree(context, output_type, root):
+  return {
+    "_version": "1.1.0",
+    "configuration": {
+      "context": dict(context, output={"type": output_type}),
+      "output": ["output"],
+      "time_quantum": 100
+    },
+    "trees": {"output": root}
+  }
+
+def deep_tree(depth):
+  """Tree splitting the continuous `x` in [0, 1) `depth` times, each split
+  having a leaf and a subtree for the next split"""
+  root = {"predicted_value": 1., "confidence": 0.9, "standard_deviation": 0.}
+  for level in reversed(range(depth)):
+    threshold = (level + 1.) / (depth + 1)
+    leaf = {
+      "predicted_value": level / (depth + 1.),
+      "confidence": 0.9,
+      "standard_deviation": 1. / (depth + 1),
+      "decision_rule": {"property": "x", "operator": "<", "operand": threshold}
+    }
+    root["decision_rule"] = {"property": "x", "operator": ">=", "operand": threshold}
+    root = {"children": [leaf, root]}
+
+  return _tree({"x": {"type": "continuous"}}, "continuous", root)
+
+def wide_tree(width):
+  """Tree with a single split on the enum `e`, in `width` values"""
+  children = [{
+    "predicted_value": "class_{}".format(i % 10),
+    "confidence": 0.8,
+    "decision_rule": {"property": "e", "operator": "is", "operand": "value_{}".format(i)}
+  } for i in range(width)]
+  return _tree({"e": {"type": "enum"}}, "enum", {"children": children})
+
+def mixed_tree(depth, width):
+  """Tree splitting on the enum `e` then `depth` times on the continuous `x`"""
+  deep = deep_tree(depth)["trees"]["output"]
+  children = []
+  for i in range(width):
+    child = dict(deep, decision_rule={"property": "e", "operator": "is",
+                                      "operand": "value_{}".format(i)})
+    children.append(child)
+  return _tree({"e": {"type": "enum"}, "x": {"type": "continuous"}}, "continuous",
+               {"children": children})
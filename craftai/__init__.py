@@ -6,11 +6,27 @@ __author__ = "craft ai"
 __license__ = "BSD-3-Clause"
 __copyright__ = "Copyright (c) 2016, craft ai"
 
+import sys
 
 from . import errors
-from .client import CraftAIClient as Client
-from .interpreter import Interpreter
-from .time import Time
+from .helpers import lazy_getattr
+
+# Submodules are only imported when their attribute is first accessed, for
+# `from craftai import Interpreter` not to import the HTTP stack.
+_LAZY_ATTRIBUTES = {
+  "Client": (".client", "CraftAIClient"),
+  "Interpreter": (".interpreter", "Interpreter"),
+  "Time": (".time", "Time")
+}
+
+__getattr__ = lazy_getattr(__name__, globals(), _LAZY_ATTRIBUTES)
+
+if sys.version_info < (3, 7):
+  # Modules' `__getattr__` isn't supported before Python 3.7. Importing the
+  # attributes explicitly also binds them for static analysis.
+  from .client import CraftAIClient as Client
+  from .interpreter import Interpreter
+  from .time import Time
 
 # Defining what will be imported when doing `from craftai import *`
 
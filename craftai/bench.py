@@ -0,0 +1,332 @@
+"""Load generator driving a client against a craft ai endpoint
+
+    python -m craftai.bench --fake --concurrency 16 --duration 30
+    python -m craftai.bench --url http://localhost:8080 --token <token>
+
+Workers share a single client and run a weighted mix of `add_operations`,
+`get_decision_tree`, `get_context_state` and local `decide` calls on a set
+of agents created for the run. The report gives, by call, the throughput,
+the latency percentiles, the error rate and the mean bytes sent and
+received on the wire, along with the client's transfer counters.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from craftai.client import CraftAIClient
+from craftai.errors import CraftAiError
+from craftai.instrumentation import Hooks
+from craftai.testing import FakeServer
+
+CONFIGURATION = {
+  "context": {
+    "presence": {"type": "enum"},
+    "lightIntensity": {"type": "continuous"},
+    "lightbulbColor": {"type": "enum"}
+  },
+  "output": ["lightbulbColor"],
+  "time_quantum": 100
+}
+
+DEFAULT_MIX = "add_operations=1,get_decision_tree=2,get_context_state=4,decide=8"
+
+_START_TIMESTAMP = 1458741230
+
+_PERCENTILES = [50, 90, 99]
+
+def _operations(rand, timestamp, count):
+  operations = []
+  for i in range(count):
+    presence = rand.choice(["none", "occupant"])
+    operations.append({
+      "timestamp": timestamp + 100 * i,
+      "context": {
+        "presence": presence,
+        "lightIntensity": round(rand.random(), 2),
+        "lightbulbColor": "red" if presence == "occupant" else "black"
+      }
+    })
+  return operations
+
+class _Agents(object):
+  """Agents of the run, with their next operations timestamp and tree"""
+  def __init__(self, agent_ids):
+    self.agent_ids = agent_ids
+    self._lock = threading.Lock()
+    self._next_timestamps = dict((agent_id, _START_TIMESTAMP) for agent_id in agent_ids)
+    self._trees = {}
+
+  def reserve_timestamps(self, agent_id, count):
+    with self._lock:
+      timestamp = self._next_timestamps[agent_id]
+      self._next_timestamps[agent_id] += 100 * count
+      return timestamp
+
+  def last_timestamp(self, agent_id):
+    with self._lock:
+      return self._next_timestamps[agent_id] - 100
+
+  def tree(self, agent_id):
+    with self._lock:
+      return self._trees.get(agent_id)
+
+  def set_tree(self, agent_id, tree):
+    with self._lock:
+      self._trees[agent_id] = tree
+
+class _Recorder(object):
+  """Latencies, errors and bytes by call"""
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.latencies = {}
+    self.errors = {}
+    self.bytes = {}
+
+  def record_bytes(self, call, bytes_sent, bytes_received):
+    with self._lock:
+      sent, received = self.bytes.get(call, (0, 0))
+      self.bytes[call] = (sent + bytes_sent, received + bytes_received)
+
+  def record(self, call, latency, error=None):
+    with self._lock:
+      self.latencies.setdefault(call, []).append(latency)
+      if error is not None:
+        errors = self.errors.setdefault(call, {})
+        error_name = type(error).__name__
+        errors[error_name] = errors.get(error_name, 0) + 1
+
+class _BytesHooks(Hooks):
+  """Attributes the bytes of each request to the call of the worker making it,
+  forwarding the events to the client's own hooks"""
+  def __init__(self, recorder, hooks=None):
+    self._recorder = recorder
+    self._hooks = hooks
+    self.current = threading.local()
+
+  def on_request_start(self, request):
+    if self._hooks is not None:
+      self._hooks.on_request_start(request)
+
+  def on_request_end(self, request, status, latency, bytes_sent, bytes_received,
+                     retries, error):
+    call = getattr(self.current, "call", None)
+    if call is not None:
+      self._recorder.record_bytes(call, bytes_sent, bytes_received or 0)
+    if self._hooks is not None:
+      self._hooks.on_request_end(request, status, latency, bytes_sent, bytes_received,
+                                 retries, error)
+
+  def on_decide(self, latency, decision, error):
+    if self._hooks is not None:
+      self._hooks.on_decide(latency, decision, error)
+
+def _call(client, agents, rand, call, operations_per_call):
+  agent_id = rand.choice(agents.agent_ids)
+  if call == "add_operations":
+    timestamp = agents.reserve_timestamps(agent_id, operations_per_call)
+    client.add_operations(agent_id, _operations(rand, timestamp, operations_per_call))
+  elif call == "get_decision_tree":
+    agents.set_tree(agent_id,
+                    client.get_decision_tree(agent_id, agents.last_timestamp(agent_id)))
+  elif call == "get_context_state":
+    client.get_context_state(agent_id,
+                             rand.randint(_START_TIMESTAMP, agents.last_timestamp(agent_id)))
+  elif call == "decide":
+    tree = agents.tree(agent_id)
+    if tree is None:
+      tree = client.get_decision_tree(agent_id, agents.last_timestamp(agent_id))
+      agents.set_tree(agent_id, tree)
+    CraftAIClient.decide(tree, {"presence": rand.choice(["none", "occupant"]),
+                                "lightIntensity": rand.random()})
+  else:
+    raise ValueError("Unknown call '{}'.".format(call))
+
+def parse_mix(mix):
+  """Parses `call=weight` pairs separated by commas"""
+  weights = []
+  for item in mix.split(","):
+    call, _, weight = item.partition("=")
+    weights.append((call.strip(), float(weight or 1)))
+  return weights
+
+def run(client, mix=DEFAULT_MIX, concurrency=8, duration=10., agents_count=4,
+        operations_per_call=100, seed=None, keep_agents=False):
+  """Runs the load and returns its report as a dict"""
+  weights = parse_mix(mix) if not isinstance(mix, list) else mix
+  calls = [call for call, _ in weights]
+  cumulated_weights = []
+  total = 0
+  for _, weight in weights:
+    total += weight
+    cumulated_weights.append(total)
+
+  rand = random.Random(seed)
+  run_id = uuid.UUID(int=rand.getrandbits(128)).hex[:8]
+  agents = _Agents(["bench_{}_{}".format(run_id, i) for i in range(agents_count)])
+  for agent_id in agents.agent_ids:
+    client.create_agent(CONFIGURATION, agent_id)
+    timestamp = agents.reserve_timestamps(agent_id, operations_per_call)
+    client.add_operations(agent_id, _operations(rand, timestamp, operations_per_call))
+
+  recorder = _Recorder()
+  hooks = client.config["hooks"]
+  bytes_hooks = _BytesHooks(recorder, hooks)
+  stats_before = client.stats
+  end = time.time() + duration
+
+  def work(worker_seed):
+    worker_rand = random.Random(worker_seed)
+    while time.time() < end:
+      drawn = worker_rand.random() * total
+      call = next(call for call, cumulated_weight in zip(calls, cumulated_weights)
+                  if drawn < cumulated_weight)
+      start = time.time()
+      bytes_hooks.current.call = call
+      try:
+        _call(client, agents, worker_rand, call, operations_per_call)
+        recorder.record(call, time.time() - start)
+      except CraftAiError as e:
+        recorder.record(call, time.time() - start, e)
+      finally:
+        bytes_hooks.current.call = None
+
+  workers = [threading.Thread(target=work, args=(rand.random(),)) for _ in range(concurrency)]
+  # Set in place, assigning the config would rebuild the client's state,
+  # e.g. the rate its limiter adapted.
+  client.config["hooks"] = bytes_hooks
+  try:
+    start = time.time()
+    for worker in workers:
+      worker.start()
+    for worker in workers:
+      worker.join()
+    elapsed = time.time() - start
+  finally:
+    client.config["hooks"] = hooks
+
+  stats_after = client.stats
+  if not keep_agents:
+    for agent_id in agents.agent_ids:
+      try:
+        client.delete_agent(agent_id)
+      except CraftAiError:
+        pass
+
+  return {
+    "concurrency": concurrency,
+    "duration": elapsed,
+    "calls": dict((call, _summary(recorder.latencies.get(call, []),
+                                  recorder.errors.get(call, {}),
+                                  recorder.bytes.get(call, (0, 0)),
+                                  elapsed))
+                  for call in calls),
+    "stats": dict((key, value - stats_before.get(key, 0))
+                  for key, value in stats_after.items())
+  }
+
+def _summary(latencies, errors, call_bytes, elapsed):
+  latencies = sorted(latencies)
+  errors_count = sum(errors.values())
+  bytes_sent, bytes_received = call_bytes
+  summary = {
+    "count": len(latencies),
+    "throughput": len(latencies) / elapsed if elapsed else 0.,
+    "error_rate": float(errors_count) / len(latencies) if latencies else 0.,
+    "errors": errors,
+    "bytes_sent": bytes_sent,
+    "bytes_received": bytes_received,
+    "mean_bytes_sent": float(bytes_sent) / len(latencies) if latencies else 0.,
+    "mean_bytes_received": float(bytes_received) / len(latencies) if latencies else 0.
+  }
+  for percentile in _PERCENTILES:
+    summary["p{}".format(percentile)] = _percentile(latencies, percentile)
+  summary["max"] = latencies[-1] if latencies else None
+  return summary
+
+def _percentile(sorted_values, percentile):
+  if not sorted_values:
+    return None
+  # Nearest-rank method
+  rank = max(1, int(round(percentile / 100. * len(sorted_values))))
+  return sorted_values[rank - 1]
+
+def format_report(report):
+  lines = ["{:<20} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9} {:>7} {:>10} {:>10}".format(
+    "call", "count", "calls/s", "p50 ms", "p90 ms", "p99 ms", "max ms", "errors",
+    "sent B", "recv B")]
+  for call, summary in sorted(report["calls"].items()):
+    lines.append("{:<20} {:>8} {:>10.1f} {:>9} {:>9} {:>9} {:>9} {:>6.1%} {:>10.0f} {:>10.0f}"
+                 .format(call, summary["count"], summary["throughput"],
+                         *([_format_ms(summary[key]) for key in ["p50", "p90", "p99", "max"]] +
+                           [summary["error_rate"], summary["mean_bytes_sent"],
+                            summary["mean_bytes_received"]])))
+  lines.append("")
+  lines.append("{} workers during {:.1f}s".format(report["concurrency"], report["duration"]))
+  for key, value in sorted(report["stats"].items()):
+    lines.append("{:<28} {:>14}".format(key, value))
+  return "\n".join(lines)
+
+def _format_ms(seconds):
+  return "-" if seconds is None else "{:.1f}".format(seconds * 1000)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="python -m craftai.bench",
+                                   description="Load generator for the craft ai client.")
+  target = parser.add_mutually_exclusive_group(required=True)
+  target.add_argument("--url", help="base URL of the API, e.g. http://localhost:8080")
+  target.add_argument("--fake", action="store_true",
+                      help="run against an in-process FakeServer")
+  parser.add_argument("--token", default=os.environ.get("CRAFT_TOKEN"),
+                      help="token to use with --url, defaults to $CRAFT_TOKEN")
+  parser.add_argument("--latency", type=float, default=0.,
+                      help="latency of the FakeServer, in seconds")
+  parser.add_argument("--rate-limit", type=int,
+                      help="requests per second allowed by the FakeServer")
+  parser.add_argument("--concurrency", type=int, default=8)
+  parser.add_argument("--duration", type=float, default=10.,
+                      help="duration of the load, in seconds")
+  parser.add_argument("--mix", default=DEFAULT_MIX,
+                      help="weights of the calls, defaults to '{}'".format(DEFAULT_MIX))
+  parser.add_argument("--agents", type=int, default=4, help="number of agents to create")
+  parser.add_argument("--operations-per-call", type=int, default=100)
+  parser.add_argument("--config", default="{}",
+                      help="""JSON of additional client configuration, e.g."""
+                      """ '{"compression": "gzip"}'""")
+  parser.add_argument("--seed", type=int)
+  parser.add_argument("--keep-agents", action="store_true",
+                      help="don't delete the agents created for the run")
+  parser.add_argument("--json", action="store_true", help="print the report as JSON")
+  args = parser.parse_args(argv)
+
+  server = None
+  cfg = {"maxConcurrency": args.concurrency}
+  if args.fake:
+    server = FakeServer(latency=args.latency, rate_limit=args.rate_limit).start()
+    cfg.update(server.client_config())
+  else:
+    if not args.token:
+      parser.error("a token is needed, give --token or set $CRAFT_TOKEN")
+    cfg.update({"token": args.token, "url": args.url})
+  cfg.update(json.loads(args.config))
+
+  try:
+    report = run(CraftAIClient(cfg), args.mix, args.concurrency, args.duration,
+                 args.agents, args.operations_per_call, args.seed, args.keep_agents)
+  finally:
+    if server is not None:
+      server.stop()
+
+  if args.json:
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+  else:
+    sys.stdout.write(format_report(report) + "\n")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,347 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import six
+
+from craftai import helpers
+from craftai.errors import CraftAiInternalError, CraftAiNetworkError, CraftAiTimeoutError
+from craftai.errors import CraftAiTooManyRequestsError, CraftAiError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Errors after which the operations are sent again later, the others mean
+# they would never be accepted.
+_TRANSIENT_ERRORS = (
+  CraftAiInternalError,
+  CraftAiNetworkError,
+  CraftAiTimeoutError,
+  CraftAiTooManyRequestsError
+)
+
+class OperationsBuffer(object):
+  """Buffers operations to send them by chunks from a background thread
+
+  `push` returns immediately, the operations of each agent are sent once a
+  chunk of the client's `operationsChunksSize` is full or the oldest one has
+  waited for `max_delay` seconds.
+
+  When the API is unreachable or too slow, the operations are written to
+  the append-only `spill_path` file, if given, or kept in memory, and sent
+  again in order every `retry_interval` seconds. Operations the API rejects
+  are dropped and counted in the metrics, as are the ones kept in memory
+  when the buffer is closed before they could be sent. Unreadable lines of
+  the spill file are moved to `spill_path + ".corrupt"`.
+
+  With `sort_by_timestamp`, the operations of an agent waiting together are
+  sorted by timestamp before being sent, to merge operations pushed out of
+  order by several producers.
+  """
+  def __init__(self, client, max_delay=1., chunk_size=None, spill_path=None,
+               retry_interval=5., request_timeout=30., sort_by_timestamp=False):
+    self._client = client
+    self.max_delay = max_delay
+    self.chunk_size = chunk_size or client.config["operationsChunksSize"]
+    self.spill_path = spill_path
+    self.retry_interval = retry_interval
+    self.request_timeout = request_timeout
+    self.sort_by_timestamp = sort_by_timestamp
+
+    self._condition = threading.Condition()
+    # Operations waiting to be sent and the time the oldest was pushed
+    self._pending = {}
+    self._pending_since = {}
+    self._pending_count = 0
+    self._in_flight_count = 0
+    # Chunks which failed when there is no spill file
+    self._failed = []
+    self._spilled_count = _count_spilled(spill_path)
+    self._next_retry = 0.
+    self._flush_requested = False
+    self._flush_failed = False
+    self._closed = False
+    self.last_error = None
+
+    self._counters = helpers.Counters()
+    self._flush_latency_max = 0.
+    self._flush_latency_last = None
+
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def push(self, agent_id, operation):
+    with self._condition:
+      if self._closed:
+        raise CraftAiError("Unable to push operations to a closed buffer.")
+      operations = self._pending.setdefault(agent_id, [])
+      operations.append(operation)
+      self._pending_count += 1
+      if len(operations) == 1:
+        # The flusher has to wait for this new delay
+        self._pending_since[agent_id] = time.time()
+        self._condition.notify()
+      elif len(operations) >= self.chunk_size:
+        self._condition.notify()
+
+  def flush(self, timeout=None):
+    """Sends the pending operations, including the spilled ones, and waits
+    for them to be sent. Returns False if some could not be sent before
+    the API failed or the `timeout` elapsed."""
+    end = None if timeout is None else time.time() + timeout
+    with self._condition:
+      self._flush_requested = True
+      self._flush_failed = False
+      self._next_retry = 0.
+      self._condition.notify()
+      while self._flush_requested:
+        remaining = None if end is None else end - time.time()
+        if remaining is not None and remaining <= 0:
+          return False
+        self._condition.wait(remaining)
+      return self._depth() == 0
+
+  def close(self, timeout=None):
+    """Flushes the operations and stops the background thread"""
+    flushed = self.flush(timeout)
+    with self._condition:
+      self._closed = True
+      self._condition.notify()
+    self._thread.join(timeout)
+    with self._condition:
+      lost_count = sum(len(operations) for _, operations in self._failed)
+      if lost_count:
+        # Without a spill file, nothing keeps them for a next buffer
+        self._counters.incr("dropped_operations", lost_count)
+        del self._failed[:]
+    if lost_count:
+      _LOGGER.warning("%d operations that could not be sent were dropped when closing"
+                      " the buffer, give it a spill_path to keep them.", lost_count)
+    return flushed
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_):
+    self.close()
+
+  @property
+  def metrics(self):
+    with self._condition:
+      metrics = self._counters.snapshot()
+      metrics.update({
+        "queue_depth": self._pending_count + self._in_flight_count,
+        "spilled_operations": self._spilled_count + sum(
+          len(operations) for _, operations in self._failed),
+        "flush_latency_last": self._flush_latency_last,
+        "flush_latency_max": self._flush_latency_max
+      })
+      if metrics.get("flushes"):
+        metrics["flush_latency_mean"] = metrics.pop("flush_latency_total") / metrics["flushes"]
+      return metrics
+
+  ####################
+  # Internal helpers #
+  ####################
+
+  def _depth(self):
+    return (self._pending_count + self._in_flight_count + self._spilled_count +
+            sum(len(operations) for _, operations in self._failed))
+
+  def _run(self):
+    while True:
+      with self._condition:
+        chunks, retry = self._wait_for_work()
+        if chunks is None:
+          return
+
+      # Unexpected errors, e.g. while writing the spill file, mustn't stop
+      # the thread: the spilled operations are retried later and the chunk
+      # which failed is dropped.
+      if retry:
+        try:
+          self._retry()
+        except Exception as e: #pylint: disable=W0703
+          self._on_transient_error(e)
+      for agent_id, operations in chunks:
+        try:
+          self._send_or_spill(agent_id, operations)
+        except Exception as e: #pylint: disable=W0703
+          self._drop(operations, e)
+
+      with self._condition:
+        self._in_flight_count = 0
+        # The flush can't complete once the API failed, until it is back
+        if self._flush_requested and (self._flush_failed or not (chunks or retry)):
+          self._flush_requested = False
+          self._condition.notify_all()
+
+  def _wait_for_work(self):
+    """Returns the chunks to send and whether the failed ones have to be
+    retried, or None when closed"""
+    while True:
+      now = time.time()
+      has_failed = self._spilled_count or self._failed
+      retry = bool(has_failed) and now >= self._next_retry
+      ready = [agent_id for agent_id, operations in self._pending.items()
+               if operations and (self._flush_requested or self._closed or
+                                  len(operations) >= self.chunk_size or
+                                  now - self._pending_since[agent_id] >= self.max_delay)]
+      if ready or retry:
+        chunks = []
+        for agent_id in ready:
+          operations = self._pending.pop(agent_id)
+          del self._pending_since[agent_id]
+          if self.sort_by_timestamp:
+            operations.sort(key=lambda operation: operation["timestamp"])
+          for start in range(0, len(operations), self.chunk_size):
+            chunks.append((agent_id, operations[start:start + self.chunk_size]))
+        self._in_flight_count = sum(len(operations) for _, operations in chunks)
+        self._pending_count -= self._in_flight_count
+        return chunks, retry
+
+      if self._flush_requested:
+        # Nothing left to send, or only failed operations waiting for their
+        # retry, the flush is done.
+        return [], False
+      if self._closed:
+        return None, False
+
+      timeouts = [self._pending_since[agent_id] + self.max_delay - now
+                  for agent_id in self._pending if self._pending[agent_id]]
+      if has_failed:
+        timeouts.append(self._next_retry - now)
+      self._condition.wait(max(0.001, min(timeouts)) if timeouts else None)
+
+  def _send(self, agent_id, operations):
+    start = time.time()
+    self._client.add_operations(agent_id, operations, deadline=self.request_timeout)
+    latency = time.time() - start
+    with self._condition:
+      self._counters.incr("flushes")
+      self._counters.incr("flushed_operations", len(operations))
+      self._counters.incr("flush_latency_total", latency)
+      self._flush_latency_last = latency
+      self._flush_latency_max = max(self._flush_latency_max, latency)
+
+  def _send_or_spill(self, agent_id, operations):
+    with self._condition:
+      # Sending before the failed operations are would break their order
+      must_spill = bool(self._spilled_count or self._failed)
+    if not must_spill:
+      try:
+        self._send(agent_id, operations)
+        return
+      except _TRANSIENT_ERRORS as e:
+        self._on_transient_error(e)
+      except CraftAiError as e:
+        self._drop(operations, e)
+        return
+
+    if self.spill_path is not None:
+      with open(self.spill_path, "a") as f:
+        f.write(json.dumps({"agent_id": agent_id, "operations": operations},
+                           default=_json_default) + "\n")
+      with self._condition:
+        self._spilled_count += len(operations)
+    else:
+      with self._condition:
+        self._failed.append((agent_id, operations))
+
+  def _retry(self):
+    """Sends the failed operations in order, stopping at the first failure"""
+    with self._condition:
+      failed = list(self._failed)
+    sent = 0
+    for agent_id, operations in failed:
+      if not self._send_failed(agent_id, operations):
+        break
+      sent += 1
+    with self._condition:
+      del self._failed[:sent]
+
+    if self.spill_path is None or not os.path.exists(self.spill_path):
+      return
+    with open(self.spill_path) as f:
+      lines = f.readlines()
+    for i, line in enumerate(lines):
+      if not line.strip():
+        continue
+      spilled = _parse_spilled(line)
+      if spilled is None:
+        self._quarantine(line)
+        continue
+      if not self._send_failed(spilled["agent_id"], spilled["operations"]):
+        # The remaining operations are kept for the next retry
+        with open(self.spill_path + ".tmp", "w") as f:
+          f.writelines(lines[i:])
+        os.rename(self.spill_path + ".tmp", self.spill_path)
+        return
+      with self._condition:
+        self._spilled_count -= len(spilled["operations"])
+    os.remove(self.spill_path)
+
+  def _quarantine(self, line):
+    """Moves an unreadable spilled line aside, for it not to block the others"""
+    with open(self.spill_path + ".corrupt", "a") as f:
+      f.write(line if line.endswith("\n") else line + "\n")
+    with self._condition:
+      self.last_error = CraftAiError("Unreadable line of the spill file moved to {}."
+                                     .format(self.spill_path + ".corrupt"))
+      self._counters.incr("errors")
+      self._counters.incr("corrupt_spilled_lines")
+
+  def _send_failed(self, agent_id, operations):
+    try:
+      self._send(agent_id, operations)
+      return True
+    except _TRANSIENT_ERRORS as e:
+      self._on_transient_error(e)
+      return False
+    except CraftAiError as e:
+      self._drop(operations, e)
+      return True
+
+  def _on_transient_error(self, error):
+    with self._condition:
+      self.last_error = error
+      self._counters.incr("errors")
+      self._next_retry = time.time() + self.retry_interval
+      self._flush_failed = True
+
+  def _drop(self, operations, error):
+    with self._condition:
+      self.last_error = error
+      self._counters.incr("errors")
+      self._counters.incr("dropped_operations", len(operations))
+
+def _count_spilled(spill_path):
+  if spill_path is None or not os.path.exists(spill_path):
+    return 0
+  count = 0
+  with open(spill_path) as f:
+    for line in f:
+      spilled = _parse_spilled(line) if line.strip() else None
+      if spilled is not None:
+        count += len(spilled["operations"])
+  return count
+
+def _parse_spilled(line):
+  """Returns the spilled chunk, or None if the line is unreadable, e.g.
+  truncated by a crash while it was written"""
+  try:
+    spilled = json.loads(line)
+    if (isinstance(spilled["agent_id"], six.string_types) and
+        isinstance(spilled["operations"], list)):
+      return spilled
+  except (ValueError, KeyError, TypeError):
+    pass
+  return None
+
+def _json_default(obj):
+  # NumPy scalars, as produced by the pandas client's conversions
+  if hasattr(obj, "tolist"):
+    return obj.tolist()
+  raise TypeError("{} is not JSON serializable".format(obj))
@@ -0,0 +1,69 @@
+# Weight of the last observation in the moving averages
+_SMOOTHING = 0.5
+
+# Maximum growth factor of the chunk size between two chunks
+_MAX_GROWTH = 2
+
+class FixedChunkSizer(object):
+  """Sends chunks of a fixed number of operations"""
+  def __init__(self, size):
+    self.size = size
+    self.sizes = []
+
+  def record(self, operations_count, payload_bytes, latency):
+    #pylint: disable=W0613
+    self.sizes.append(operations_count)
+
+  def can_split(self, operations_count):
+    #pylint: disable=W0613,R0201
+    return False
+
+  def back_off(self):
+    pass
+
+class AdaptiveChunkSizer(FixedChunkSizer):
+  """Tunes the number of operations per chunk from the observed payloads
+
+  The size is chosen so that a chunk weighs about `target_bytes` and, given
+  the observed throughput, is sent in about `target_latency` seconds. It is
+  halved when the API rejects a chunk as too large or times out.
+  """
+  def __init__(self, size, min_size, max_size, target_bytes, target_latency):
+    super(AdaptiveChunkSizer, self).__init__(size)
+    self.min_size = min_size
+    self.max_size = max_size
+    self.target_bytes = target_bytes
+    self.target_latency = target_latency
+    self._bytes_per_operation = None
+    self._bytes_per_second = None
+    self.size = self._clamp(size)
+
+  def _clamp(self, size):
+    return max(self.min_size, min(self.max_size, int(size)))
+
+  def record(self, operations_count, payload_bytes, latency):
+    super(AdaptiveChunkSizer, self).record(operations_count, payload_bytes, latency)
+    if operations_count == 0:
+      return
+
+    self._bytes_per_operation = _smooth(self._bytes_per_operation,
+                                        float(payload_bytes) / operations_count)
+    size = self.target_bytes / self._bytes_per_operation
+
+    if latency > 0:
+      self._bytes_per_second = _smooth(self._bytes_per_second, payload_bytes / latency)
+      size = min(size,
+                 self._bytes_per_second * self.target_latency / self._bytes_per_operation)
+
+    self.size = self._clamp(min(size, self.size * _MAX_GROWTH))
+
+  def can_split(self, operations_count):
+    return operations_count > self.min_size
+
+  def back_off(self):
+    self.size = self._clamp(self.size // 2)
+
+def _smooth(average, value):
+  if average is None:
+    return value
+  return _SMOOTHING * value + (1 - _SMOOTHING) * average
@@ -1,12 +1,48 @@
-import json
+import numbers
+import threading
+import time
+
+from collections import OrderedDict
+from itertools import islice
+
 import requests
 import six
 
+from six.moves.urllib.parse import urlencode
+
 from craftai import helpers
+from craftai.chunking import AdaptiveChunkSizer, FixedChunkSizer
+from craftai.compression import ACCEPT_ENCODING_HEADER, ENCODINGS, compress
+from craftai.concurrency import parallel_imap, parallel_map
+from craftai.conditional import ValidatorsStore, conditional_headers
+from craftai.context_changes import SentContexts
+from craftai.deadline import to_deadline
 from craftai.errors import CraftAiCredentialsError, CraftAiBadRequestError, CraftAiNotFoundError
 from craftai.errors import CraftAiUnknownError, CraftAiInternalError
+from craftai.errors import CraftAiError, CraftAiNetworkError, CraftAiTimeoutError
+from craftai.errors import CraftAiTooManyRequestsError
+from craftai.instrumentation import Hooks
 from craftai.interpreter import Interpreter
+from craftai.json_codec import get_codec, iter_json_array
 from craftai.jwt_decode import jwt_decode
+from craftai.local_http import JSONConnection, raise_error_json
+from craftai.rate_limit import RateLimiter, endpoint_class, parse_retry_after
+from craftai.singleflight import SingleFlight
+
+# Responses on which the adaptive chunk sizing splits the chunk and retries,
+# the API not having added any of its operations. After a gateway or a read
+# timeout, the operations may have been added and sending them again would
+# duplicate them.
+_CHUNK_BACK_OFF_STATUSES = (
+  requests.codes.request_entity_too_large,
+  requests.codes.request_timeout
+)
+
+# Header giving the URL of the next page of a paginated response
+_NEXT_PAGE_HEADER = "x-craft-ai-next-page-url"
+
+# Size of the chunks read from the streamed responses
+_STREAM_CHUNK_SIZE = 64 * 1024
 
 class CraftAIClient(object):
   """Client class for craft ai's API"""
@@ -15,6 +51,19 @@ class CraftAIClient(object):
     self._base_url = ""
     self._headers = {}
     self._config = {}
+    self._codec = None
+    self._validators = None
+    self._single_flight = None
+    self._rate_limiter = None
+    self._sidecar = None
+    self._sent_contexts = None
+    self._requests_session = requests.Session()
+    self._counters = helpers.Counters()
+    # Decision tree cache refreshes in progress and, by agent, the number
+    # of invalidations to discard refreshes started before the last one.
+    self._tree_cache_lock = threading.Lock()
+    self._tree_cache_refreshes = set()
+    self._tree_cache_generations = {}
 
     try:
       self.config = cfg
@@ -25,6 +74,16 @@ class CraftAIClient(object):
   def config(self):
     return self._config
 
+  @property
+  def stats(self):
+    """Returns a snapshot of the client's transfer counters.
+
+    `bytes_sent_raw` and `bytes_received_raw` count the JSON payloads
+    while `bytes_sent_wire` and `bytes_received_wire` count what actually
+    went through the network, i.e. after compression.
+    """
+    return self._counters.snapshot()
+
   @config.setter
   def config(self, cfg):
     cfg = cfg.copy()
@@ -49,6 +108,84 @@ class CraftAIClient(object):
                                     """ or invalid owner provided.""")
     if not isinstance(cfg.get("operationsChunksSize"), six.integer_types):
       cfg["operationsChunksSize"] = 200
+    if not isinstance(cfg.get("operationsAdaptiveChunks"), bool):
+      cfg["operationsAdaptiveChunks"] = False
+    if not isinstance(cfg.get("operationsChunksMinSize"), six.integer_types):
+      cfg["operationsChunksMinSize"] = 10
+    if not isinstance(cfg.get("operationsChunksMaxSize"), six.integer_types):
+      cfg["operationsChunksMaxSize"] = 10000
+    if not isinstance(cfg.get("operationsChunksTargetBytes"), six.integer_types):
+      cfg["operationsChunksTargetBytes"] = 512 * 1024
+    if not isinstance(cfg.get("operationsChunksTargetLatency"), numbers.Real):
+      cfg["operationsChunksTargetLatency"] = 2.
+    # Only sound when this client is the single writer of its agents'
+    # operations, see SentContexts
+    if not isinstance(cfg.get("operationsChangesOnly"), bool):
+      cfg["operationsChangesOnly"] = False
+    if cfg["operationsChunksMinSize"] > cfg["operationsChunksMaxSize"]:
+      raise CraftAiBadRequestError("""Unable to create client with"""
+                                   """ operationsChunksMinSize greater"""
+                                   """ than operationsChunksMaxSize.""")
+    cfg["compression"] = cfg.get("compression")
+    if cfg.get("compression") not in ENCODINGS:
+      raise CraftAiBadRequestError("""Unable to create client with"""
+                                   """ invalid compression provided."""
+                                   """ It should be one of 'gzip' or"""
+                                   """ 'deflate'.""")
+    if not isinstance(cfg.get("compressionThreshold"), six.integer_types):
+      cfg["compressionThreshold"] = 1024
+    if (not isinstance(cfg.get("compressionLevel"), six.integer_types) or
+        not 0 <= cfg.get("compressionLevel") <= 9):
+      cfg["compressionLevel"] = 6
+    if not isinstance(cfg.get("connectTimeout"), numbers.Real):
+      cfg["connectTimeout"] = 10.
+    if not isinstance(cfg.get("readTimeout"), numbers.Real):
+      cfg["readTimeout"] = 120.
+    cfg["decisionTreeCache"] = cfg.get("decisionTreeCache")
+    if cfg["decisionTreeCache"] is not None and not all(
+        callable(getattr(cfg["decisionTreeCache"], method, None))
+        for method in ["get", "set", "invalidate"]):
+      raise CraftAiBadRequestError("""Unable to create client with invalid"""
+                                   """ decision tree cache, it should provide"""
+                                   """ 'get', 'set' and 'invalidate' methods.""")
+    if not isinstance(cfg.get("decisionTreeCacheTtl"), numbers.Real):
+      cfg["decisionTreeCacheTtl"] = 300
+    if (not isinstance(cfg.get("decisionTreeCacheBucket"), six.integer_types) or
+        cfg.get("decisionTreeCacheBucket") <= 0):
+      cfg["decisionTreeCacheBucket"] = 600
+    if not isinstance(cfg.get("conditionalRequests"), bool):
+      cfg["conditionalRequests"] = False
+    if not isinstance(cfg.get("conditionalRequestsMaxEntries"), six.integer_types):
+      cfg["conditionalRequestsMaxEntries"] = 256
+    if not isinstance(cfg.get("coalesceRequests"), bool):
+      cfg["coalesceRequests"] = False
+    cfg["hooks"] = cfg.get("hooks")
+    if cfg["hooks"] is not None and not isinstance(cfg["hooks"], Hooks):
+      raise CraftAiBadRequestError("""Unable to create client with invalid"""
+                                   """ hooks, they should be an instance of"""
+                                   """ craftai.instrumentation.Hooks.""")
+    cfg["rateLimit"] = cfg.get("rateLimit")
+    if cfg["rateLimit"] is not None and (not isinstance(cfg["rateLimit"], numbers.Real) or
+                                         cfg["rateLimit"] <= 0):
+      raise CraftAiBadRequestError("""Unable to create client with invalid"""
+                                   """ rate limit, it should be a positive"""
+                                   """ number of requests per second.""")
+    cfg["maxInFlight"] = cfg.get("maxInFlight")
+    if cfg["maxInFlight"] is not None and (not isinstance(cfg["maxInFlight"], six.integer_types) or
+                                           cfg["maxInFlight"] <= 0):
+      raise CraftAiBadRequestError("""Unable to create client with invalid"""
+                                   """ maximum number of requests in flight,"""
+                                   """ it should be a positive integer.""")
+    if not isinstance(cfg.get("rateLimitPerEndpoint"), bool):
+      cfg["rateLimitPerEndpoint"] = False
+    if not isinstance(cfg.get("maxRetries"), six.integer_types):
+      cfg["maxRetries"] = 3
+    cfg["operationsSidecar"] = cfg.get("operationsSidecar")
+    if (cfg["operationsSidecar"] is not None and
+        not isinstance(cfg["operationsSidecar"], six.string_types)):
+      raise CraftAiBadRequestError("""Unable to create client with invalid"""
+                                   """ operations sidecar, it should be the"""
+                                   """ path of its Unix socket or its URL.""")
     if not isinstance(cfg.get("url"), six.string_types):
       cfg["url"] = "https://beta.craft.ai"
     if cfg.get("url").endswith("/"):
@@ -56,8 +193,25 @@ class CraftAIClient(object):
                                    """ invalid url provided. The url"""
                                    """ should not terminate with a"""
                                    """ slash.""")
+    self._codec = get_codec(cfg.get("jsonCodec"))
+    self._validators = (ValidatorsStore(cfg["conditionalRequestsMaxEntries"])
+                        if cfg["conditionalRequests"] else None)
+    self._single_flight = SingleFlight() if cfg["coalesceRequests"] else None
+    self._sent_contexts = SentContexts() if cfg["operationsChangesOnly"] else None
+    self._rate_limiter = RateLimiter(cfg["rateLimit"], cfg["maxInFlight"],
+                                     cfg["rateLimitPerEndpoint"])
+    self._sidecar = (JSONConnection(cfg["operationsSidecar"], cfg["readTimeout"])
+                     if cfg["operationsSidecar"] else None)
+    if not isinstance(cfg.get("maxConcurrency"), six.integer_types):
+      cfg["maxConcurrency"] = 8
     self._config = cfg
 
+    # Concurrent calls each need a pooled connection
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=max(10, cfg["maxConcurrency"]))
+    self._requests_session.mount("http://", adapter)
+    self._requests_session.mount("https://", adapter)
+
     self._base_url = "{}/api/v1/{}/{}".format(self.config["url"],
                                               self.config["owner"],
                                               self.config["project"])
@@ -71,7 +225,7 @@ class CraftAIClient(object):
   # Agent methods #
   #################
 
-  def create_agent(self, configuration, agent_id=""):
+  def create_agent(self, configuration, agent_id="", deadline=None):
     # Building final headers
     ct_header = {"Content-Type": "application/json; charset=utf-8"}
     headers = helpers.join_dicts(self._headers, ct_header)
@@ -84,19 +238,23 @@ class CraftAIClient(object):
       payload["id"] = agent_id
 
     try:
-      json_pl = json.dumps(payload)
-    except TypeError as e:
+      json_pl = self._codec.dumps(payload)
+    except (TypeError, ValueError, OverflowError) as e:
       raise CraftAiBadRequestError("Invalid configuration or agent id given. {}"
                                    .format(e.__str__()))
 
     req_url = "{}/agents".format(self._base_url)
-    resp = requests.post(req_url, headers=headers, data=json_pl)
+    resp = self._request("POST", req_url, headers, json_pl, deadline)
 
     agent = self._decode_response(resp)
 
+    if self._sent_contexts is not None:
+      # A previous agent with the same id had another context
+      self._sent_contexts.forget(agent["id"])
+
     return agent
 
-  def get_agent(self, agent_id):
+  def get_agent(self, agent_id, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
@@ -104,24 +262,20 @@ class CraftAIClient(object):
     headers = self._headers.copy()
 
     req_url = "{}/agents/{}".format(self._base_url, agent_id)
-    resp = requests.get(req_url, headers=headers)
-
-    agent = self._decode_response(resp)
+    agent, _ = self._get(req_url, headers, deadline)
 
     return agent
 
-  def list_agents(self):
+  def list_agents(self, deadline=None):
     # No supplementary headers needed
     headers = self._headers.copy()
 
     req_url = "{}/agents".format(self._base_url)
-    resp = requests.get(req_url, headers=headers)
-
-    agents = self._decode_response(resp)
+    agents, _ = self._get(req_url, headers, deadline)
 
     return agents["agentsList"]
 
-  def delete_agent(self, agent_id):
+  def delete_agent(self, agent_id, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
@@ -130,13 +284,17 @@ class CraftAIClient(object):
     headers = self._headers.copy()
 
     req_url = "{}/agents/{}".format(self._base_url, agent_id)
-    resp = requests.delete(req_url, headers=headers)
+    resp = self._request("DELETE", req_url, headers, deadline=deadline)
+
+    self._invalidate_decision_trees(agent_id)
+    if self._sent_contexts is not None:
+      self._sent_contexts.forget(agent_id)
 
     decoded_resp = self._decode_response(resp)
 
     return decoded_resp
 
-  def get_shared_agent_inspector_url(self, agent_id, timestamp=None):
+  def get_shared_agent_inspector_url(self, agent_id, timestamp=None, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
@@ -144,7 +302,7 @@ class CraftAIClient(object):
     headers = self._headers.copy()
 
     req_url = "{}/agents/{}/shared".format(self._base_url, agent_id)
-    resp = requests.get(req_url, headers=headers)
+    resp = self._request("GET", req_url, headers, deadline=deadline)
 
     url = self._decode_response(resp)
 
@@ -153,7 +311,7 @@ class CraftAIClient(object):
 
     return url["shortUrl"]
 
-  def delete_shared_agent_inspector_url(self, agent_id):
+  def delete_shared_agent_inspector_url(self, agent_id, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
@@ -161,64 +319,312 @@ class CraftAIClient(object):
     headers = self._headers.copy()
 
     req_url = "{}/agents/{}/shared".format(self._base_url, agent_id)
-    resp = requests.delete(req_url, headers=headers)
+    resp = self._request("DELETE", req_url, headers, deadline=deadline)
 
     decoded_resp = self._decode_response(resp)
 
     return decoded_resp
 
+  def create_agents(self, configurations, concurrency=None, deadline=None):
+    """Creates many agents concurrently, yielding results as they complete.
+
+    `configurations` are dicts holding a `configuration` and optionally an
+    agent `id`. Yields dicts holding the given `agent_id` and either the
+    created `agent` or the `error` raised when creating it.
+    """
+    deadline = to_deadline(deadline)
+    for index, agent, error in self._run_concurrently(
+        lambda index: self.create_agent(configurations[index]["configuration"],
+                                        configurations[index].get("id", ""),
+                                        deadline),
+        range(len(configurations)),
+        concurrency):
+      # Without a given id, the agent's is the one generated by craft ai
+      agent_id = configurations[index].get("id") or (agent or {}).get("id")
+      yield _bulk_result(agent_id, "agent", agent, error)
+
+  def get_agents(self, agent_ids, concurrency=None, deadline=None):
+    """Retrieves many agents concurrently, yielding results as they complete.
+
+    Yields dicts holding the `agent_id` and either the `agent` or the
+    `error` raised when retrieving it.
+    """
+    deadline = to_deadline(deadline)
+    for agent_id, agent, error in self._run_concurrently(
+        lambda agent_id: self.get_agent(agent_id, deadline),
+        OrderedDict.fromkeys(agent_ids),
+        concurrency):
+      yield _bulk_result(agent_id, "agent", agent, error)
+
+  def delete_agents(self, agent_ids, concurrency=None, deadline=None):
+    """Deletes many agents concurrently, yielding results as they complete.
+
+    Yields dicts holding the `agent_id` and either the deleted `agent` or the
+    `error` raised when deleting it.
+    """
+    deadline = to_deadline(deadline)
+    for agent_id, agent, error in self._run_concurrently(
+        lambda agent_id: self.delete_agent(agent_id, deadline),
+        OrderedDict.fromkeys(agent_ids),
+        concurrency):
+      yield _bulk_result(agent_id, "agent", agent, error)
+
   ###################
   # Context methods #
   ###################
 
-  def add_operations(self, agent_id, operations):
+  def add_operations(self, agent_id, operations, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
+    try:
+      operations = iter(operations)
+    except TypeError:
+      raise CraftAiBadRequestError("Invalid operations given, it should be an iterable.")
+
+    if self._sidecar is not None:
+      # Knowing the operations of all the processes, the sidecar's own
+      # client is the one dropping the unchanged properties.
+      return self._add_operations_to_sidecar(agent_id, operations, deadline)
+
+    if self._sent_contexts is None:
+      return self._add_operations_chunks(agent_id, operations, deadline)
+
+    changes_filter = self._sent_contexts.begin(agent_id)
+    sent = False
+    try:
+      added_operations = self._add_operations_chunks(agent_id,
+                                                     changes_filter.filter(operations),
+                                                     deadline, changes_filter)
+      sent = True
+    finally:
+      self._sent_contexts.end(agent_id, changes_filter, sent)
+      self._counters.incr("unchanged_operations_dropped", changes_filter.dropped_operations)
+      self._counters.incr("unchanged_properties_dropped", changes_filter.dropped_properties)
+    return added_operations
+
+  def _add_operations_chunks(self, agent_id, operations, deadline, changes_filter=None):
     # Building final headers
     ct_header = {"Content-Type": "application/json; charset=utf-8"}
     headers = helpers.join_dicts(self._headers, ct_header)
 
-    session = requests.Session()
-    offset = 0
-
+    # The deadline is shared by all the chunks
+    deadline = to_deadline(deadline)
+    req_url = "{}/agents/{}/context".format(self._base_url, agent_id)
+    sizer = self._chunk_sizer()
+    operations_count = 0
+
+    # Chunks are lazily taken from the given iterable, at least one chunk is
+    # sent to let the API answer on empty operations sets, unless all the
+    # operations were dropped as unchanged.
+    chunk_size = sizer.size
+    chunk = list(islice(operations, chunk_size))
+    chunk_index = 0
+    all_unchanged = (not chunk and changes_filter is not None and
+                     changes_filter.dropped_operations > 0)
+    while not all_unchanged:
+      try:
+        self._add_operations_chunk(req_url, headers, chunk, sizer, deadline, chunk_index)
+      finally:
+        # Cached trees are outdated as soon as an operation might have
+        # been added.
+        self._invalidate_decision_trees(agent_id)
+
+      operations_count += len(chunk)
+      chunk_index += 1
+
+      if len(chunk) < chunk_size:
+        break
+      chunk_size = sizer.size
+      chunk = list(islice(operations, chunk_size))
+      if not chunk:
+        break
+
+    added_operations = {
+      "message": "Successfully added %i operation(s) to the agent \"%s/%s/%s\" context."
+                 % (operations_count, self.config["owner"], self.config["project"], agent_id)
+    }
+    if self.config["operationsAdaptiveChunks"]:
+      added_operations["chunksSizes"] = sizer.sizes
+
+    return added_operations
+
+  def _add_operations_to_sidecar(self, agent_id, operations, deadline):
+    # Operations are posted by chunks lazily taken from the iterable, like
+    # they are sent to the API
+    deadline = to_deadline(deadline)
+    chunk_size = self.config["operationsChunksSize"]
+    operations_count = 0
+    chunk = list(islice(operations, chunk_size))
     while True:
-      next_offset = offset + self.config["operationsChunksSize"]
-
       try:
-        json_pl = json.dumps(operations[offset:next_offset])
-      except TypeError as e:
+        json_pl = self._codec.dumps({
+          "owner": self.config["owner"],
+          "project": self.config["project"],
+          "agent_id": agent_id,
+          "operations": chunk
+        })
+      except (TypeError, ValueError, OverflowError) as e:
         raise CraftAiBadRequestError("Invalid configuration or agent id given. {}"
                                      .format(e.__str__()))
 
-      req_url = "{}/agents/{}/context".format(self._base_url, agent_id)
-      resp = session.post(req_url, headers=headers, data=json_pl)
+      timeout = self.config["readTimeout"]
+      if deadline is not None:
+        timeout = min(timeout, deadline.check())
+      try:
+        status, result = self._sidecar.post("/operations", json_pl, timeout)
+      finally:
+        self._invalidate_decision_trees(agent_id)
+      if status != 200:
+        raise_error_json(result)
+
+      operations_count += len(chunk)
+      if len(chunk) < chunk_size:
+        break
+      chunk = list(islice(operations, chunk_size))
+      if not chunk:
+        break
+
+    return {
+      "message": "Successfully sent %i operation(s) for the agent \"%s/%s/%s\" to the"
+                 " operations sidecar." % (operations_count, self.config["owner"],
+                                           self.config["project"], agent_id)
+    }
+
+  def _chunk_sizer(self):
+    if self.config["operationsAdaptiveChunks"]:
+      return AdaptiveChunkSizer(self.config["operationsChunksSize"],
+                                self.config["operationsChunksMinSize"],
+                                self.config["operationsChunksMaxSize"],
+                                self.config["operationsChunksTargetBytes"],
+                                self.config["operationsChunksTargetLatency"])
+    return FixedChunkSizer(self.config["operationsChunksSize"])
+
+  def _add_operations_chunk(self, req_url, headers, chunk, sizer, deadline, chunk_index):
+    try:
+      json_pl = self._codec.dumps(chunk)
+    except (TypeError, ValueError, OverflowError) as e:
+      raise CraftAiBadRequestError("Invalid configuration or agent id given. {}"
+                                   .format(e.__str__()))
 
-      self._decode_response(resp)
+    start = helpers.monotonic()
+    try:
+      resp = self._request("POST", req_url, headers, json_pl, deadline,
+                           chunk_index=chunk_index)
+      too_large = resp.status_code in _CHUNK_BACK_OFF_STATUSES
+    except CraftAiTimeoutError as e:
+      # Only the chunks which couldn't be sent in time by themselves are
+      # split, not the ones for which the whole call's deadline has been
+      # exceeded nor the ones the API might have received.
+      if deadline is not None and deadline.remaining() <= 0:
+        raise
+      if e.request_sent or not sizer.can_split(len(chunk)):
+        raise
+      too_large = True
+
+    if too_large and sizer.can_split(len(chunk)):
+      # The chunk is too large for the API, it is sent again in two halves
+      sizer.back_off()
+      half = len(chunk) // 2
+      self._add_operations_chunk(req_url, headers, chunk[:half], sizer, deadline, chunk_index)
+      self._add_operations_chunk(req_url, headers, chunk[half:], sizer, deadline, chunk_index)
+      return
+
+    self._decode_response(resp)
+
+    sizer.record(len(chunk), len(json_pl), helpers.monotonic() - start)
+
+  def get_operations_list(self, agent_id, start=None, end=None, parallelism=None,
+                          deadline=None):
+    # Raises an error when agent_id is invalid
+    self._check_agent_id(agent_id)
 
-      if next_offset >= len(operations):
-        return {
-          "message": "Successfully added %i operation(s) to the agent \"%s/%s/%s\" context."
-                     % (len(operations), self.config["owner"], self.config["project"], agent_id)
-        }
+    # The deadline is shared by all the pages
+    deadline = to_deadline(deadline)
 
-      offset = next_offset
+    if parallelism is None or parallelism <= 1:
+      return self._get_operations_pages(agent_id, start, end, deadline)
 
-  def get_operations_list(self, agent_id):
-    # Raises an error when agent_id is invalid
-    self._check_agent_id(agent_id)
+    if start is None or end is None:
+      agent = self.get_agent(agent_id, deadline)
+      if "firstTimestamp" not in agent or "lastTimestamp" not in agent:
+        # No operations to retrieve
+        return []
+      start = agent["firstTimestamp"] if start is None else start
+      end = agent["lastTimestamp"] if end is None else end
 
-    headers = self._headers.copy()
+    # The bounds being inclusive, the windows are disjoint and, their
+    # operations being sorted, merging them is a concatenation.
+    windows = _time_windows(int(start), int(end), parallelism)
+    ops_lists = parallel_map(
+      lambda window: self._get_operations_pages(agent_id, window[0], window[1], deadline),
+      windows,
+      min(parallelism, self.config["maxConcurrency"]))
 
-    req_url = "{}/agents/{}/context".format(self._base_url, agent_id)
+    return [operation for ops_list in ops_lists for operation in ops_list]
+
+  def _get_operations_pages(self, agent_id, start, end, deadline):
+    # Operations lists are large, we want them compressed
+    headers = helpers.join_dicts(self._headers, ACCEPT_ENCODING_HEADER)
 
-    resp = requests.get(req_url, headers=headers)
+    req_url = self._operations_url(agent_id, start, end)
+    ops_list = []
 
-    ops_list = self._decode_response(resp)
+    while req_url is not None:
+      ops_page, req_url = self._get(req_url, headers, deadline, _NEXT_PAGE_HEADER,
+                                    conditional=True)
+      ops_list.extend(ops_page)
 
     return ops_list
 
-  def get_context_state(self, agent_id, timestamp):
+  def iter_operations(self, agent_id, start=None, end=None, chunk_size=None, deadline=None):
+    """Yields the agent's operations as lists of at most `chunk_size` items.
+
+    Pages are retrieved one after the other and their content is decoded
+    while it is downloaded, bounding memory usage to a few chunks.
+    """
+    # Raises an error when agent_id is invalid
+    self._check_agent_id(agent_id)
+
+    deadline = to_deadline(deadline)
+    chunk_size = chunk_size or self.config["operationsChunksSize"]
+    headers = helpers.join_dicts(self._headers, ACCEPT_ENCODING_HEADER)
+
+    req_url = self._operations_url(agent_id, start, end)
+    chunk = []
+
+    while req_url is not None:
+      resp = self._request("GET", req_url, headers, deadline=deadline, stream=True)
+      try:
+        if resp.status_code != requests.codes.ok:
+          self._decode_response(resp)
+
+        content = self._count_streamed_content(resp)
+        try:
+          for operation in iter_json_array(content):
+            chunk.append(operation)
+            if len(chunk) >= chunk_size:
+              yield chunk
+              chunk = []
+        except ValueError:
+          raise CraftAiUnknownError("Unable to decode the operations list.")
+      finally:
+        resp.close()
+
+      req_url = resp.headers.get(_NEXT_PAGE_HEADER)
+
+    if chunk:
+      yield chunk
+
+  def _operations_url(self, agent_id, start, end):
+    req_url = "{}/agents/{}/context".format(self._base_url, agent_id)
+    params = [(key, value) for key, value in [("start", start), ("end", end)]
+              if value is not None]
+    if params:
+      req_url = "{}?{}".format(req_url, urlencode(params))
+    return req_url
+
+  def get_context_state(self, agent_id, timestamp, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
@@ -227,38 +633,317 @@ class CraftAIClient(object):
     req_url = "{}/agents/{}/context/state?t={}".format(self._base_url,
                                                        agent_id,
                                                        timestamp)
-    resp = requests.get(req_url, headers=headers)
-
-    context_state = self._decode_response(resp)
+    context_state, _ = self._get(req_url, headers, deadline)
 
     return context_state
 
+  def get_context_states(self, pairs, concurrency=None, deadline=None):
+    """Retrieves the context states of many `(agent_id, timestamp)` pairs.
+
+    Requests are sent concurrently, on at most `concurrency` threads capped
+    by the `maxConcurrency` configuration, and duplicated pairs are only
+    requested once. Returns, in the order of `pairs`, dicts holding the
+    `agent_id`, the `timestamp` and either the `context_state` or the
+    `error` raised when retrieving it.
+    """
+    deadline = to_deadline(deadline)
+    pairs = [tuple(pair) for pair in pairs]
+
+    results = {}
+    for pair, context_state, error in self._run_concurrently(
+        lambda pair: self.get_context_state(pair[0], pair[1], deadline),
+        OrderedDict.fromkeys(pairs),
+        concurrency):
+      results[pair] = (context_state, error)
+
+    context_states = []
+    for agent_id, timestamp in pairs:
+      result = _bulk_result(agent_id, "context_state", *results[(agent_id, timestamp)])
+      result["timestamp"] = timestamp
+      context_states.append(result)
+    return context_states
+
   #########################
   # Decision tree methods #
   #########################
 
-  def get_decision_tree(self, agent_id, timestamp):
+  def get_decision_tree(self, agent_id, timestamp, deadline=None):
     # Raises an error when agent_id is invalid
     self._check_agent_id(agent_id)
 
-    headers = self._headers.copy()
+    cache = self.config["decisionTreeCache"]
+    if cache is None or not isinstance(timestamp, six.integer_types):
+      return self._get_decision_tree(agent_id, timestamp, deadline)
+
+    decision_tree = self.cached_decision_tree(agent_id, timestamp)
+    if decision_tree is None:
+      generation = self._tree_cache_generation(agent_id)
+      decision_tree = self._get_decision_tree(agent_id, timestamp, deadline)
+      self._cache_decision_tree(self.decision_tree_cache_key(agent_id, timestamp),
+                                decision_tree, generation)
+      self._counters.incr("decision_tree_cache_misses")
+    return decision_tree
+
+  def decision_tree_cache_key(self, agent_id, timestamp):
+    """Returns the key of the tree at `timestamp` in the decision tree cache,
+    the timestamps of the same bucket sharing the same tree"""
+    return (agent_id, timestamp // self.config["decisionTreeCacheBucket"])
+
+  def cached_decision_tree(self, agent_id, timestamp):
+    """Returns the decision tree from the cache, or None if it isn't cached,
+    without waiting for the API: stale trees are refreshed in the background"""
+    self._check_agent_id(agent_id)
+    cache = self.config["decisionTreeCache"]
+    if cache is None or not isinstance(timestamp, six.integer_types):
+      return None
+
+    key = self.decision_tree_cache_key(agent_id, timestamp)
+    cached_tree = cache.get(key)
+    if cached_tree is None:
+      return None
+
+    decision_tree, stored_at = cached_tree
+    if time.time() - stored_at > self.config["decisionTreeCacheTtl"]:
+      # The stale tree is served while it is refreshed, it stays in the
+      # cache if the API is slow or unreachable.
+      self._refresh_decision_tree(key, timestamp)
+      self._counters.incr("decision_tree_cache_stale_hits")
+    else:
+      self._counters.incr("decision_tree_cache_hits")
+    return decision_tree
+
+  def _get_decision_tree(self, agent_id, timestamp, deadline):
+    # Decision trees are large, we want them compressed
+    headers = helpers.join_dicts(self._headers, ACCEPT_ENCODING_HEADER)
 
     req_url = "{}/agents/{}/decision/tree?t={}".format(self._base_url,
                                                        agent_id,
                                                        timestamp)
 
-    resp = requests.get(req_url, headers=headers)
-
-    decision_tree = self._decode_response(resp)
+    decision_tree, _ = self._get(req_url, headers, deadline, conditional=True)
 
     return decision_tree
 
+  def _tree_cache_generation(self, agent_id):
+    with self._tree_cache_lock:
+      return self._tree_cache_generations.get(agent_id, 0)
+
+  def _cache_decision_tree(self, key, decision_tree, generation):
+    with self._tree_cache_lock:
+      if self._tree_cache_generations.get(key[0], 0) != generation:
+        # The agent was modified while the tree was being retrieved
+        return
+      self.config["decisionTreeCache"].set(key, decision_tree, time.time())
+
+  def _refresh_decision_tree(self, key, timestamp):
+    with self._tree_cache_lock:
+      if key in self._tree_cache_refreshes:
+        return
+      self._tree_cache_refreshes.add(key)
+
+    thread = threading.Thread(target=self._refresh_decision_tree_target,
+                              args=(key, timestamp))
+    thread.daemon = True
+    thread.start()
+
+  def _refresh_decision_tree_target(self, key, timestamp):
+    try:
+      generation = self._tree_cache_generation(key[0])
+      decision_tree = self._get_decision_tree(key[0], timestamp, None)
+      self._cache_decision_tree(key, decision_tree, generation)
+    except Exception: #pylint: disable=W0703
+      # Keeping the stale tree until the next refresh, nobody waits for this
+      # thread to report its errors
+      self._counters.incr("decision_tree_cache_refresh_errors")
+    finally:
+      with self._tree_cache_lock:
+        self._tree_cache_refreshes.discard(key)
+
+  def _invalidate_decision_trees(self, agent_id):
+    cache = self.config["decisionTreeCache"]
+    if cache is None:
+      return
+    with self._tree_cache_lock:
+      self._tree_cache_generations[agent_id] = self._tree_cache_generations.get(agent_id, 0) + 1
+      cache.invalidate(agent_id)
+
+  def get_decision_trees(self, agent_ids, timestamp, concurrency=None, deadline=None):
+    """Retrieves many agents' decision trees concurrently, yielding results
+    as they complete.
+
+    Yields dicts holding the `agent_id` and either the `decision_tree` or the
+    `error` raised when retrieving it.
+    """
+    deadline = to_deadline(deadline)
+    for agent_id, decision_tree, error in self._run_concurrently(
+        lambda agent_id: self.get_decision_tree(agent_id, timestamp, deadline),
+        OrderedDict.fromkeys(agent_ids),
+        concurrency):
+      yield _bulk_result(agent_id, "decision_tree", decision_tree, error)
+
   @staticmethod
   def decide(tree, *args):
     return Interpreter.decide(tree, args)
 
-  @staticmethod
-  def _decode_response(response):
+  def _run_concurrently(self, function, items, concurrency):
+    # The connection pool is sized for `maxConcurrency` concurrent requests
+    concurrency = min(concurrency or self.config["maxConcurrency"],
+                      self.config["maxConcurrency"])
+    return parallel_imap(function, items, concurrency)
+
+  def _request(self, method, url, headers, data=None, deadline=None, stream=False,
+               chunk_index=None):
+    hooks = self.config["hooks"]
+    if hooks is None:
+      return self._send(method, url, headers, data, deadline, stream)[0]
+
+    request = {
+      "method": method,
+      "url": url,
+      "endpoint": endpoint_class(url),
+      "chunk_index": chunk_index
+    }
+    hooks.on_request_start(request)
+    start = helpers.monotonic()
+    resp, retries, bytes_sent, bytes_received, error = None, 0, 0, None, None
+    try:
+      resp, retries, bytes_sent, bytes_received = self._send(method, url, headers, data,
+                                                             deadline, stream)
+      return resp
+    except CraftAiError as e:
+      error = e
+      raise
+    finally:
+      hooks.on_request_end(request,
+                           resp.status_code if resp is not None else None,
+                           helpers.monotonic() - start,
+                           bytes_sent,
+                           bytes_received,
+                           retries,
+                           error)
+
+  def _send(self, method, url, headers, data, deadline, stream):
+    """Returns the response, the number of retries and the numbers of bytes
+    sent and received on the wire, the latter being None for streams"""
+    if data is not None:
+      data, headers = self._encode_payload(data, headers)
+
+    deadline = to_deadline(deadline)
+    endpoint = endpoint_class(url)
+    retries = 0
+    while True:
+      resp = self._request_once(method, url, headers, data, deadline, stream, endpoint)
+      if resp.status_code != requests.codes.too_many_requests:
+        # Errors don't tell whether the rate can grow again
+        if resp.status_code < 400:
+          self._rate_limiter.on_success(endpoint)
+        break
+
+      # Rate limited requests weren't processed, they can be sent again
+      # once the rate is lowered and the `Retry-After` delay elapsed.
+      self._counters.incr("rate_limited_requests")
+      retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+      self._rate_limiter.on_rate_limited(endpoint, retry_after)
+      if retries >= self.config["maxRetries"] or (
+          deadline is not None and deadline.remaining() <= retry_after):
+        break
+      resp.close()
+      retries += 1
+
+    bytes_received = None
+    if not stream:
+      bytes_received = self._count_received(resp, len(resp.content))
+
+    return resp, retries, len(data) if data is not None else 0, bytes_received
+
+  def _request_once(self, method, url, headers, data, deadline, stream, endpoint):
+    self._rate_limiter.acquire(endpoint, deadline)
+    try:
+      timeout = (self.config["connectTimeout"], self.config["readTimeout"])
+      if deadline is not None:
+        timeout = deadline.timeout(*timeout)
+
+      return self._requests_session.request(method, url, headers=headers, data=data,
+                                            timeout=timeout, stream=stream)
+    except requests.exceptions.Timeout as e:
+      raise CraftAiTimeoutError("Request to {} has timed out. {}".format(url, e.__str__()),
+                                not isinstance(e, requests.exceptions.ConnectTimeout))
+    except requests.exceptions.ConnectionError as e:
+      raise CraftAiNetworkError("Unable to reach {}. {}".format(url, e.__str__()))
+    finally:
+      self._rate_limiter.release(endpoint)
+
+  def _count_received(self, resp, content_length):
+    """Returns the number of bytes received on the wire"""
+    # `tell` gives the number of bytes read from the socket, before any
+    # decompression, only the decoded content is available otherwise.
+    raw_tell = getattr(resp.raw, "tell", None)
+    wire_length = raw_tell() if callable(raw_tell) else content_length
+    self._counters.incr("bytes_received_raw", content_length)
+    self._counters.incr("bytes_received_wire", wire_length)
+    return wire_length
+
+  def _count_streamed_content(self, resp):
+    content_length = 0
+    for content in resp.iter_content(_STREAM_CHUNK_SIZE):
+      content_length += len(content)
+      yield content
+    self._count_received(resp, content_length)
+
+  def _get(self, url, headers, deadline, next_page_header=None, conditional=False):
+    """Returns the decoded response and, if any, the URL of its next page"""
+    if self._single_flight is None:
+      return self._get_once(url, headers, deadline, next_page_header, conditional)
+
+    # Identical concurrent requests share the same response
+    deadline = to_deadline(deadline)
+    result, shared = self._single_flight.call(
+      url,
+      lambda: self._get_once(url, headers, deadline, next_page_header, conditional),
+      deadline)
+    if shared:
+      self._counters.incr("coalesced_requests")
+    return result
+
+  def _get_once(self, url, headers, deadline, next_page_header, conditional):
+    entry = None
+    if conditional and self._validators is not None:
+      entry = self._validators.get(url)
+      if entry is not None:
+        headers = helpers.join_dicts(headers, conditional_headers(entry))
+
+    resp = self._request("GET", url, headers, deadline=deadline)
+
+    if resp.status_code == requests.codes.not_modified and entry is not None:
+      # The content didn't change, callers share the same decoded body which
+      # they must treat as read-only.
+      self._counters.incr("conditional_hits")
+      return entry[2]
+
+    decoded_resp = self._decode_response(resp)
+    next_page_url = None
+    if next_page_header is not None:
+      next_page_url = resp.headers.get(next_page_header)
+
+    if conditional and self._validators is not None:
+      self._validators.set(url, resp.headers, (decoded_resp, next_page_url))
+      self._counters.incr("conditional_misses")
+    return decoded_resp, next_page_url
+
+  def _encode_payload(self, data, headers):
+    if isinstance(data, six.text_type):
+      data = data.encode("utf-8")
+    self._counters.incr("bytes_sent_raw", len(data))
+
+    encoding = self.config["compression"]
+    if encoding is not None and len(data) >= self.config["compressionThreshold"]:
+      data = compress(data, encoding, self.config["compressionLevel"])
+      headers = helpers.join_dicts(headers, {"Content-Encoding": encoding})
+    self._counters.incr("bytes_sent_wire", len(data))
+
+    return data, headers
+
+  def _decode_response(self, response):
     # https://github.com/kennethreitz/requests/blob/master/requests/status_codes.py
     if response.status_code == requests.codes.not_found:
       raise CraftAiNotFoundError(response.text)
@@ -270,9 +955,13 @@ class CraftAIClient(object):
       raise CraftAiBadRequestError("Request has timed out")
     if response.status_code == requests.codes.gateway_timeout:
       raise CraftAiInternalError("Response has timed out")
+    if response.status_code == requests.codes.internal_server_error:
+      raise CraftAiInternalError(response.text)
+    if response.status_code == requests.codes.too_many_requests:
+      raise CraftAiTooManyRequestsError(response.text)
 
     try:
-      return response.json()
+      return self._codec.loads(response.content)
     except:
       raise CraftAiUnknownError(response.text)
 
@@ -287,3 +976,13 @@ class CraftAIClient(object):
         agent_id == ""):
       raise CraftAiBadRequestError("""agent_id has to be a non-empty"""
                                    """string""")
+
+def _time_windows(start, end, count):
+  """Splits the [start, end] timestamps range in at most `count` windows"""
+  edges = [start + (end - start + 1) * i // count for i in range(count + 1)]
+  return [(edges[i], edges[i + 1] - 1) for i in range(count) if edges[i] < edges[i + 1]]
+
+def _bulk_result(agent_id, key, value, error):
+  if error is not None:
+    return {"agent_id": agent_id, "error": error}
+  return {"agent_id": agent_id, key: value}
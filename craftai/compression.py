@@ -0,0 +1,23 @@
+import zlib
+
+# Supported values of the `compression` configuration key, `None` meaning
+# that request bodies are sent as is.
+ENCODINGS = (None, "gzip", "deflate")
+
+# Window sizes telling zlib which container to use, gzip needs the
+# additional 16 to write the gzip header and trailer.
+_WBITS = {
+  "gzip": 16 + zlib.MAX_WBITS,
+  "deflate": zlib.MAX_WBITS
+}
+
+ACCEPT_ENCODING_HEADER = {"Accept-Encoding": "gzip, deflate"}
+
+def compress(data, encoding, level):
+  """Compresses the given bytes with the given content encoding"""
+  compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+  return compressor.compress(data) + compressor.flush()
+
+def decompress(data, encoding):
+  """Decompresses bytes compressed with the given content encoding"""
+  return zlib.decompress(data, _WBITS[encoding])
@@ -0,0 +1,45 @@
+from multiprocessing.pool import ThreadPool
+
+from craftai.errors import CraftAiError
+
+def parallel_map(function, items, concurrency):
+  """Applies `function` to `items` on at most `concurrency` threads
+
+  Results are returned in the order of `items`, the first error raised by
+  `function` is raised again.
+  """
+  items = list(items)
+  if concurrency <= 1 or len(items) <= 1:
+    return [function(item) for item in items]
+
+  pool = ThreadPool(min(concurrency, len(items)))
+  try:
+    return pool.map(function, items)
+  finally:
+    pool.terminate()
+
+def parallel_imap(function, items, concurrency):
+  """Yields `(item, result, error)` tuples as soon as each item is processed
+
+  Items are processed on at most `concurrency` threads. CraftAiError raised
+  by `function` are given as the tuple's error instead of interrupting the
+  other items.
+  """
+  def safe_function(item):
+    try:
+      return item, function(item), None
+    except CraftAiError as e:
+      return item, None, e
+
+  items = list(items)
+  if concurrency <= 1 or len(items) <= 1:
+    for item in items:
+      yield safe_function(item)
+    return
+
+  pool = ThreadPool(min(concurrency, len(items)))
+  try:
+    for processed_item in pool.imap_unordered(safe_function, items):
+      yield processed_item
+  finally:
+    pool.terminate()
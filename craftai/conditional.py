@@ -0,0 +1,44 @@
+import threading
+
+from collections import OrderedDict
+
+class ValidatorsStore(object):
+  """Remembers, by URL, the validators and decoded body of the last response
+
+  The bodies are given back as is on `304 Not Modified` responses, their
+  users must not modify them. Only the responses having an `ETag` or a
+  `Last-Modified` header are kept, the least recently used entries being
+  dropped beyond `max_entries`.
+  """
+  def __init__(self, max_entries):
+    self.max_entries = max_entries
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+
+  def get(self, url):
+    with self._lock:
+      entry = self._entries.pop(url, None)
+      if entry is not None:
+        self._entries[url] = entry
+      return entry
+
+  def set(self, url, response_headers, body):
+    etag = response_headers.get("ETag")
+    last_modified = response_headers.get("Last-Modified")
+    with self._lock:
+      self._entries.pop(url, None)
+      if etag is None and last_modified is None:
+        return
+      self._entries[url] = (etag, last_modified, body)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+def conditional_headers(entry):
+  """Builds the headers of a conditional request from a stored entry"""
+  etag, last_modified, _ = entry
+  headers = {}
+  if etag is not None:
+    headers["If-None-Match"] = etag
+  if last_modified is not None:
+    headers["If-Modified-Since"] = last_modified
+  return headers
@@ -0,0 +1,103 @@
+import threading
+
+class SentContexts(object):
+  """Remembers, by agent, the context state resulting from the operations
+  last sent, for the next ones to hold only the properties which changed
+
+  The state of an agent is forgotten, its next operations being sent in
+  full, whenever it might differ from the API's: when sending operations
+  failed, when operations are sent concurrently or out of order for the
+  agent, and when the agent is created or deleted.
+
+  Only the operations sent by this client are known: the agents have to
+  get their operations from this client alone, the ones added meanwhile by
+  other clients or processes would make it drop properties which did
+  change.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._states = {}
+    self._in_flight = {}
+    # Agents whose operations sent meanwhile make the state unknown
+    self._stale = set()
+
+  def begin(self, agent_id):
+    """Returns the filter of operations about to be sent to the agent"""
+    with self._lock:
+      self._in_flight[agent_id] = self._in_flight.get(agent_id, 0) + 1
+      if self._in_flight[agent_id] > 1:
+        self._stale.add(agent_id)
+        return ChangesFilter(enabled=False)
+      timestamp, context = self._states.get(agent_id, (None, {}))
+      return ChangesFilter(timestamp, context)
+
+  def end(self, agent_id, changes_filter, sent):
+    """Keeps the state resulting from the filtered operations once `sent`"""
+    with self._lock:
+      if sent and changes_filter.enabled and agent_id not in self._stale:
+        self._states[agent_id] = (changes_filter.timestamp, changes_filter.context)
+      else:
+        self._states.pop(agent_id, None)
+      self._in_flight[agent_id] -= 1
+      if not self._in_flight[agent_id]:
+        del self._in_flight[agent_id]
+        self._stale.discard(agent_id)
+
+  def forget(self, agent_id):
+    with self._lock:
+      self._states.pop(agent_id, None)
+      if agent_id in self._in_flight:
+        self._stale.add(agent_id)
+
+class ChangesFilter(object):
+  """Drops from operations the properties equal to the context state, and
+  the operations left without any property
+
+  Filtering stops at the first operation older than the previous ones, the
+  state at the following timestamps being then unknown.
+  """
+  def __init__(self, timestamp=None, context=None, enabled=True):
+    self.timestamp = timestamp
+    self.context = dict(context or {})
+    self.enabled = enabled
+    self.dropped_operations = 0
+    self.dropped_properties = 0
+
+  def filter(self, operations):
+    for operation in operations:
+      if self.enabled:
+        operation = self._filter_operation(operation)
+        if operation is None:
+          continue
+      yield operation
+
+  def _filter_operation(self, operation):
+    try:
+      timestamp = operation["timestamp"]
+      context = operation["context"]
+      out_of_order = self.timestamp is not None and timestamp < self.timestamp
+    except (KeyError, TypeError):
+      # Invalid operations are left for the API to reject
+      self.enabled = False
+      return operation
+    if out_of_order:
+      self.enabled = False
+      return operation
+
+    changes = dict((key, value) for key, value in context.items()
+                   if not _same_value(self.context.get(key, _MISSING), value))
+    self.timestamp = timestamp
+    self.context.update(changes)
+    self.dropped_properties += len(context) - len(changes)
+    if not changes:
+      self.dropped_operations += 1
+      return None
+    if len(changes) == len(context):
+      return operation
+    return dict(operation, context=changes)
+
+_MISSING = object()
+
+def _same_value(last_value, value):
+  # 1, 1.0 and True are equal but different values for the API
+  return type(last_value) is type(value) and last_value == value
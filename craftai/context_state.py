@@ -0,0 +1,87 @@
+from bisect import bisect_right
+
+try:
+  import numpy as np
+except ImportError:
+  np = None #pylint: disable=C0103
+
+class ContextStates(object):
+  """Computes agents' context states locally from their operations
+
+  The state at a timestamp holds, for each context property, the last value
+  given at or before this timestamp, which is what `get_context_state`
+  returns without needing a request per timestamp.
+  """
+  def __init__(self, operations):
+    # Sorting is stable, the last of several operations at the same
+    # timestamp wins.
+    operations = sorted(operations, key=lambda operation: operation["timestamp"])
+    self._timestamps = {}
+    self._values = {}
+    for operation in operations:
+      for prop, value in operation["context"].items():
+        self._timestamps.setdefault(prop, []).append(operation["timestamp"])
+        self._values.setdefault(prop, []).append(value)
+
+  @classmethod
+  def from_arrays(cls, timestamps, values):
+    """Builds the states from sorted timestamps and arrays of values by
+    property, NaN meaning no value, as returned by
+    `OperationsStore.read_arrays`."""
+    context_states = cls([])
+    timestamps = np.asarray(timestamps)
+    for prop, prop_values in values.items():
+      prop_values = np.asarray(prop_values)
+      # NaN is the only value not equal to itself, `tolist` keeps integers
+      # and booleans as such
+      present = prop_values == prop_values #pylint: disable=R0124
+      context_states._timestamps[prop] = timestamps[present].tolist()
+      context_states._values[prop] = prop_values[present].tolist()
+    return context_states
+
+  def get(self, timestamp):
+    """Returns the state at the given timestamp, formatted as by the API"""
+    context = {}
+    for prop, prop_timestamps in self._timestamps.items():
+      index = bisect_right(prop_timestamps, timestamp) - 1
+      if index >= 0:
+        context[prop] = self._values[prop][index]
+    return {
+      "timestamp": timestamp,
+      "context": context
+    }
+
+  def get_many(self, timestamps):
+    """Returns the states at each of the given timestamps
+
+    The lookups are vectorized when NumPy is installed.
+    """
+    if np is None:
+      return [self.get(timestamp) for timestamp in timestamps]
+
+    timestamps = np.asarray(timestamps)
+    if not self._timestamps or timestamps.size == 0:
+      return [{"timestamp": timestamp, "context": {}} for timestamp in timestamps.tolist()]
+
+    # Timestamps between the same two operations have the same state, each
+    # distinct state is only built once.
+    all_timestamps = np.unique(np.concatenate([
+      np.asarray(prop_timestamps) for prop_timestamps in self._timestamps.values()
+    ]))
+    positions = np.searchsorted(all_timestamps, timestamps, "right")
+    distinct_positions, inverse = np.unique(positions, return_inverse=True)
+    # The state at a position is the one at the last operation before it
+    state_timestamps = all_timestamps[np.maximum(distinct_positions - 1, 0)]
+    contexts = [{} for _ in distinct_positions]
+    for prop, prop_timestamps in self._timestamps.items():
+      indices = np.searchsorted(prop_timestamps, state_timestamps, "right") - 1
+      indices[distinct_positions == 0] = -1
+      prop_values = self._values[prop]
+      for context, index in zip(contexts, indices.tolist()):
+        if index >= 0:
+          context[prop] = prop_values[index]
+
+    return [
+      {"timestamp": timestamp, "context": dict(contexts[index])}
+      for timestamp, index in zip(timestamps.tolist(), inverse.ravel().tolist())
+    ]
@@ -0,0 +1,35 @@
+import numbers
+
+from craftai.errors import CraftAiBadRequestError, CraftAiTimeoutError
+from craftai.helpers import monotonic
+
+class Deadline(object):
+  """Time budget shared by all the requests made for a single call"""
+  def __init__(self, seconds):
+    self.seconds = seconds
+    self._end = monotonic() + seconds
+
+  def remaining(self):
+    return self._end - monotonic()
+
+  def check(self):
+    """Raises a CraftAiTimeoutError if the budget is exhausted"""
+    remaining = self.remaining()
+    if remaining <= 0:
+      raise CraftAiTimeoutError("""The deadline of {} second(s) has been"""
+                                """ exceeded.""".format(self.seconds))
+    return remaining
+
+  def timeout(self, connect_timeout, read_timeout):
+    """Returns the `requests` timeout capped by the remaining budget"""
+    remaining = self.check()
+    return (min(connect_timeout, remaining), min(read_timeout, remaining))
+
+def to_deadline(deadline):
+  """Builds a Deadline from a number of seconds, Deadline are kept as is so
+  that they can be shared by several calls."""
+  if deadline is None or isinstance(deadline, Deadline):
+    return deadline
+  if isinstance(deadline, numbers.Real) and not isinstance(deadline, bool):
+    return Deadline(deadline)
+  raise CraftAiBadRequestError("Invalid deadline given, it should be a number of seconds.")
@@ -79,3 +79,20 @@ class CraftAiTokenError(CraftAiError):
   def __init__(self, message):
     self.message = "".join(("Invalid Token: ", message))
     super(CraftAiTokenError, self).__init__(message)
+
+class CraftAiTimeoutError(CraftAiError):
+  """Raised when a request or the deadline of a call times out
+
+  `request_sent` is False when the request surely didn't reach craft ai,
+  e.g. when the connection timed out.
+  """
+  def __init__(self, message, request_sent=True):
+    self.message = "".join(("Timed out: ", message))
+    self.request_sent = request_sent
+    super(CraftAiTimeoutError, self).__init__(message)
+
+class CraftAiTooManyRequestsError(CraftAiError):
+  """Raised when craft ai's rate limits are still exceeded after retrying (429)"""
+  def __init__(self, message):
+    self.message = "".join(("Too many requests: ", message))
+    super(CraftAiTooManyRequestsError, self).__init__(message)
@@ -1,3 +1,13 @@
+import importlib
+import threading
+import time
+
+try:
+  monotonic = time.monotonic #pylint: disable=C0103
+except AttributeError:
+  # Python 2 has no monotonic clock in its standard library
+  monotonic = time.time #pylint: disable=C0103
+
 def join_dicts(old_dicts, *new_dicts):
   joined_dicts = old_dicts.copy()
 
@@ -12,3 +22,38 @@ def dict_depth(collection):
   if isinstance(collection, list) and collection:
     return 1 + max(dict_depth(a) for a in collection)
   return 0
+
+class Counters(object):
+  """Thread safe named counters, used to expose the client's statistics"""
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._values = {}
+
+  def incr(self, name, value=1):
+    with self._lock:
+      self._values[name] = self._values.get(name, 0) + value
+
+  def snapshot(self):
+    with self._lock:
+      return self._values.copy()
+
+  def reset(self):
+    with self._lock:
+      self._values = {}
+
+def lazy_getattr(package, package_globals, attributes):
+  """Returns a module `__getattr__` importing the given attributes' modules
+  on first access
+
+  `attributes` maps the names to `(module, attribute)`, the module being
+  relative to `package`. Loaded attributes are stored in the package's
+  globals for the next accesses not to go through `__getattr__`.
+  """
+  def __getattr__(name): #pylint: disable=C0103
+    if name not in attributes:
+      raise AttributeError("module '{}' has no attribute '{}'".format(package, name))
+    module_name, attribute = attributes[name]
+    value = getattr(importlib.import_module(module_name, package), attribute)
+    package_globals[name] = value
+    return value
+  return __getattr__
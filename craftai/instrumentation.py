@@ -0,0 +1,179 @@
+import bisect
+import threading
+
+from craftai.errors import CraftAiNullDecisionError
+
+class Hooks(object):
+  """Instrumentation hooks, doing nothing by default
+
+  Subclasses override the events they need. A client calls them when given
+  in its `hooks` configuration key, and the interpreter calls them once set
+  with `Interpreter.set_hooks`. Without hooks, nothing is measured.
+
+  `request` is a dict holding the `method`, `url`, `endpoint` class
+  (agents, context, decision or shared) and, for the chunks of
+  `add_operations`, the `chunk_index`.
+  """
+  def on_request_start(self, request):
+    pass
+
+  def on_request_end(self, request, status, latency, bytes_sent, bytes_received,
+                     retries, error):
+    """`status` is None when no response was received, `error` is the
+    CraftAiError raised by the request, if any. `bytes_sent` and
+    `bytes_received` are the sizes of the bodies on the wire, compressed if
+    so, `bytes_received` being None for streamed responses."""
+
+  def on_decide(self, latency, decision, error):
+    """`error` is the CraftAiDecisionError raised instead of the decision,
+    a CraftAiNullDecisionError for null decisions."""
+
+# Upper bounds of the histograms' buckets, in seconds
+REQUEST_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+DECIDE_BUCKETS = (.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01)
+
+class Histogram(object):
+  def __init__(self, buckets):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0.
+    self.count = 0
+
+  def observe(self, value):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+  def cumulative_counts(self):
+    cumulative = []
+    total = 0
+    for count in self.counts:
+      total += count
+      cumulative.append(total)
+    return cumulative
+
+_HELPS = {
+  "craftai_requests_total": ("counter", "Requests sent to craft ai, by response status."),
+  "craftai_request_errors_total": ("counter", "Requests which raised an error."),
+  "craftai_request_retries_total": ("counter", "Retries of rate limited requests."),
+  "craftai_request_bytes_sent_total": ("counter", "Request body bytes sent on the wire."),
+  "craftai_request_bytes_received_total": ("counter",
+                                           "Response body bytes received on the wire."),
+  "craftai_requests_in_flight": ("gauge", "Requests waiting for their response."),
+  "craftai_request_duration_seconds": ("histogram", "Duration of the requests."),
+  "craftai_decisions_total": ("counter", "Decisions taken by the interpreter, by result."),
+  "craftai_decide_duration_seconds": ("histogram", "Duration of the decisions.")
+}
+
+class MetricsCollector(Hooks):
+  """Hooks collecting counters and latency histograms in memory
+
+  Metrics are labelled by endpoint class and can be exported in
+  Prometheus' text format with `to_prometheus`.
+  """
+  def __init__(self, request_buckets=REQUEST_BUCKETS, decide_buckets=DECIDE_BUCKETS):
+    self.request_buckets = request_buckets
+    self.decide_buckets = decide_buckets
+    self._lock = threading.Lock()
+    self._values = {}
+    self._histograms = {}
+
+  def on_request_start(self, request):
+    with self._lock:
+      self._add("craftai_requests_in_flight", (("endpoint", request["endpoint"]),), 1)
+
+  def on_request_end(self, request, status, latency, bytes_sent, bytes_received,
+                     retries, error):
+    endpoint = (("endpoint", request["endpoint"]),)
+    with self._lock:
+      self._add("craftai_requests_in_flight", endpoint, -1)
+      if status is not None:
+        self._add("craftai_requests_total",
+                  endpoint + (("method", request["method"]), ("status", str(status))), 1)
+      if error is not None:
+        self._add("craftai_request_errors_total",
+                  endpoint + (("error", type(error).__name__),), 1)
+      if retries:
+        self._add("craftai_request_retries_total", endpoint, retries)
+      self._add("craftai_request_bytes_sent_total", endpoint, bytes_sent)
+      if bytes_received is not None:
+        self._add("craftai_request_bytes_received_total", endpoint, bytes_received)
+      self._observe("craftai_request_duration_seconds", endpoint, latency,
+                    self.request_buckets)
+
+  def on_decide(self, latency, decision, error):
+    if error is None:
+      result = "ok"
+    elif isinstance(error, CraftAiNullDecisionError):
+      result = "null"
+    else:
+      result = "error"
+    with self._lock:
+      self._add("craftai_decisions_total", (("result", result),), 1)
+      self._observe("craftai_decide_duration_seconds", (), latency, self.decide_buckets)
+
+  def value(self, name, **labels):
+    """Returns the value of a counter or gauge, summed over the labels not
+    given"""
+    with self._lock:
+      return sum(value for (metric, metric_labels), value in self._values.items()
+                 if metric == name and
+                 all(dict(metric_labels).get(key) == label for key, label in labels.items()))
+
+  def histogram(self, name, **labels):
+    with self._lock:
+      return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+  def reset(self):
+    with self._lock:
+      self._values.clear()
+      self._histograms.clear()
+
+  def to_prometheus(self):
+    """Returns the metrics in Prometheus' text exposition format"""
+    with self._lock:
+      lines = []
+      names = sorted(set([name for name, _ in self._values] +
+                         [name for name, _ in self._histograms]))
+      for name in names:
+        metric_type, metric_help = _HELPS[name]
+        lines.append("# HELP {} {}".format(name, metric_help))
+        lines.append("# TYPE {} {}".format(name, metric_type))
+        if metric_type == "histogram":
+          for (metric, labels), histogram in sorted(self._histograms.items()):
+            if metric == name:
+              lines.extend(_histogram_lines(name, labels, histogram))
+        else:
+          for (metric, labels), value in sorted(self._values.items()):
+            if metric == name:
+              lines.append("{}{} {}".format(name, _format_labels(labels), _format_value(value)))
+      return "\n".join(lines) + "\n"
+
+  def _add(self, name, labels, value):
+    key = (name, tuple(sorted(labels)))
+    self._values[key] = self._values.get(key, 0) + value
+
+  def _observe(self, name, labels, value, buckets):
+    key = (name, tuple(sorted(labels)))
+    if key not in self._histograms:
+      self._histograms[key] = Histogram(buckets)
+    self._histograms[key].observe(value)
+
+def _histogram_lines(name, labels, histogram):
+  lines = []
+  bounds = [_format_value(bound) for bound in histogram.buckets] + ["+Inf"]
+  for bound, count in zip(bounds, histogram.cumulative_counts()):
+    lines.append("{}_bucket{} {}".format(name, _format_labels(labels + (("le", bound),)), count))
+  lines.append("{}_sum{} {}".format(name, _format_labels(labels), _format_value(histogram.sum)))
+  lines.append("{}_count{} {}".format(name, _format_labels(labels), histogram.count))
+  return lines
+
+def _format_labels(labels):
+  if not labels:
+    return ""
+  return "{{{}}}".format(",".join(
+    "{}=\"{}\"".format(key, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+    for key, value in labels))
+
+def _format_value(value):
+  return repr(float(value)) if isinstance(value, float) else str(value)
@@ -4,6 +4,7 @@ import semver
 import six
 
 from craftai.errors import CraftAiDecisionError, CraftAiNullDecisionError
+from craftai.helpers import monotonic
 from craftai.time import Time
 
 _OPERATORS = {
@@ -30,18 +31,86 @@ _VALUE_VALIDATORS = {
 _DECISION_VERSION = "1.1.0"
 
 class Interpreter(object):
+  # Instrumentation hooks called on each decision, if any
+  _hooks = None
+
+  @staticmethod
+  def set_hooks(hooks):
+    """Sets the `craftai.instrumentation.Hooks` notified of each decision,
+    `None` to disable them"""
+    Interpreter._hooks = hooks
 
   @staticmethod
   def decide(tree, args):
+    hooks = Interpreter._hooks
+    if hooks is None:
+      return Interpreter._decide(tree, args)
+
+    start = monotonic()
+    try:
+      decision = Interpreter._decide(tree, args)
+    except CraftAiDecisionError as e:
+      hooks.on_decide(monotonic() - start, None, e)
+      raise
+    hooks.on_decide(monotonic() - start, decision, None)
+    return decision
+
+  @staticmethod
+  def decide_batch(tree, args_list):
+    """Takes the decisions for each of the given `decide` arguments
+
+    The tree is parsed once and the contexts go down the tree together,
+    split at each node between the matching children. Returns, in order,
+    the decisions formatted as by `decide`, or the CraftAiDecisionError it
+    would have raised.
+    """
+    start = monotonic()
     bare_tree, configuration, _ = Interpreter._parse_tree(tree)
-    if configuration != {}:
-      state = args[0]
-      time = None if len(args) == 1 else args[1]
-      context = Interpreter._rebuild_context(configuration, state, time)
-    else:
-      context = Interpreter.join_decide_args(args)
 
-    Interpreter._check_context(configuration, context)
+    results = [None] * len(args_list)
+    contexts = {}
+    for i, args in enumerate(args_list):
+      try:
+        contexts[i] = Interpreter._build_context(configuration, args)
+      except CraftAiDecisionError as e:
+        results[i] = e
+
+    outputs = dict((i, {}) for i in contexts)
+    for output in configuration.get("output"):
+      leaves = {}
+      Interpreter._decide_batch_recursion(bare_tree[output], contexts,
+                                          [i for i in contexts if outputs[i] is not None],
+                                          [], leaves)
+      for i, leaf in leaves.items():
+        if isinstance(leaf, CraftAiDecisionError):
+          results[i] = leaf
+          outputs[i] = None
+        else:
+          outputs[i][output] = leaf
+
+    for i, output in outputs.items():
+      if output is not None:
+        results[i] = {
+          "output": output,
+          "context": contexts[i],
+          "_version": _DECISION_VERSION
+        }
+
+    hooks = Interpreter._hooks
+    if hooks is not None and results:
+      latency = (monotonic() - start) / len(results)
+      for result in results:
+        if isinstance(result, CraftAiDecisionError):
+          hooks.on_decide(latency, None, result)
+        else:
+          hooks.on_decide(latency, result, None)
+
+    return results
+
+  @staticmethod
+  def _decide(tree, args):
+    bare_tree, configuration, _ = Interpreter._parse_tree(tree)
+    context = Interpreter._build_context(configuration, args)
 
     decision = {}
     decision["output"] = {}
@@ -56,6 +125,18 @@ class Interpreter(object):
   # Internal helpers #
   ####################
 
+  @staticmethod
+  def _build_context(configuration, args):
+    if configuration != {}:
+      state = args[0]
+      time = None if len(args) == 1 else args[1]
+      context = Interpreter._rebuild_context(configuration, state, time)
+    else:
+      context = Interpreter.join_decide_args(args)
+
+    Interpreter._check_context(configuration, context)
+    return context
+
   @staticmethod
   def _rebuild_context(configuration, state, time=None):
     # Model should come from _parse_tree and is assumed to be checked upon
@@ -164,6 +245,56 @@ class Interpreter(object):
 
     return final_result
 
+  @staticmethod
+  def _decide_batch_recursion(node, contexts, indices, decision_rules, leaves):
+    """Sets in `leaves`, for each of the contexts' indices, the leaf they
+    lead to from `node` or the error raised on their way"""
+    if not (node.get("children") is not None and len(node.get("children"))):
+      predicted_value = node.get("predicted_value")
+      for i in indices:
+        if predicted_value is None:
+          leaves[i] = CraftAiNullDecisionError(
+            """Unable to take decision: the decision tree has no valid"""
+            """ predicted value for the given context."""
+          )
+          continue
+        leaf = {
+          "predicted_value": predicted_value,
+          "confidence": node.get("confidence") or 0,
+          "decision_rules": list(decision_rules)
+        }
+        if node.get("standard_deviation", None) is not None:
+          leaf["standard_deviation"] = node.get("standard_deviation")
+        leaves[i] = leaf
+      return
+
+    children_indices = [[] for _ in node["children"]]
+    positions = dict((id(child), position) for position, child in enumerate(node["children"]))
+    for i in indices:
+      try:
+        matching_child = Interpreter._find_matching_child(node, contexts[i])
+      except CraftAiDecisionError as e:
+        leaves[i] = e
+        continue
+      if not matching_child:
+        prop = node.get("children")[0].get("decision_rule").get("property")
+        leaves[i] = CraftAiNullDecisionError(
+          """Unable to take decision: value '{}' for property '{}' doesn't"""
+          """ validate any of the decision rules.""".format(contexts[i].get(prop), prop)
+        )
+        continue
+      children_indices[positions[id(matching_child)]].append(i)
+
+    for child, child_indices in zip(node["children"], children_indices):
+      if child_indices:
+        rule = {
+          "property": child["decision_rule"]["property"],
+          "operator": child["decision_rule"]["operator"],
+          "operand": child["decision_rule"]["operand"]
+        }
+        Interpreter._decide_batch_recursion(child, contexts, child_indices,
+                                            decision_rules + [rule], leaves)
+
   @staticmethod
   def _check_context(configuration, context):
     # Extract the required properties (i.e. those that are not the output)
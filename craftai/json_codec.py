@@ -0,0 +1,188 @@
+import codecs
+import json
+import re
+
+import six
+
+from craftai.errors import CraftAiBadRequestError
+
+_WHITESPACES = re.compile(r"[ \t\n\r]*")
+# Characters a number can hold, a number is only complete once followed by
+# something else
+_NUMBER = re.compile(r"[-+0-9.eE]*")
+
+def _default(obj):
+  # NumPy scalars and arrays can convert themselves to python types, there is
+  # no need to import numpy to recognize them.
+  if type(obj).__module__ == "numpy" and hasattr(obj, "tolist"):
+    return obj.tolist()
+  raise TypeError("{} is not JSON serializable".format(repr(obj)))
+
+class JsonCodec(object):
+  """JSON codec based on python's standard library
+
+  Every codec encodes python objects to bytes and decodes bytes to python
+  objects, a custom codec only has to provide these `dumps` and `loads`
+  methods.
+  """
+  name = "json"
+
+  def dumps(self, obj):
+    json_str = json.dumps(obj, default=_default, separators=(",", ":"))
+    if isinstance(json_str, six.text_type):
+      return json_str.encode("utf-8")
+    return json_str
+
+  def loads(self, data):
+    if isinstance(data, six.binary_type):
+      data = data.decode("utf-8")
+    return json.loads(data)
+
+class OrjsonCodec(JsonCodec):
+  """JSON codec based on orjson, serializing NumPy types natively"""
+  name = "orjson"
+
+  def __init__(self):
+    import orjson
+    self._orjson = orjson
+    self._option = orjson.OPT_SERIALIZE_NUMPY
+
+  def dumps(self, obj):
+    return self._orjson.dumps(obj, default=_default, option=self._option)
+
+  def loads(self, data):
+    return self._orjson.loads(data)
+
+class UjsonCodec(JsonCodec):
+  """JSON codec based on ujson"""
+  name = "ujson"
+
+  def __init__(self):
+    import ujson
+    self._ujson = ujson
+
+  def dumps(self, obj):
+    try:
+      return self._ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+    except (TypeError, OverflowError):
+      # ujson doesn't know about NumPy types, the standard library is used
+      # for the payloads containing some.
+      return super(UjsonCodec, self).dumps(obj)
+
+  def loads(self, data):
+    return self._ujson.loads(data)
+
+class RapidjsonCodec(JsonCodec):
+  """JSON codec based on python-rapidjson"""
+  name = "rapidjson"
+
+  def __init__(self):
+    import rapidjson
+    self._rapidjson = rapidjson
+
+  def dumps(self, obj):
+    return self._rapidjson.dumps(obj, default=_default).encode("utf-8")
+
+  def loads(self, data):
+    return self._rapidjson.loads(data)
+
+# Ordered by preference when automatically picking a codec
+_CODECS = [OrjsonCodec, UjsonCodec, RapidjsonCodec, JsonCodec]
+
+def get_codec(codec=None):
+  """Returns the codec matching the `jsonCodec` configuration key
+
+  `codec` can either be `None` or "auto", to use the fastest installed
+  library, the name of one of the supported libraries or an object
+  providing `dumps` and `loads` methods.
+  """
+  if codec is None or codec == "auto":
+    for codec_class in _CODECS:
+      try:
+        return codec_class()
+      except ImportError:
+        pass
+
+  if isinstance(codec, six.string_types):
+    for codec_class in _CODECS:
+      if codec_class.name == codec:
+        try:
+          return codec_class()
+        except ImportError:
+          raise CraftAiBadRequestError("""Unable to create client with JSON"""
+                                       """ codec '{}', it is not installed."""
+                                       .format(codec))
+    raise CraftAiBadRequestError("""Unable to create client with unknown"""
+                                 """ JSON codec '{}'.""".format(codec))
+
+  if callable(getattr(codec, "dumps", None)) and callable(getattr(codec, "loads", None)):
+    return codec
+
+  raise CraftAiBadRequestError("""Unable to create client with invalid JSON"""
+                               """ codec, it should provide 'dumps' and"""
+                               """ 'loads' methods.""")
+
+def iter_json_array(chunks):
+  """Lazily decodes the elements of a JSON array given as chunks of bytes
+
+  Only the element being decoded and the current chunk are kept in memory,
+  which is what makes it possible to go through very large responses.
+  """
+  decoder = json.JSONDecoder()
+  text_decoder = codecs.getincrementaldecoder("utf-8")()
+  # Expecting the opening bracket, the first element or the closing bracket,
+  # an element, a comma or the closing bracket, then nothing
+  state = {"buffer": "", "expecting": "array"}
+
+  def parse(final):
+    buf = state["buffer"]
+    pos = _WHITESPACES.match(buf, 0).end()
+    while pos < len(buf) and state["expecting"] != "nothing":
+      expecting = state["expecting"]
+      if expecting == "array":
+        if buf[pos] != "[":
+          raise ValueError("Expecting a JSON array")
+        state["expecting"] = "first"
+        pos = _WHITESPACES.match(buf, pos + 1).end()
+        continue
+      if expecting in ["first", "delimiter"] and buf[pos] == "]":
+        state["expecting"] = "nothing"
+        pos = _WHITESPACES.match(buf, pos + 1).end()
+        break
+      if expecting == "delimiter":
+        if buf[pos] != ",":
+          raise ValueError("Expecting ',' delimiter or ']' at char {}".format(pos))
+        state["expecting"] = "element"
+        pos = _WHITESPACES.match(buf, pos + 1).end()
+        continue
+
+      number_end = _NUMBER.match(buf, pos).end()
+      if number_end == len(buf) and number_end > pos and not final:
+        # The number might be cut, it is decoded once the next chunk arrives
+        break
+      try:
+        element, end = decoder.raw_decode(buf, pos)
+      except ValueError:
+        if final:
+          raise
+        # The element is not complete yet
+        break
+      if number_end > pos and end != number_end:
+        raise ValueError("Invalid number at char {}".format(pos))
+      yield element
+      state["expecting"] = "delimiter"
+      pos = _WHITESPACES.match(buf, end).end()
+    if state["expecting"] == "nothing" and pos < len(buf):
+      raise ValueError("Extra data after the JSON array at char {}".format(pos))
+    state["buffer"] = buf[pos:]
+
+  for chunk in chunks:
+    state["buffer"] += text_decoder.decode(chunk)
+    for element in parse(False):
+      yield element
+
+  state["buffer"] += text_decoder.decode(b"", True)
+  for element in parse(True):
+    yield element
+  if state["expecting"] != "nothing":
+    raise ValueError("Unterminated JSON array")
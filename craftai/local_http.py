@@ -0,0 +1,156 @@
+"""HTTP servers and connections over TCP or Unix sockets, for the local
+daemons"""
+
+import json
+import os
+import select
+import socket
+import threading
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.http_client import HTTPConnection, HTTPException
+from six.moves.socketserver import ThreadingMixIn, UnixStreamServer
+
+from craftai import errors
+from craftai.errors import CraftAiError, CraftAiNetworkError, CraftAiTimeoutError
+from craftai.errors import CraftAiUnknownError
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+  daemon_threads = True
+
+class JSONHandler(BaseHTTPRequestHandler):
+  """Request handler answering JSON over persistent connections"""
+  protocol_version = "HTTP/1.1"
+  disable_nagle_algorithm = True
+
+  def log_message(self, *_): #pylint: disable=W0221
+    pass
+
+  def address_string(self):
+    # Unix sockets' clients have no address
+    return str(self.client_address)
+
+  def read_json(self):
+    length = int(self.headers.get("Content-Length") or 0)
+    return json.loads(self.rfile.read(length).decode("utf-8"))
+
+  def respond(self, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json; charset=utf-8")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+def make_server(handler_class, host, port, unix_socket=None):
+  """Returns a threaded server listening on the Unix socket, when given, or
+  on the TCP port"""
+  if unix_socket is None:
+    return ThreadingHTTPServer((host, port), handler_class)
+  if os.path.exists(unix_socket):
+    os.remove(unix_socket)
+  # TCP options can't be set on Unix sockets
+  unix_handler_class = type(handler_class.__name__, (handler_class,),
+                            {"disable_nagle_algorithm": False})
+  return ThreadingUnixHTTPServer(unix_socket, unix_handler_class)
+
+def error_json(error):
+  return {"message": error.message, "type": type(error).__name__}
+
+def raise_error_json(result):
+  """Raises the error serialized by `error_json`"""
+  error_class = getattr(errors, result.get("type", ""), None)
+  if not (isinstance(error_class, type) and issubclass(error_class, CraftAiError)):
+    error_class = CraftAiUnknownError
+  error = error_class(result.get("message", ""))
+  # The message already holds the error's prefix
+  error.message = result.get("message", "")
+  raise error
+
+class UnixHTTPConnection(HTTPConnection):
+  def __init__(self, path, timeout):
+    HTTPConnection.__init__(self, "localhost", timeout=timeout)
+    self.path = path
+
+  def connect(self):
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.sock.settimeout(self.timeout)
+    self.sock.connect(self.path)
+
+class JSONConnection(object):
+  """Posts JSON to a local server, given its URL or Unix socket path
+
+  Connections are persistent, each thread keeping its own.
+  """
+  def __init__(self, address, timeout):
+    self.address = address
+    self.timeout = timeout
+    self._local = threading.local()
+
+  def post(self, path, payload, timeout=None):
+    """Returns the response's status and JSON body
+
+    `timeout` overrides the connection's for this request. The request is
+    only sent again when it failed before being written, the server could
+    have processed it otherwise, and never after a timeout.
+    """
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    timeout = self.timeout if timeout is None else timeout
+    for retry in [False, True]:
+      connection = self._connection(timeout, reset=retry)
+      try:
+        connection.request("POST", path, body, {"Content-Type": "application/json"})
+      except socket.timeout as e:
+        self._close()
+        raise CraftAiTimeoutError("Request to {} has timed out. {}".format(self.address, e))
+      except (socket.error, IOError) as e:
+        # The server may have closed the connection while it was idle
+        if retry:
+          self._close()
+          raise CraftAiNetworkError("Unable to reach {}. {}".format(self.address, e))
+        continue
+
+      try:
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+      except socket.timeout as e:
+        self._close()
+        raise CraftAiTimeoutError("Request to {} has timed out. {}".format(self.address, e))
+      except (socket.error, IOError, HTTPException) as e:
+        self._close()
+        raise CraftAiNetworkError("No response from {}. {}".format(self.address, e))
+    return None
+
+  def _close(self):
+    connection = getattr(self._local, "connection", None)
+    if connection is not None:
+      connection.close()
+      self._local.connection = None
+
+  def _connection(self, timeout, reset=False):
+    connection = getattr(self._local, "connection", None)
+    if connection is not None and (reset or _is_dropped(connection)):
+      self._close()
+      connection = None
+    if connection is None:
+      if self.address.startswith("http://"):
+        connection = HTTPConnection(self.address[len("http://"):], timeout=timeout)
+      else:
+        connection = UnixHTTPConnection(self.address, timeout)
+      self._local.connection = connection
+    connection.timeout = timeout
+    if connection.sock is not None:
+      connection.sock.settimeout(timeout)
+    return connection
+
+def _is_dropped(connection):
+  """Whether the server closed the idle connection, which is then readable"""
+  if connection.sock is None:
+    return False
+  try:
+    return bool(select.select([connection.sock], [], [], 0)[0])
+  except (socket.error, ValueError):
+    return True
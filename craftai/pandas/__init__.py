@@ -1,6 +1,27 @@
-from .. import errors, Time
-from .client import Client
-from .interpreter import Interpreter
+import sys
+
+from .. import errors
+from ..helpers import lazy_getattr
+
+# pandas is only imported when one of the pandas attributes is accessed
+_LAZY_ATTRIBUTES = {
+  "Client": (".client", "Client"),
+  "Interpreter": (".interpreter", "Interpreter"),
+  "OperationsStore": (".store", "OperationsStore"),
+  "resample_operations": (".resampling", "resample_operations"),
+  "Time": ("..time", "Time")
+}
+
+__getattr__ = lazy_getattr(__name__, globals(), _LAZY_ATTRIBUTES)
+
+if sys.version_info < (3, 7):
+  # Modules' `__getattr__` isn't supported before Python 3.7. Importing the
+  # attributes explicitly also binds them for static analysis.
+  from .client import Client
+  from .interpreter import Interpreter
+  from .store import OperationsStore
+  from .resampling import resample_operations
+  from ..time import Time
 
 # Defining what will be imported when doing `from craftai.pandas import *`
 
@@ -8,5 +29,7 @@ __all__ = [
   "Client",
   "errors",
   "Interpreter",
+  "OperationsStore",
+  "resample_operations",
   "Time"
 ]
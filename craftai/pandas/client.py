@@ -10,39 +10,68 @@ def chunker(to_be_chunked_df, chunk_size):
   return (to_be_chunked_df[pos:pos + chunk_size]
           for pos in range(0, len(to_be_chunked_df), chunk_size))
 
+def operations_from_df(df, chunk_size):
+  for chunk in chunker(df, chunk_size):
+    # Values are read from the columns' arrays instead of boxing each row
+    # in a Series, the JSON codec serializes NumPy scalars as is.
+    timestamps = chunk.index.values.astype("datetime64[s]").astype("int64")
+    columns = [(col, chunk[col].values) for col in df.columns]
+    for i, timestamp in enumerate(timestamps):
+      yield {
+        "timestamp": timestamp,
+        "context": {
+          col: values[i] for col, values in columns if pd.notnull(values[i])
+        }
+      }
+
+def operations_to_df(operations_list):
+  return pd.DataFrame(
+    [operation["context"] for operation in operations_list],
+    index=pd.to_datetime([operation["timestamp"] for operation in operations_list], unit="s")
+  )
+
 class Client(VanillaClient):
   """Client class for craft ai's API using pandas dataframe types"""
-  def add_operations(self, agent_id, operations):
+  def add_operations(self, agent_id, operations, deadline=None):
     if isinstance(operations, pd.DataFrame):
       if not isinstance(operations.index, pd.DatetimeIndex):
         raise CraftAiBadRequestError("Invalid dataframe given, it is not time indexed")
 
-      chunk_size = self.config["operationsChunksSize"]
-
-      for chunk in chunker(operations, chunk_size):
-        chunk_operations = [
-          {
-            "timestamp": row.name.value // 10 ** 9, # Timestamp.value returns nanoseconds
-            "context": {
-              col: row[col] for col in operations.columns if pd.notnull(row[col])
-            }
-          } for _, row in chunk.iterrows()
-        ]
-        super(Client, self).add_operations(agent_id, chunk_operations)
-
-      return {
-        "message": "Successfully added %i operation(s) to the agent \"%s/%s/%s\" context."
-                   % (len(operations), self.config["owner"], self.config["project"], agent_id)
-      }
+      return super(Client, self).add_operations(
+        agent_id,
+        operations_from_df(operations, self.config["operationsChunksSize"]),
+        deadline)
     else:
-      return super(Client, self).add_operations(agent_id, operations)
+      return super(Client, self).add_operations(agent_id, operations, deadline)
+
+  def get_operations_list(self, agent_id, start=None, end=None, parallelism=None,
+                          deadline=None):
+    operations_list = super(Client, self).get_operations_list(agent_id, start, end,
+                                                              parallelism, deadline)
+
+    return operations_to_df(operations_list)
+
+  def iter_operations(self, agent_id, start=None, end=None, chunk_size=None, deadline=None):
+    """Yields the agent's operations as DataFrames of at most `chunk_size` rows"""
+    for operations_list in super(Client, self).iter_operations(agent_id, start, end,
+                                                               chunk_size, deadline):
+      yield operations_to_df(operations_list)
 
-  def get_operations_list(self, agent_id):
-    operations_list = super(Client, self).get_operations_list(agent_id)
+  def get_context_states(self, pairs, concurrency=None, deadline=None):
+    """Retrieves the context states of many `(agent_id, timestamp)` pairs as
+    a DataFrame indexed by timestamp, with an `agent_id` column, a column by
+    context property and an `error` column for the failed pairs."""
+    context_states = super(Client, self).get_context_states(pairs, concurrency, deadline)
 
     return pd.DataFrame(
-      [operation["context"] for operation in operations_list],
-      index=pd.to_datetime([operation["timestamp"] for operation in operations_list], unit="s")
+      [
+        dict(
+          result["context_state"]["context"] if "context_state" in result
+          else {"error": result["error"].message},
+          agent_id=result["agent_id"]
+        ) for result in context_states
+      ],
+      index=pd.to_datetime([result["timestamp"] for result in context_states], unit="s")
     )
 
   @staticmethod
@@ -0,0 +1,67 @@
+import pandas as pd
+
+from ..errors import CraftAiBadRequestError
+
+# Aggregations of the values falling in each interval, `ffill` being the
+# last value, carried from the previous intervals when there is none.
+_AGGREGATIONS = ["mean", "median", "min", "max", "first", "last", "ffill"]
+_NUMERICAL_AGGREGATIONS = ["mean", "median", "min", "max"]
+
+_DEFAULT_AGGREGATIONS = {
+  "continuous": "mean"
+}
+
+def resample_operations(df, configuration, interval=None, aggregations=None):
+  """Resamples a time indexed DataFrame of operations before its upload
+
+  Values are aggregated by `interval` seconds, defaulting to the agent's
+  `time_quantum` as the trees don't use finer variations. `aggregations`
+  maps context properties to one of `mean`, `median`, `min`, `max`,
+  `first`, `last` or `ffill`, continuous properties being averaged and the
+  others keeping their last value by default. Each interval `(t - interval,
+  t]` gives the operation at `t`, intervals left without values being
+  dropped.
+  """
+  if not isinstance(df.index, pd.DatetimeIndex):
+    raise CraftAiBadRequestError("Invalid dataframe given, it is not time indexed")
+
+  time_quantum = configuration.get("time_quantum")
+  interval = interval or time_quantum
+  if not interval or interval <= 0:
+    raise CraftAiBadRequestError("""Unable to resample operations without a positive"""
+                                 """ interval or time quantum.""")
+  if time_quantum and interval < time_quantum:
+    raise CraftAiBadRequestError("""Unable to resample operations every {}s, below the"""
+                                 """ agent's time quantum of {}s."""
+                                 .format(interval, time_quantum))
+
+  aggregations = aggregations or {}
+  context = configuration.get("context", {})
+  columns_aggregations = {}
+  for column in df.columns:
+    if column not in context:
+      raise CraftAiBadRequestError("""Unable to resample the property '{}', it isn't"""
+                                   """ in the agent's context.""".format(column))
+    property_type = context[column].get("type")
+    aggregation = aggregations.get(column, _DEFAULT_AGGREGATIONS.get(property_type, "last"))
+    if aggregation not in _AGGREGATIONS:
+      raise CraftAiBadRequestError("""Unknown aggregation '{}' given for the property"""
+                                   """ '{}', it should be one of {}."""
+                                   .format(aggregation, column, ", ".join(_AGGREGATIONS)))
+    if aggregation in _NUMERICAL_AGGREGATIONS and property_type != "continuous":
+      raise CraftAiBadRequestError("""Unable to aggregate the {} property '{}' with"""
+                                   """ '{}'.""".format(property_type, column, aggregation))
+    columns_aggregations[column] = aggregation
+
+  resampler = df.resample(pd.Timedelta(seconds=interval), closed="right", label="right")
+  resampled_df = resampler.agg(dict(
+    (column, "last" if aggregation == "ffill" else aggregation)
+    for column, aggregation in columns_aggregations.items()))
+  ffill_columns = [column for column, aggregation in columns_aggregations.items()
+                   if aggregation == "ffill"]
+  if ffill_columns:
+    resampled_df[ffill_columns] = resampled_df[ffill_columns].ffill()
+
+  # Filled values mustn't make operations of the intervals without values
+  has_values = resampler.count().sum(axis=1) > 0
+  return resampled_df.loc[has_values, list(df.columns)]
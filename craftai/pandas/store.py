@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import six
+
+from six.moves.urllib.parse import quote
+
+from ..errors import CraftAiBadRequestError
+from .client import operations_to_df
+
+_MANIFEST = "manifest.json"
+
+class OperationsStore(object):
+  """Local replica of agents' operations, stored as columnar segments
+
+  Each agent has a directory holding a manifest and segments. A segment
+  stores the timestamps and, for each context property, an array of values:
+  the numbers and booleans with their dtype, and integer codes referencing a
+  list of categories for the strings. Missing values are NaN and -1 codes.
+
+  By default, segments are directories of `.npy` files which are read as
+  memory-mapped arrays, only the requested ranges being loaded. With
+  `compress`, they are `.npz` archives with delta-encoded timestamps, several
+  times smaller on disk but entirely decompressed in memory when read.
+  """
+  def __init__(self, client, path, compress=False, segment_size=100000):
+    self._client = client
+    self.path = path
+    self.compress = compress
+    self.segment_size = segment_size
+
+  def sync(self, agent_id, deadline=None):
+    """Retrieves the operations added since the last sync
+
+    Returns the number of operations added to the replica.
+    """
+    manifest = self._load_manifest(agent_id)
+    start = manifest["lastTimestamp"]
+    # Operations may have been added since at the last stored timestamp,
+    # they are fetched again from it and the stored ones dropped.
+    stored_count = 0 if start is None else len(self.read_arrays(agent_id, start, start)[0])
+
+    added_count = 0
+    pending = []
+    pending_count = 0
+    for chunk in self._client.iter_operations(agent_id, start=start, deadline=deadline):
+      if not isinstance(chunk, pd.DataFrame):
+        chunk = operations_to_df(chunk)
+      if stored_count:
+        timestamps = chunk.index.values.astype("datetime64[s]").astype("int64")
+        dropped_count = min(stored_count, np.searchsorted(timestamps, start, "right"))
+        chunk = chunk.iloc[dropped_count:]
+        stored_count = stored_count - dropped_count if chunk.empty else 0
+      if chunk.empty:
+        continue
+      pending.append(chunk)
+      pending_count += len(chunk)
+      if pending_count >= self.segment_size:
+        self._write_segment(agent_id, manifest, pd.concat(pending, sort=False))
+        added_count += pending_count
+        pending = []
+        pending_count = 0
+
+    if pending_count:
+      self._write_segment(agent_id, manifest, pd.concat(pending, sort=False))
+      added_count += pending_count
+
+    return added_count
+
+  def last_timestamp(self, agent_id):
+    return self._load_manifest(agent_id)["lastTimestamp"]
+
+  def read_arrays(self, agent_id, start=None, end=None):
+    """Returns the stored timestamps in [start, end] and the matching values
+
+    Values are given as a dict of arrays by context property, string values
+    being decoded to object arrays.
+    """
+    manifest = self._load_manifest(agent_id)
+    timestamps_list = []
+    values_lists = dict((prop, []) for prop in manifest["properties"])
+
+    for segment in manifest["segments"]:
+      if ((start is not None and segment["end"] < start) or
+          (end is not None and segment["start"] > end)):
+        continue
+      arrays = self._load_segment(agent_id, segment)
+      timestamps = arrays["timestamps"]
+      if segment["deltas"]:
+        timestamps = np.cumsum(timestamps)
+      lower = 0 if start is None else np.searchsorted(timestamps, start, "left")
+      upper = len(timestamps) if end is None else np.searchsorted(timestamps, end, "right")
+      timestamps_list.append(timestamps[lower:upper])
+
+      for prop, values_list in values_lists.items():
+        values_list.append(_decode_column(arrays, prop, lower, upper))
+
+    if not timestamps_list:
+      return np.array([], dtype="int64"), dict((prop, np.array([])) for prop in values_lists)
+
+    return (_concatenate(timestamps_list),
+            dict((prop, _concatenate(values_list))
+                 for prop, values_list in values_lists.items()))
+
+  def read(self, agent_id, start=None, end=None):
+    """Returns the stored operations in [start, end] as a DataFrame
+
+    The DataFrame has the same format as the one returned by the pandas
+    client's `get_operations_list`.
+    """
+    timestamps, values = self.read_arrays(agent_id, start, end)
+    manifest = self._load_manifest(agent_id)
+    return pd.DataFrame(values,
+                        columns=manifest["properties"],
+                        index=pd.to_datetime(timestamps, unit="s"))
+
+  ####################
+  # Internal helpers #
+  ####################
+
+  def _agent_dir(self, agent_id):
+    if not agent_id:
+      raise CraftAiBadRequestError("agent_id has to be a non-empty string")
+    return os.path.join(self.path, quote(agent_id, safe=""))
+
+  def _load_manifest(self, agent_id):
+    try:
+      with open(os.path.join(self._agent_dir(agent_id), _MANIFEST)) as f:
+        return json.load(f)
+    except (IOError, OSError):
+      return {"lastTimestamp": None, "properties": [], "segments": []}
+
+  def _save_manifest(self, agent_id, manifest):
+    # Written then renamed for the readers never to see a partial manifest
+    manifest_path = os.path.join(self._agent_dir(agent_id), _MANIFEST)
+    with open(manifest_path + ".tmp", "w") as f:
+      json.dump(manifest, f)
+    os.rename(manifest_path + ".tmp", manifest_path)
+
+  def _write_segment(self, agent_id, manifest, operations_df):
+    agent_dir = self._agent_dir(agent_id)
+    if not os.path.isdir(agent_dir):
+      os.makedirs(agent_dir)
+
+    timestamps = operations_df.index.values.astype("datetime64[s]").astype("int64")
+    if self.compress:
+      arrays = {"timestamps": np.concatenate((timestamps[:1], np.diff(timestamps)))}
+    else:
+      arrays = {"timestamps": timestamps}
+    for prop in operations_df.columns:
+      arrays.update(_encode_column(prop, operations_df[prop]))
+      if prop not in manifest["properties"]:
+        manifest["properties"].append(prop)
+
+    # Segments are written under a temporary name then renamed, leftovers of
+    # an interrupted sync, which the manifest doesn't reference, are removed.
+    name = "{:08d}".format(len(manifest["segments"]))
+    extension = ".npz" if self.compress else ""
+    segment_path = os.path.join(agent_dir, name + extension)
+    tmp_path = os.path.join(agent_dir, name + ".tmp" + extension)
+    _remove(segment_path)
+    _remove(tmp_path)
+    if self.compress:
+      np.savez_compressed(tmp_path, **arrays)
+    else:
+      os.makedirs(tmp_path)
+      for key, array in arrays.items():
+        np.save(os.path.join(tmp_path, quote(key, safe="") + ".npy"), array)
+    os.rename(tmp_path, segment_path)
+
+    manifest["segments"].append({
+      "name": name,
+      "start": int(timestamps[0]),
+      "end": int(timestamps[-1]),
+      "count": len(timestamps),
+      "deltas": self.compress
+    })
+    manifest["lastTimestamp"] = int(timestamps[-1])
+    self._save_manifest(agent_id, manifest)
+
+  def _load_segment(self, agent_id, segment):
+    agent_dir = self._agent_dir(agent_id)
+    if segment["deltas"]:
+      with np.load(os.path.join(agent_dir, segment["name"] + ".npz")) as archive:
+        return dict((key, archive[key]) for key in archive.files)
+
+    segment_dir = os.path.join(agent_dir, segment["name"])
+    return _LazyArrays(segment_dir)
+
+class _LazyArrays(object):
+  """Memory-maps the `.npy` files of an uncompressed segment on access"""
+  def __init__(self, segment_dir):
+    self._segment_dir = segment_dir
+
+  def _path(self, key):
+    return os.path.join(self._segment_dir, quote(key, safe="") + ".npy")
+
+  def __contains__(self, key):
+    return os.path.exists(self._path(key))
+
+  def __getitem__(self, key):
+    return np.load(self._path(key), mmap_mode="r")
+
+def _remove(path):
+  if os.path.isdir(path):
+    shutil.rmtree(path)
+  elif os.path.exists(path):
+    os.remove(path)
+
+def _encode_column(prop, series):
+  if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+    # Kept as is for `read` to give back the same dtypes
+    return {"p:" + prop: series.values}
+  inferred_type = pd.api.types.infer_dtype(series, skipna=True)
+  if inferred_type == "boolean":
+    # Booleans with missing values, as object arrays
+    return {"b:" + prop: series.map({True: 1, False: 0}).fillna(-1).astype("int8").values}
+  if (pd.api.types.is_numeric_dtype(series) or
+      inferred_type in ["empty", "floating", "integer", "mixed-integer-float"]):
+    return {"p:" + prop: series.astype("float64").values}
+
+  codes, categories = pd.factorize(series)
+  return {
+    "c:" + prop: codes.astype("int32"),
+    "v:" + prop: np.array([six.text_type(category) for category in categories], dtype="U")
+  }
+
+def _decode_column(arrays, prop, lower, upper):
+  if "c:" + prop in arrays:
+    codes = np.asarray(arrays["c:" + prop][lower:upper])
+    categories = np.asarray(arrays["v:" + prop]).astype(object)
+    values = np.full(len(codes), np.nan, dtype=object)
+    present = codes >= 0
+    values[present] = categories[codes[present]]
+    return values
+  if "b:" + prop in arrays:
+    codes = np.asarray(arrays["b:" + prop][lower:upper])
+    values = np.full(len(codes), np.nan, dtype=object)
+    values[codes == 1] = True
+    values[codes == 0] = False
+    return values
+  if "p:" + prop in arrays:
+    return arrays["p:" + prop][lower:upper]
+  # The property didn't appear in this segment
+  return np.full(upper - lower, np.nan)
+
+def _concatenate(arrays):
+  if len(arrays) == 1:
+    # Keeping memory-mapped arrays as is
+    return arrays[0]
+  kinds = set(array.dtype.kind for array in arrays)
+  if len(kinds) > 1 and kinds & set("biuO"):
+    # Booleans and integers mixed with missing values are objects, for them
+    # to keep their type
+    return np.concatenate([np.asarray(array).astype(object) for array in arrays])
+  return np.concatenate(arrays)
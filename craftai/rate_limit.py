@@ -0,0 +1,193 @@
+import math
+import re
+import threading
+import time
+
+from collections import deque
+from email.utils import mktime_tz, parsedate_tz
+
+from craftai.errors import CraftAiTimeoutError
+from craftai.helpers import monotonic
+
+# Lowest rate, in requests per second, the limiter adapts to
+_MIN_RATE = 0.1
+
+# After a rate limit, the rate doubles back in about this many seconds
+_RECOVERY_TIME = 10.
+
+# Rate limits reported within this many seconds after a decrease, by the
+# requests already in flight, don't lower the rate again
+_DECREASE_INTERVAL = 1.
+
+# Delay before retrying a rate limited request without a `Retry-After`
+_DEFAULT_RETRY_AFTER = 1.
+
+_ENDPOINT_CLASS_REGEX = re.compile(r"/agents/[^/?]+/(context|decision|shared)")
+
+def endpoint_class(url):
+  """Returns the class of API endpoint the given URL belongs to"""
+  match = _ENDPOINT_CLASS_REGEX.search(url)
+  return match.group(1) if match else "agents"
+
+def parse_retry_after(value):
+  """Returns the delay, in seconds, given by a `Retry-After` header, either
+  as a number of seconds or as an HTTP date"""
+  if not value:
+    return _DEFAULT_RETRY_AFTER
+  try:
+    return max(0., float(value))
+  except ValueError:
+    pass
+  date = parsedate_tz(value)
+  if date is None:
+    return _DEFAULT_RETRY_AFTER
+  return max(0., mktime_tz(date) - time.time())
+
+class TokenBucket(object):
+  """Token bucket adapting its rate to the API's rate limits
+
+  Without a `rate`, requests are not limited until the API answers a 429.
+  The rate is then halved and the bucket paused for the `Retry-After`
+  delay, then it increases again with each successful request, up to the
+  given `rate` if any.
+  """
+  def __init__(self, rate=None, burst=None):
+    self.max_rate = rate
+    self.rate = rate
+    self.burst = burst or max(1., rate or 1.)
+    self._lock = threading.Lock()
+    self._tokens = self.burst
+    self._last_refill = monotonic()
+    self._paused_until = 0.
+    self._last_decrease = None
+    # Times of the last second's requests, to measure the actual rate
+    self._recent = deque()
+
+  def reserve(self, max_wait=None):
+    """Takes a token and returns how long the caller has to wait before
+    using it.
+
+    Returns None, without taking a token, if the wait would be longer than
+    `max_wait`.
+    """
+    with self._lock:
+      now = monotonic()
+      wait = max(0., self._paused_until - now)
+      if self.rate is not None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        # Tokens can go negative, the reservations then being queued
+        if self._tokens < 1:
+          wait = max(wait, (1 - self._tokens) / self.rate)
+      if max_wait is not None and wait > max_wait:
+        return None
+
+      if self.rate is not None:
+        self._tokens -= 1
+      self._recent.append(now)
+      while self._recent[0] < now - 1:
+        self._recent.popleft()
+      return wait
+
+  def cancel(self):
+    """Gives back a token whose request wasn't sent"""
+    with self._lock:
+      if self.rate is not None:
+        self._tokens = min(self.burst, self._tokens + 1)
+      if self._recent:
+        self._recent.pop()
+
+  def on_success(self):
+    with self._lock:
+      if self.rate is None:
+        return
+      # Each success adds a constant which makes the rate grow
+      # exponentially with time, whatever the rate.
+      self.rate += math.log(2) / _RECOVERY_TIME
+      if self.max_rate is not None:
+        self.rate = min(self.rate, self.max_rate)
+
+  def on_rate_limited(self, retry_after):
+    with self._lock:
+      now = monotonic()
+      if self._last_decrease is None or now - self._last_decrease >= _DECREASE_INTERVAL:
+        self._last_decrease = now
+        current_rate = self.rate if self.rate is not None else float(len(self._recent))
+        self.rate = max(_MIN_RATE, current_rate / 2)
+        self.burst = max(1., min(self.burst, self.rate))
+        self._tokens = min(self._tokens, 0.)
+        self._last_refill = now
+      self._paused_until = max(self._paused_until, now + retry_after)
+
+class InFlightGovernor(object):
+  """Limits the number of requests in flight, `None` meaning no limit"""
+  def __init__(self, max_in_flight=None):
+    self.max_in_flight = max_in_flight
+    self._condition = threading.Condition()
+    self._in_flight = 0
+
+  def acquire(self, timeout=None):
+    if self.max_in_flight is None:
+      return True
+    end = None if timeout is None else monotonic() + timeout
+    with self._condition:
+      while self._in_flight >= self.max_in_flight:
+        remaining = None if end is None else end - monotonic()
+        if remaining is not None and remaining <= 0:
+          return False
+        self._condition.wait(remaining)
+      self._in_flight += 1
+      return True
+
+  def release(self):
+    if self.max_in_flight is None:
+      return
+    with self._condition:
+      self._in_flight -= 1
+      self._condition.notify()
+
+class RateLimiter(object):
+  """Rate limiter and in-flight governor shared by a client's threads
+
+  With `per_endpoint`, each class of endpoint (agents, context, decision,
+  shared) has its own bucket and governor.
+  """
+  def __init__(self, rate=None, max_in_flight=None, per_endpoint=False):
+    self.rate = rate
+    self.max_in_flight = max_in_flight
+    self.per_endpoint = per_endpoint
+    self._lock = threading.Lock()
+    self._limits = {}
+
+  def _limits_for(self, endpoint):
+    key = endpoint if self.per_endpoint else None
+    with self._lock:
+      if key not in self._limits:
+        self._limits[key] = (TokenBucket(self.rate), InFlightGovernor(self.max_in_flight))
+      return self._limits[key]
+
+  def acquire(self, endpoint, deadline=None):
+    """Waits for the request to be allowed, raising a CraftAiTimeoutError if
+    the deadline is exceeded before."""
+    bucket, governor = self._limits_for(endpoint)
+    wait = bucket.reserve(None if deadline is None else deadline.remaining())
+    if wait is None:
+      raise CraftAiTimeoutError("""The deadline of {} second(s) would be"""
+                                """ exceeded waiting for the rate limit."""
+                                .format(deadline.seconds))
+    if wait > 0:
+      time.sleep(wait)
+    if not governor.acquire(None if deadline is None else deadline.check()):
+      bucket.cancel()
+      raise CraftAiTimeoutError("""The deadline of {} second(s) has been"""
+                                """ exceeded waiting for a request slot."""
+                                .format(deadline.seconds))
+
+  def release(self, endpoint):
+    self._limits_for(endpoint)[1].release()
+
+  def on_success(self, endpoint):
+    self._limits_for(endpoint)[0].on_success()
+
+  def on_rate_limited(self, endpoint, retry_after):
+    self._limits_for(endpoint)[0].on_rate_limited(retry_after)
@@ -0,0 +1,317 @@
+"""Local decision-serving daemon
+
+    python -m craftai.serve --token <token> --port 8765
+    python -m craftai.serve --token <token> --socket /tmp/craftai.sock
+
+The daemon keeps the agents' decision trees in memory, refreshed from the
+API by the client's decision tree cache, so that the processes of a host
+share them instead of each downloading and parsing them. Decisions are
+asked by POSTing to `/decide` a JSON object holding the `agent_id`, the
+`context`, optionally the `time` (`{"t": timestamp, "tz": "+01:00"}`) and
+the `timestamp` of the tree, the current time by default. Concurrent
+requests are gathered in micro-batches evaluated together with
+`Interpreter.decide_batch`. Responses are formatted as by
+`Interpreter.decide`, `DecideClient` sends the requests from Python.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from six.moves import queue
+
+from craftai import errors
+from craftai.client import CraftAIClient
+from craftai.deadline import to_deadline
+from craftai.errors import CraftAiBadRequestError, CraftAiError, CraftAiTimeoutError
+from craftai.errors import CraftAiUnknownError
+from craftai.interpreter import Interpreter
+from craftai.local_http import JSONConnection, JSONHandler, error_json, make_server
+from craftai.local_http import raise_error_json
+from craftai.time import Time
+from craftai.tree_cache import MemoryTreeCache
+
+class _Request(object):
+  """Decide request waiting for its batch to be evaluated"""
+  def __init__(self, agent_id, timestamp, args):
+    self.agent_id = agent_id
+    self.timestamp = timestamp
+    self.args = args
+    self.result = None
+    self.done = threading.Event()
+
+class DecisionServer(object):
+  """Serves decisions from in-memory trees, batching concurrent requests
+
+  Requests are gathered for at most `batch_window` seconds after the first
+  one, or until `max_batch_size` of them are waiting: a larger window
+  trades latency for throughput. The client's `decisionTreeCache` keeps the
+  trees, a MemoryTreeCache of at most `max_trees` is used if it has none.
+  Trees missing from the cache are downloaded by a thread of their own, the
+  batches of the agents whose trees are cached aren't held meanwhile.
+  """
+  def __init__(self, client, host="127.0.0.1", port=8765, unix_socket=None,
+               batch_window=0.002, max_batch_size=256, max_trees=1024):
+    if client.config["decisionTreeCache"] is None:
+      client = CraftAIClient(dict(client.config,
+                                  decisionTreeCache=MemoryTreeCache(max_trees)))
+    self.client = client
+    self.batch_window = batch_window
+    self.max_batch_size = max_batch_size
+    self.stats = {"requests": 0, "batches": 0}
+
+    self._queue = queue.Queue()
+    # Requests waiting, by cache key, for their tree to be downloaded
+    self._fetches_lock = threading.Lock()
+    self._fetches = {}
+    self._stopped = threading.Event()
+    self._batcher = None
+    self._thread = None
+
+    self._httpd = make_server(_Handler, host, port, unix_socket)
+    self._httpd.decision_server = self
+    self.unix_socket = unix_socket
+
+  @property
+  def address(self):
+    """The URL or, when listening on a Unix socket, the socket's path"""
+    if self.unix_socket is not None:
+      return self.unix_socket
+    host, port = self._httpd.server_address[:2]
+    return "http://{}:{}".format(host, port)
+
+  def start(self):
+    self._batcher = threading.Thread(target=self._batch_loop)
+    self._batcher.daemon = True
+    self._batcher.start()
+    self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.1,))
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+
+  def serve_forever(self):
+    self._batcher = threading.Thread(target=self._batch_loop)
+    self._batcher.daemon = True
+    self._batcher.start()
+    try:
+      self._httpd.serve_forever()
+    finally:
+      self._close()
+
+  def stop(self):
+    self._httpd.shutdown()
+    self._thread.join()
+    self._close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *_):
+    self.stop()
+
+  def decide(self, agent_id, timestamp, args, deadline=None):
+    """Queues the decision and waits for the result of its batch, at most
+    until the deadline or, without one, the client's `readTimeout`"""
+    deadline = to_deadline(deadline)
+    timeout = (deadline.remaining() if deadline is not None
+               else self.client.config["readTimeout"])
+    request = _Request(agent_id, timestamp, args)
+    self._queue.put(request)
+    if not request.done.wait(max(timeout, 0)):
+      raise CraftAiTimeoutError("""The decision for agent '{}' hasn't been"""
+                                """ taken in time.""".format(agent_id))
+    return request.result
+
+  ####################
+  # Internal helpers #
+  ####################
+
+  def _close(self):
+    self._stopped.set()
+    self._batcher.join()
+    self._httpd.server_close()
+    if self.unix_socket is not None and os.path.exists(self.unix_socket):
+      os.remove(self.unix_socket)
+
+  def _batch_loop(self):
+    while not self._stopped.is_set():
+      try:
+        batch = [self._queue.get(timeout=0.1)]
+      except queue.Empty:
+        continue
+      end = time.time() + self.batch_window
+      while len(batch) < self.max_batch_size:
+        remaining = end - time.time()
+        try:
+          batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                       else self._queue.get_nowait())
+        except queue.Empty:
+          break
+      self._evaluate(batch)
+
+  def _evaluate(self, batch):
+    self.stats["requests"] += len(batch)
+    self.stats["batches"] += 1
+
+    # Requests falling in the same cache bucket share the same tree
+    groups = {}
+    for request in batch:
+      try:
+        key = self.client.decision_tree_cache_key(request.agent_id, request.timestamp)
+      except Exception as e: #pylint: disable=W0703
+        _decide([request], None, e)
+        continue
+      groups.setdefault(key, []).append(request)
+
+    bucket = self.client.config["decisionTreeCacheBucket"]
+    for key, requests in groups.items():
+      agent_id, timestamp = requests[0].agent_id, requests[0].timestamp
+      try:
+        tree = self.client.cached_decision_tree(agent_id, timestamp)
+        if tree is None:
+          # The previous bucket's tree, when cached, is served while the
+          # new one is downloaded, for the agent not to stall at each change
+          tree = self.client.cached_decision_tree(agent_id, timestamp - bucket)
+          self._fetch_later(key, agent_id, timestamp, requests if tree is None else [])
+      except Exception as e: #pylint: disable=W0703
+        _decide(requests, None, e)
+        continue
+      if tree is not None:
+        _decide(requests, tree)
+
+  def _fetch_later(self, key, agent_id, timestamp, requests):
+    """Decides once the tree is downloaded, by a thread started for the
+    first requests needing it"""
+    with self._fetches_lock:
+      if key in self._fetches:
+        self._fetches[key].extend(requests)
+        return
+      self._fetches[key] = list(requests)
+    fetcher = threading.Thread(target=self._fetch, args=(key, agent_id, timestamp))
+    fetcher.daemon = True
+    fetcher.start()
+
+  def _fetch(self, key, agent_id, timestamp):
+    try:
+      tree, error = self.client.get_decision_tree(agent_id, timestamp), None
+    except Exception as e: #pylint: disable=W0703
+      tree, error = None, e
+    with self._fetches_lock:
+      requests = self._fetches.pop(key)
+    if requests:
+      _decide(requests, tree, error)
+
+def _decide(requests, tree, error=None):
+  """Sets the results of requests sharing the same tree, or the error"""
+  results = None
+  if error is None:
+    try:
+      results = Interpreter.decide_batch(tree, [request.args for request in requests])
+    except Exception as e: #pylint: disable=W0703
+      error = e
+  if results is None:
+    # Every request needs its result, its handler waits for it otherwise
+    if not isinstance(error, CraftAiError):
+      error = CraftAiUnknownError(str(error))
+    results = [error] * len(requests)
+  for request, result in zip(requests, results):
+    request.result = result
+    request.done.set()
+
+class _Handler(JSONHandler):
+  def do_POST(self): #pylint: disable=C0103
+    if self.path != "/decide":
+      return self.respond(404, {"message": "Unknown route {}.".format(self.path)})
+
+    try:
+      agent_id, timestamp, args = _parse_decide_request(self.read_json())
+    except (ValueError, KeyError, TypeError, CraftAiError) as e:
+      return self.respond(400, error_json(e if isinstance(e, CraftAiError)
+                                          else CraftAiBadRequestError(str(e))))
+
+    try:
+      result = self.server.decision_server.decide(agent_id, timestamp, args)
+    except CraftAiTimeoutError as e:
+      return self.respond(504, error_json(e))
+    if isinstance(result, CraftAiError):
+      status = 404 if isinstance(result, errors.CraftAiNotFoundError) else 400
+      return self.respond(status, error_json(result))
+    return self.respond(200, result)
+
+def _parse_decide_request(body):
+  agent_id = body["agent_id"]
+  context = body["context"]
+  if not isinstance(context, dict):
+    raise CraftAiBadRequestError("The context has to be an object.")
+  timestamp = int(body.get("timestamp") or time.time())
+  args = [context]
+  if body.get("time") is not None:
+    args.append(Time(body["time"]["t"], body["time"].get("tz", "")))
+  return agent_id, timestamp, args
+
+class DecideClient(object):
+  """Asks decisions to a DecisionServer
+
+  `address` is the server's URL or Unix socket path. Each thread keeps its
+  own connection to the server.
+  """
+  def __init__(self, address="http://127.0.0.1:8765", timeout=10.):
+    self.address = address
+    self.timeout = timeout
+    self._connection = JSONConnection(address, timeout)
+
+  def decide(self, agent_id, context, time=None, timestamp=None): #pylint: disable=W0621
+    """Returns the decision, formatted as by `Interpreter.decide`, raising
+    the same errors"""
+    payload = {"agent_id": agent_id, "context": context}
+    if time is not None:
+      payload["time"] = {"t": time.timestamp, "tz": time.timezone}
+    if timestamp is not None:
+      payload["timestamp"] = timestamp
+
+    status, result = self._connection.post("/decide", payload)
+    if status != 200:
+      raise_error_json(result)
+    return result
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="python -m craftai.serve",
+                                   description="Serves decisions from in-memory trees.")
+  parser.add_argument("--token", default=os.environ.get("CRAFT_TOKEN"),
+                      help="token of the project, defaults to $CRAFT_TOKEN")
+  parser.add_argument("--url", help="URL of the API, read from the token by default")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8765)
+  parser.add_argument("--socket", help="Unix socket to listen on instead of a TCP port")
+  parser.add_argument("--batch-window", type=float, default=0.002,
+                      help="maximum time, in seconds, a request waits for its batch")
+  parser.add_argument("--max-batch-size", type=int, default=256)
+  parser.add_argument("--tree-ttl", type=float, default=300,
+                      help="seconds after which trees are refreshed from the API")
+  parser.add_argument("--max-trees", type=int, default=1024,
+                      help="number of trees kept in memory, the least recently used evicted")
+  args = parser.parse_args(argv)
+  if not args.token:
+    parser.error("a token is needed, give --token or set $CRAFT_TOKEN")
+
+  cfg = {
+    "token": args.token,
+    "decisionTreeCache": MemoryTreeCache(args.max_trees),
+    "decisionTreeCacheTtl": args.tree_ttl
+  }
+  if args.url:
+    cfg["url"] = args.url
+  server = DecisionServer(CraftAIClient(cfg), args.host, args.port, args.socket,
+                          args.batch_window, args.max_batch_size)
+  sys.stdout.write("Serving decisions on {}\n".format(server.address))
+  sys.stdout.flush()
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
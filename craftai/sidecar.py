@@ -0,0 +1,176 @@
+"""Host-local operations sidecar
+
+    python -m craftai.sidecar --token <token> --socket /tmp/craftai-operations.sock
+
+When many processes of a host add a few operations at a time to the same
+agents, each call is a request to the API. Clients configured with the
+`operationsSidecar` key, the sidecar's Unix socket path or URL, post their
+operations to the sidecar instead, `add_operations` returning once they are
+queued. The sidecar merges the operations of each agent, sorted by
+timestamp, and uploads them by large chunks with its own client through an
+`OperationsBuffer`, spilling them to disk while the API is unavailable.
+"""
+
+import argparse
+import numbers
+import os
+import sys
+import threading
+
+from craftai.buffer import OperationsBuffer
+from craftai.client import CraftAIClient
+from craftai.errors import CraftAiBadRequestError, CraftAiError
+from craftai.local_http import JSONHandler, error_json, make_server
+
+class OperationsSidecar(object):
+  """Receives operations from local clients and uploads them by chunks
+
+  Operations are sent once `chunk_size` of them are waiting for an agent or
+  the oldest one has waited for `max_delay` seconds, a longer delay merging
+  more operations in each request. The sidecar only accepts operations for
+  its client's project.
+  """
+  def __init__(self, client, host="127.0.0.1", port=8766, unix_socket=None,
+               max_delay=1., chunk_size=1000, spill_path=None):
+    if (client.config["operationsChunksSize"] < chunk_size or
+        client.config["operationsSidecar"] is not None):
+      # The client would split the sidecar's chunks, or send them back to a
+      # sidecar
+      client = CraftAIClient(dict(client.config, operationsSidecar=None,
+                                  operationsChunksSize=max(chunk_size,
+                                                           client.config["operationsChunksSize"])))
+    self.client = client
+    self.buffer = OperationsBuffer(client, max_delay, chunk_size, spill_path,
+                                   sort_by_timestamp=True)
+    self.stats = {"requests": 0, "operations": 0}
+    self._stats_lock = threading.Lock()
+    self._thread = None
+
+    self._httpd = make_server(_Handler, host, port, unix_socket)
+    self._httpd.sidecar = self
+    self.unix_socket = unix_socket
+
+  @property
+  def address(self):
+    """The URL or, when listening on a Unix socket, the socket's path"""
+    if self.unix_socket is not None:
+      return self.unix_socket
+    host, port = self._httpd.server_address[:2]
+    return "http://{}:{}".format(host, port)
+
+  def start(self):
+    self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.1,))
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+
+  def serve_forever(self):
+    try:
+      self._httpd.serve_forever()
+    finally:
+      self._close()
+
+  def stop(self):
+    """Stops receiving operations and uploads the queued ones"""
+    self._httpd.shutdown()
+    self._thread.join()
+    self._close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *_):
+    self.stop()
+
+  def add_operations(self, owner, project, agent_id, operations):
+    if (owner, project) != (self.client.config["owner"], self.client.config["project"]):
+      raise CraftAiBadRequestError(
+        "The sidecar only accepts operations for the project \"{}/{}\".".format(
+          self.client.config["owner"], self.client.config["project"]))
+    _check_operations(operations)
+    for operation in operations:
+      self.buffer.push(agent_id, operation)
+    with self._stats_lock:
+      self.stats["requests"] += 1
+      self.stats["operations"] += len(operations)
+
+  ####################
+  # Internal helpers #
+  ####################
+
+  def _close(self):
+    self._httpd.server_close()
+    if self.unix_socket is not None and os.path.exists(self.unix_socket):
+      os.remove(self.unix_socket)
+    self.buffer.close()
+
+class _Handler(JSONHandler):
+  def do_GET(self): #pylint: disable=C0103
+    if self.path != "/metrics":
+      return self.respond(404, {"message": "Unknown route {}.".format(self.path)})
+    return self.respond(200, self.server.sidecar.buffer.metrics)
+
+  def do_POST(self): #pylint: disable=C0103
+    sidecar = self.server.sidecar
+    try:
+      body = self.read_json()
+      if self.path == "/operations":
+        sidecar.add_operations(body["owner"], body["project"], body["agent_id"],
+                               body["operations"])
+        return self.respond(200, {"message": "Queued {} operation(s).".format(
+          len(body["operations"]))})
+      if self.path == "/flush":
+        return self.respond(200, {"flushed": sidecar.buffer.flush(body.get("timeout"))})
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+      return self.respond(400, error_json(CraftAiBadRequestError(str(e))))
+    except CraftAiError as e:
+      return self.respond(400, error_json(e))
+    return self.respond(404, {"message": "Unknown route {}.".format(self.path)})
+
+def _check_operations(operations):
+  # Operations are checked before being queued, the API rejecting the whole
+  # chunk of a malformed one.
+  if not isinstance(operations, list):
+    raise CraftAiBadRequestError("Invalid operations given, it should be a list.")
+  for operation in operations:
+    if (not isinstance(operation, dict) or
+        not isinstance(operation.get("timestamp"), numbers.Real) or
+        not isinstance(operation.get("context"), dict)):
+      raise CraftAiBadRequestError("Invalid operation given, it should be an object"
+                                   " holding a numeric timestamp and a context.")
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="python -m craftai.sidecar",
+                                   description="Uploads the operations of local clients.")
+  parser.add_argument("--token", default=os.environ.get("CRAFT_TOKEN"),
+                      help="token of the project, defaults to $CRAFT_TOKEN")
+  parser.add_argument("--url", help="URL of the API, read from the token by default")
+  parser.add_argument("--socket", help="Unix socket to listen on instead of a TCP port")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8766)
+  parser.add_argument("--max-delay", type=float, default=1.,
+                      help="maximum time, in seconds, an operation waits for its chunk")
+  parser.add_argument("--chunk-size", type=int, default=1000)
+  parser.add_argument("--spill-path",
+                      help="file keeping the operations while the API is unavailable")
+  parser.add_argument("--changes-only", action="store_true",
+                      help="only upload the context properties which changed")
+  args = parser.parse_args(argv)
+  if not args.token:
+    parser.error("a token is needed, give --token or set $CRAFT_TOKEN")
+
+  cfg = {"token": args.token, "operationsChangesOnly": args.changes_only}
+  if args.url:
+    cfg["url"] = args.url
+  sidecar = OperationsSidecar(CraftAIClient(cfg), args.host, args.port, args.socket,
+                              args.max_delay, args.chunk_size, args.spill_path)
+  sys.stdout.write("Receiving operations on {}\n".format(sidecar.address))
+  sys.stdout.flush()
+  try:
+    sidecar.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,52 @@
+import threading
+
+from craftai.errors import CraftAiTimeoutError
+
+class _Call(object):
+  def __init__(self):
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+
+class SingleFlight(object):
+  """Shares the result of a call among the identical concurrent calls
+
+  While a call for a key is in flight, the other calls for the same key
+  wait for it and get its result, or its error, instead of making their own.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._calls = {}
+
+  def call(self, key, function, deadline=None):
+    """Returns the result of `function` and whether it was shared
+
+    Waiting for the call in flight is bounded by `deadline`, if any.
+    """
+    with self._lock:
+      call = self._calls.get(key)
+      in_flight = call is not None
+      if not in_flight:
+        call = _Call()
+        self._calls[key] = call
+
+    if in_flight:
+      timeout = deadline.remaining() if deadline is not None else None
+      if not call.done.wait(max(timeout, 0) if timeout is not None else None):
+        raise CraftAiTimeoutError("""The identical request in flight hasn't"""
+                                  """ completed before the deadline.""")
+      if call.error is not None:
+        raise call.error
+      return call.result, True
+
+    try:
+      call.result = function()
+    except BaseException as e:
+      # Interruptions are shared too, waiters mustn't take them for a success
+      call.error = e
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+      call.done.set()
+    return call.result, False
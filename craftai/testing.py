@@ -0,0 +1,473 @@
+"""Local stand-in for craft ai's API, to exercise the client offline"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from collections import Counter, OrderedDict
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qs, urlencode, urlsplit
+
+from craftai.compression import compress, decompress
+from craftai.context_state import ContextStates
+
+# Header giving the URL of the next page of a paginated response
+_NEXT_PAGE_HEADER = "x-craft-ai-next-page-url"
+
+_TREE_VERSION = "1.1.0"
+
+# Responses bodies smaller than this aren't compressed
+_COMPRESSION_THRESHOLD = 1024
+
+def fake_token(owner, project, platform):
+  """Builds an unsigned JWT holding what the client reads from real ones"""
+  segments = [
+    base64.urlsafe_b64encode(json.dumps(segment).encode("utf-8")).rstrip(b"=")
+    for segment in [{"alg": "none", "typ": "JWT"},
+                    {"owner": owner, "project": project, "platform": platform}]
+  ]
+  return (b".".join(segments) + b".c2lnbmF0dXJl").decode("ascii")
+
+class FakeServer(object):
+  """In-memory implementation of craft ai's agents API
+
+  The server runs in a background thread, serving the `agents`, `context`,
+  `context/state`, `decision/tree` and `shared` endpoints of a single
+  owner and project. Decision trees are read from `trees_dir`, a directory
+  of JSON trees such as the interpreter test suite's, by agent id (e.g.
+  `my_agent.json`) or in turn for the other agents. Without a matching
+  tree, a small tree is grown from the agent's operations.
+
+  `latency` is a number of seconds, or a function of the method and path,
+  added to each response. `error_rate` is the probability to answer with a
+  500 and `rate_limit` the number of requests allowed per second, the
+  others being answered with a 429 and a `Retry-After` of `retry_after`
+  seconds.
+
+      with FakeServer(latency=0.01) as server:
+        client = craftai.Client(server.client_config())
+  """
+  def __init__(self, owner="owner", project="project", host="127.0.0.1", port=0,
+               latency=0., error_rate=0., rate_limit=None, retry_after=1,
+               page_size=1000, trees_dir=None, max_tree_depth=3, seed=None):
+    self.owner = owner
+    self.project = project
+    self.latency = latency
+    self.error_rate = error_rate
+    self.rate_limit = rate_limit
+    self.retry_after = retry_after
+    self.page_size = page_size
+    self.max_tree_depth = max_tree_depth
+    self.token = None
+
+    self._random = random.Random(seed)
+    self._lock = threading.Lock()
+    self._agents = {}
+    self._trees = {}
+    self._corpus = _load_trees(trees_dir)
+    self._generated_trees = {}
+    self._injected_errors = []
+    self._window = (0, 0)
+    self._requests_counts = Counter()
+
+    self._httpd = _ThreadingHTTPServer((host, port), _Handler)
+    self._httpd.fake_server = self
+    self._thread = None
+
+  @property
+  def url(self):
+    host, port = self._httpd.server_address[:2]
+    return "http://{}:{}".format(host, port)
+
+  @property
+  def requests_counts(self):
+    """Number of requests received by endpoint, including the failed ones"""
+    with self._lock:
+      return dict(self._requests_counts)
+
+  def start(self):
+    self.token = fake_token(self.owner, self.project, self.url)
+    self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.1,))
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._httpd.shutdown()
+    self._httpd.server_close()
+    self._thread.join()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *_):
+    self.stop()
+
+  def client_config(self, **cfg):
+    """Returns a client configuration targeting this server"""
+    config = {"token": self.token, "url": self.url}
+    config.update(cfg)
+    return config
+
+  def set_tree(self, agent_id, tree):
+    """Serves the given decision tree for the agent"""
+    with self._lock:
+      self._trees[agent_id] = tree
+
+  def inject_errors(self, status, count=1, endpoint=None):
+    """Answers the next `count` requests, or the next ones to the given
+    endpoint, with the given status"""
+    with self._lock:
+      self._injected_errors.extend([(status, endpoint)] * count)
+
+  def reset(self):
+    with self._lock:
+      self._agents.clear()
+      self._trees.clear()
+      self._generated_trees.clear()
+      del self._injected_errors[:]
+      self._requests_counts.clear()
+
+  ####################
+  # Internal helpers #
+  ####################
+
+  def _admit(self, method, path, endpoint):
+    """Returns the error status the request has to be answered with, if any"""
+    latency = self.latency(method, path) if callable(self.latency) else self.latency
+    if latency:
+      time.sleep(latency)
+
+    with self._lock:
+      self._requests_counts[endpoint] += 1
+
+      for i, (status, error_endpoint) in enumerate(self._injected_errors):
+        if error_endpoint is None or error_endpoint == endpoint:
+          del self._injected_errors[i]
+          return status
+
+      if self.rate_limit is not None:
+        second = int(time.time())
+        window_second, window_count = self._window
+        if window_second != second:
+          window_second, window_count = second, 0
+        if window_count >= self.rate_limit:
+          return 429
+        self._window = (window_second, window_count + 1)
+
+      if self.error_rate and self._random.random() < self.error_rate:
+        return 500
+    return None
+
+  def _create_agent(self, body):
+    configuration = body.get("configuration")
+    if not isinstance(configuration, dict):
+      return 400, {"message": "The agent configuration is missing."}
+    with self._lock:
+      agent_id = body.get("id") or uuid.uuid4().hex
+      if agent_id in self._agents:
+        return 400, {"message": "An agent with id '{}' already exists.".format(agent_id)}
+      self._agents[agent_id] = {
+        "id": agent_id,
+        "configuration": configuration,
+        "operations": [],
+        "creationDate": int(time.time())
+      }
+      return 201, self._agent_json(agent_id)
+
+  def _agent_json(self, agent_id):
+    agent = self._agents[agent_id]
+    agent_json = {
+      "id": agent_id,
+      "configuration": agent["configuration"],
+      "creationDate": agent["creationDate"]
+    }
+    if agent["operations"]:
+      agent_json["firstTimestamp"] = agent["operations"][0]["timestamp"]
+      agent_json["lastTimestamp"] = agent["operations"][-1]["timestamp"]
+    return agent_json
+
+  def _add_operations(self, agent_id, operations):
+    if not isinstance(operations, list) or not all(
+        isinstance(operation, dict) and "timestamp" in operation and "context" in operation
+        for operation in operations):
+      return 400, {"message": "Invalid operations given."}
+    with self._lock:
+      stored = self._agents[agent_id]["operations"]
+      timestamps = [operation["timestamp"] for operation in stored[-1:] + operations]
+      in_order = all(previous <= current
+                     for previous, current in zip(timestamps, timestamps[1:]))
+      stored.extend(operations)
+      if not in_order:
+        stored.sort(key=lambda operation: operation["timestamp"])
+    return 201, {"message": "Successfully added {} operation(s) to the agent \"{}/{}/{}\""
+                            " context.".format(len(operations), self.owner,
+                                               self.project, agent_id)}
+
+  def _operations_page(self, agent_id, path, query):
+    start = _int_param(query, "start")
+    end = _int_param(query, "end")
+    # Number of operations at `start` already given in the previous pages
+    offset = _int_param(query, "offset") or 0
+    with self._lock:
+      operations = [
+        operation for operation in self._agents[agent_id]["operations"]
+        if (start is None or operation["timestamp"] >= start) and
+        (end is None or operation["timestamp"] <= end)
+      ]
+
+    headers = {}
+    if len(operations) > offset + self.page_size:
+      given = operations[:offset + self.page_size]
+      operations = given[offset:]
+      # The next page starts at the last timestamp, after the operations
+      # already given at it
+      last_timestamp = given[-1]["timestamp"]
+      params = [
+        ("start", last_timestamp),
+        ("offset", sum(1 for operation in given if operation["timestamp"] == last_timestamp))
+      ]
+      if end is not None:
+        params.append(("end", end))
+      headers[_NEXT_PAGE_HEADER] = "{}{}?{}".format(self.url, path, urlencode(params))
+    else:
+      operations = operations[offset:]
+    return 200, operations, headers
+
+  def _context_state(self, agent_id, query):
+    with self._lock:
+      operations = list(self._agents[agent_id]["operations"])
+    timestamp = _int_param(query, "t")
+    if timestamp is None:
+      timestamp = operations[-1]["timestamp"] if operations else int(time.time())
+    return 200, ContextStates(operations).get(timestamp)
+
+  def _decision_tree(self, agent_id, query):
+    with self._lock:
+      if agent_id in self._trees:
+        return 200, self._trees[agent_id]
+      if agent_id in self._corpus:
+        return 200, self._corpus[agent_id]
+      if self._corpus:
+        # Each agent keeps the tree it is given first
+        trees = list(self._corpus.values())
+        return 200, self._trees.setdefault(agent_id, trees[len(self._trees) % len(trees)])
+      agent = self._agents[agent_id]
+      operations = agent["operations"]
+      timestamp = _int_param(query, "t")
+      if timestamp is not None:
+        operations = [operation for operation in operations
+                      if operation["timestamp"] <= timestamp]
+      # Trees only change with the operations they are learnt from
+      key = (agent_id, len(operations))
+      if key not in self._generated_trees:
+        self._generated_trees[key] = generate_tree(agent["configuration"], operations,
+                                                   self.max_tree_depth)
+      return 200, self._generated_trees[key]
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  # Headers and body are written separately, without this each response
+  # would wait for the client's delayed acknowledgement.
+  disable_nagle_algorithm = True
+
+  def log_message(self, *_): #pylint: disable=W0221
+    pass
+
+  def do_GET(self): #pylint: disable=C0103
+    self._handle("GET")
+
+  def do_POST(self): #pylint: disable=C0103
+    self._handle("POST")
+
+  def do_DELETE(self): #pylint: disable=C0103
+    self._handle("DELETE")
+
+  def _handle(self, method):
+    server = self.server.fake_server
+    url = urlsplit(self.path)
+    query = parse_qs(url.query)
+    body = self._read_body()
+
+    prefix = "/api/v1/{}/{}/agents".format(server.owner, server.project)
+    if not url.path.startswith(prefix):
+      return self._respond(404, {"message": "Unknown route {}.".format(url.path)})
+    parts = [part for part in url.path[len(prefix):].split("/") if part]
+    endpoint = "/".join(["agents"] + parts[1:])
+
+    status = server._admit(method, url.path, endpoint) #pylint: disable=W0212
+    if status is not None:
+      headers = {"Retry-After": str(server.retry_after)} if status == 429 else {}
+      return self._respond(status, {"message": "Injected error."}, headers)
+
+    authorization = self.headers.get("Authorization") or ""
+    if authorization != "Bearer {}".format(server.token):
+      return self._respond(401, {"message": "Invalid token."})
+
+    try:
+      payload = json.loads(body.decode("utf-8")) if body else None
+    except ValueError:
+      return self._respond(400, {"message": "Invalid JSON payload."})
+
+    # pylint: disable=W0212
+    if not parts:
+      if method == "POST":
+        return self._respond(*server._create_agent(payload or {}))
+      if method == "GET":
+        with server._lock:
+          return self._respond(200, {"agentsList": sorted(server._agents)})
+      return self._respond(405, {"message": "Method not allowed."})
+
+    agent_id = parts[0]
+    with server._lock:
+      if agent_id not in server._agents:
+        return self._respond(404, {"message": "Agent '{}' not found.".format(agent_id)})
+
+    route = (method, endpoint)
+    if route == ("GET", "agents"):
+      with server._lock:
+        return self._respond(200, server._agent_json(agent_id))
+    if route == ("DELETE", "agents"):
+      with server._lock:
+        agent_json = server._agent_json(agent_id)
+        del server._agents[agent_id]
+        server._trees.pop(agent_id, None)
+      return self._respond(200, agent_json)
+    if route == ("POST", "agents/context"):
+      return self._respond(*server._add_operations(agent_id, payload))
+    if route == ("GET", "agents/context"):
+      return self._respond(*server._operations_page(agent_id, url.path, query))
+    if route == ("GET", "agents/context/state"):
+      return self._respond(*server._context_state(agent_id, query))
+    if route == ("GET", "agents/decision/tree"):
+      return self._respond(*server._decision_tree(agent_id, query))
+    if route == ("GET", "agents/shared"):
+      return self._respond(200, {"shortUrl": "{}/inspector/{}".format(server.url, agent_id)})
+    if route == ("DELETE", "agents/shared"):
+      return self._respond(200, {"message": "Shared url deleted."})
+    return self._respond(404, {"message": "Unknown route {}.".format(url.path)})
+    # pylint: enable=W0212
+
+  def _read_body(self):
+    length = int(self.headers.get("Content-Length") or 0)
+    body = self.rfile.read(length) if length else b""
+    encoding = self.headers.get("Content-Encoding")
+    if body and encoding in ("gzip", "deflate"):
+      body = decompress(body, encoding)
+    return body
+
+  def _respond(self, status, payload, headers=None):
+    body = json.dumps(payload).encode("utf-8")
+    headers = dict(headers or {})
+
+    if self.command == "GET" and status == 200:
+      etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+      headers["ETag"] = etag
+      if self.headers.get("If-None-Match") == etag:
+        status, body = 304, b""
+
+    accepted = self.headers.get("Accept-Encoding") or ""
+    if len(body) >= _COMPRESSION_THRESHOLD and "gzip" in accepted:
+      body = compress(body, "gzip", 6)
+      headers["Content-Encoding"] = "gzip"
+
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json; charset=utf-8")
+    self.send_header("Content-Length", str(len(body)))
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+def generate_tree(configuration, operations, max_depth=3):
+  """Grows a decision tree, in the API's format, from the given operations
+
+  The tree isn't meant to be accurate, only to have the shape of a real
+  one: at each level, the samples are split on the next continuous or enum
+  context property.
+  """
+  outputs = configuration.get("output", [])
+  features = sorted(
+    prop for prop, prop_configuration in configuration.get("context", {}).items()
+    if prop not in outputs and prop_configuration.get("type") in ("continuous", "enum"))
+
+  timestamps = [operation["timestamp"] for operation in operations]
+  samples = [state["context"] for state in ContextStates(operations).get_many(timestamps)]
+
+  trees = {}
+  for output in outputs:
+    output_type = configuration["context"].get(output, {}).get("type")
+    output_samples = [sample for sample in samples if sample.get(output) is not None]
+    trees[output] = _grow(output_samples, features, configuration["context"],
+                          output, output_type, max_depth)
+  return {
+    "_version": _TREE_VERSION,
+    "configuration": configuration,
+    "trees": trees
+  }
+
+def _grow(samples, features, context_configuration, output, output_type, depth):
+  if depth > 0:
+    for i, feature in enumerate(features):
+      values = [sample[feature] for sample in samples if feature in sample]
+      if len(set(values)) < 2 or len(values) < len(samples):
+        continue
+      if context_configuration[feature]["type"] == "enum":
+        rules = [("is", value, lambda value, operand: value == operand)
+                 for value in sorted(set(values), key=str)]
+      else:
+        values = sorted(values)
+        median = values[len(values) // 2]
+        rules = [("<", median, lambda value, operand: value < operand),
+                 (">=", median, lambda value, operand: value >= operand)]
+
+      remaining_features = features[i + 1:] + features[:i]
+      children = []
+      for operator, operand, matches in rules:
+        child = _grow([sample for sample in samples if matches(sample[feature], operand)],
+                      remaining_features, context_configuration, output, output_type,
+                      depth - 1)
+        child["decision_rule"] = {"property": feature, "operator": operator, "operand": operand}
+        children.append(child)
+      return {"children": children}
+
+  return _leaf([sample[output] for sample in samples], output_type)
+
+def _leaf(values, output_type):
+  if not values:
+    return {"predicted_value": None, "confidence": 0}
+  if output_type == "continuous":
+    mean = float(sum(values)) / len(values)
+    variance = sum((value - mean) ** 2 for value in values) / len(values)
+    return {
+      "predicted_value": mean,
+      "confidence": 1. / (1. + variance),
+      "standard_deviation": variance ** 0.5
+    }
+  value, count = Counter(values).most_common(1)[0]
+  return {"predicted_value": value, "confidence": float(count) / len(values)}
+
+def _load_trees(trees_dir):
+  """Returns the JSON trees of the given directory by file name, without
+  the extension"""
+  trees = OrderedDict()
+  if trees_dir is None:
+    return trees
+  for tree_file in sorted(os.listdir(trees_dir)):
+    with open(os.path.join(trees_dir, tree_file)) as f:
+      trees[os.path.splitext(tree_file)[0]] = json.load(f)
+  return trees
+
+def _int_param(query, name):
+  values = query.get(name)
+  return int(values[0]) if values else None
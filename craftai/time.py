@@ -10,13 +10,17 @@ from datetime import datetime, tzinfo, timedelta
 import six
 
 from pytz import utc as pyutc
-from tzlocal import get_localzone
 
 from craftai.errors import CraftAiTimeError
 
 _EPOCH = datetime(1970, 1, 1, tzinfo=pyutc)
 _ISO_FMT = "%Y-%m-%dT%H:%M:%S%z"
 
+def get_localzone():
+  # tzlocal is slow to import and only needed without explicit timezones
+  from tzlocal import get_localzone as tzlocal_get_localzone
+  return tzlocal_get_localzone()
+
 class Time(object):
   """Handles time in a useful way for craft ai's client"""
   def __init__(self, t=None, timezone=""):
@@ -25,9 +29,10 @@ class Time(object):
       time = datetime.now(get_localzone())
     elif isinstance(t, int):
       # Else if t is an int we try to use it as a given timestamp with
-      # local UTC offset by default
+      # local UTC offset by default, the local timezone isn't needed when
+      # converting to a given one.
       try:
-        time = datetime.fromtimestamp(t, get_localzone())
+        time = datetime.fromtimestamp(t, pyutc if timezone else get_localzone())
       except (OverflowError, OSError) as e:
         raise CraftAiTimeError(
           """Unable to instantiate Time from given timestamp. {}""".
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from six.moves.urllib.parse import quote
+
+class MemoryTreeCache(object):
+  """Keeps decision trees in memory
+
+  Trees are stored by key, an `(agent_id, timestamp bucket)` tuple, along
+  with the time at which they were retrieved. Any object providing the same
+  `get`, `set` and `invalidate` methods can be used as a cache. With
+  `max_entries`, the least recently used trees are evicted beyond it, long
+  running processes needing it as each bucket holds its own tree.
+
+  The same tree objects are given to all the callers, which must treat them
+  as read-only.
+  """
+  def __init__(self, max_entries=None):
+    self.max_entries = max_entries
+    self._lock = threading.Lock()
+    self._trees = OrderedDict()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._trees.pop(key, None)
+      if entry is not None:
+        self._trees[key] = entry
+      return entry
+
+  def set(self, key, tree, stored_at):
+    with self._lock:
+      self._trees.pop(key, None)
+      self._trees[key] = (tree, stored_at)
+      while self.max_entries is not None and len(self._trees) > self.max_entries:
+        self._trees.popitem(last=False)
+
+  def invalidate(self, agent_id):
+    with self._lock:
+      for key in [key for key in self._trees if key[0] == agent_id]:
+        del self._trees[key]
+
+class DiskTreeCache(object):
+  """Keeps decision trees as JSON files in the given directory
+
+  Each agent has its own sub directory so that the cache can be shared by
+  several processes and survives restarts.
+  """
+  def __init__(self, path):
+    self.path = path
+
+  def _agent_dir(self, agent_id):
+    return os.path.join(self.path, quote(agent_id, safe=""))
+
+  def _tree_path(self, key):
+    agent_id, bucket = key
+    return os.path.join(self._agent_dir(agent_id), "{}.json".format(bucket))
+
+  def get(self, key):
+    try:
+      with open(self._tree_path(key)) as f:
+        entry = json.load(f)
+    except (IOError, OSError, ValueError):
+      return None
+    return entry["tree"], entry["storedAt"]
+
+  def set(self, key, tree, stored_at):
+    agent_dir = self._agent_dir(key[0])
+    if not os.path.isdir(agent_dir):
+      try:
+        os.makedirs(agent_dir)
+      except OSError:
+        # The directory was created concurrently
+        pass
+    # Written then renamed for the readers never to see a partial file
+    tree_path = self._tree_path(key)
+    tmp_path = "{}.{}.{}.tmp".format(tree_path, os.getpid(), threading.current_thread().ident)
+    with open(tmp_path, "w") as f:
+      json.dump({"storedAt": stored_at, "tree": tree}, f)
+    os.rename(tmp_path, tree_path)
+
+  def invalidate(self, agent_id):
+    agent_dir = self._agent_dir(agent_id)
+    if not os.path.isdir(agent_dir):
+      return
+    for filename in os.listdir(agent_dir):
+      try:
+        os.remove(os.path.join(agent_dir, filename))
+      except OSError:
+        pass
@@ -62,7 +62,11 @@ setup(
   ],
   extras_require = {
     "pandas_support":  [
-      "pandas>=0.20"
+      "pandas>=0.23"
+    ],
+    "fast_json_support":  [
+      # orjson has no wheels nor sources for Python 2.7, 3.3 and 3.5
+      "orjson>=3.0; python_version >= \"3.6\""
     ]
   },
 
@@ -57,6 +57,26 @@ class TestAddOperationsSuccess(unittest.TestCase):
     resp_keys = resp.keys()
     self.assertTrue("message" in resp_keys)
 
+  def test_add_operations_with_generator(self):
+    """add_operations should succeed when given a generator of operations
+
+    It should lazily consume the generator and report the number of
+    operations that were added.
+    """
+    operations = valid_data.VALID_OPERATIONS_SET[:]
+    timestamp = operations[-1]["timestamp"]
+    generated_operations = (
+      {
+        "timestamp": timestamp + i,
+        "context": operations[-1]["context"]
+      } for i in range(1, 500)
+    )
+
+    resp = self.client.add_operations(self.agent_id, operations)
+    resp = self.client.add_operations(self.agent_id, generated_operations)
+
+    self.assertIsInstance(resp, dict)
+    self.assertTrue("499 operation(s)" in resp["message"])
 
 class TestAddOperationsFailure(unittest.TestCase):
   """Checks that the client fails properly when getting an agent with bad
@@ -0,0 +1,33 @@
+import unittest
+
+import craftai
+from craftai import bench
+from craftai.testing import FakeServer
+
+class TestBench(unittest.TestCase):
+
+  def test_run_against_fake_server(self):
+    with FakeServer() as server:
+      client = craftai.Client(server.client_config())
+      rate_limiter = client._rate_limiter #pylint: disable=W0212
+      report = bench.run(client, concurrency=4, duration=0.3, agents_count=2,
+                         operations_per_call=10, seed=0)
+      self.assertEqual(client.list_agents(), [])
+
+    self.assertEqual(sorted(report["calls"]),
+                     ["add_operations", "decide", "get_context_state", "get_decision_tree"])
+    for summary in report["calls"].values():
+      self.assertGreater(summary["count"], 0)
+      self.assertEqual(summary["error_rate"], 0)
+      self.assertLessEqual(summary["p50"], summary["p99"])
+    self.assertGreater(report["stats"]["bytes_sent_wire"], 0)
+    self.assertGreater(report["calls"]["add_operations"]["mean_bytes_sent"], 0)
+    self.assertGreater(report["calls"]["get_decision_tree"]["mean_bytes_received"], 0)
+    self.assertIsNone(client.config["hooks"])
+    # The client's state isn't rebuilt
+    self.assertIs(client._rate_limiter, rate_limiter) #pylint: disable=W0212
+    self.assertIn("get_decision_tree", bench.format_report(report))
+
+  def test_parse_mix(self):
+    self.assertEqual(bench.parse_mix("decide=3, add_operations"),
+                     [("decide", 3.), ("add_operations", 1.)])
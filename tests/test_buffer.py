@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import craftai
+from craftai.buffer import OperationsBuffer
+from craftai.testing import FakeServer
+
+from .test_fake_server import CONFIGURATION, OPERATIONS
+
+class BrokenOnceClient(craftai.Client):
+  """Fails unexpectedly the first time operations are added"""
+  def __init__(self, cfg):
+    super(BrokenOnceClient, self).__init__(cfg)
+    self.broken = True
+
+  def add_operations(self, agent_id, operations, deadline=None):
+    if self.broken:
+      self.broken = False
+      raise RuntimeError("Unexpected")
+    return super(BrokenOnceClient, self).add_operations(agent_id, operations, deadline)
+
+class TestOperationsBuffer(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer().start()
+    self.client = craftai.Client(self.server.client_config(operationsChunksSize=200))
+    self.client.create_agent(CONFIGURATION, "agent_1")
+    self.client.create_agent(CONFIGURATION, "agent_2")
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    self.server.stop()
+    shutil.rmtree(self.directory)
+
+  def test_chunks_by_agent(self):
+    with OperationsBuffer(self.client, max_delay=10) as operations_buffer:
+      for operation in OPERATIONS[:450]:
+        operations_buffer.push("agent_1", operation)
+        operations_buffer.push("agent_2", operation)
+      self.assertTrue(operations_buffer.flush())
+      metrics = operations_buffer.metrics
+
+    self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[:450])
+    self.assertEqual(self.client.get_operations_list("agent_2"), OPERATIONS[:450])
+    self.assertEqual(metrics["flushes"], 6)
+    self.assertEqual(metrics["flushed_operations"], 900)
+    self.assertEqual(metrics["queue_depth"], 0)
+    self.assertGreater(metrics["flush_latency_max"], 0)
+
+  def test_flushed_after_max_delay(self):
+    operations_buffer = OperationsBuffer(self.client, max_delay=0.05)
+    try:
+      for operation in OPERATIONS[:3]:
+        operations_buffer.push("agent_1", operation)
+      time.sleep(0.5)
+      self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[:3])
+    finally:
+      operations_buffer.close()
+
+  def test_spilled_then_replayed_in_order(self):
+    spill_path = os.path.join(self.directory, "spill.jsonl")
+    operations_buffer = OperationsBuffer(self.client, max_delay=10, spill_path=spill_path,
+                                         retry_interval=60)
+    try:
+      self.server.inject_errors(500, endpoint="agents/context")
+      for operation in OPERATIONS[:250]:
+        operations_buffer.push("agent_1", operation)
+      self.assertFalse(operations_buffer.flush())
+      self.assertTrue(os.path.exists(spill_path))
+      self.assertGreater(operations_buffer.metrics["spilled_operations"], 0)
+
+      for operation in OPERATIONS[250:300]:
+        operations_buffer.push("agent_1", operation)
+      # The flush retries the spilled operations first
+      self.assertTrue(operations_buffer.flush())
+      self.assertFalse(os.path.exists(spill_path))
+    finally:
+      operations_buffer.close()
+    self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[:300])
+
+  def test_spill_replayed_by_next_buffer(self):
+    spill_path = os.path.join(self.directory, "spill.jsonl")
+    self.server.inject_errors(500, endpoint="agents/context")
+    operations_buffer = OperationsBuffer(self.client, max_delay=10, spill_path=spill_path,
+                                         retry_interval=60)
+    for operation in OPERATIONS[:10]:
+      operations_buffer.push("agent_1", operation)
+    self.assertFalse(operations_buffer.close())
+
+    with OperationsBuffer(self.client, spill_path=spill_path) as operations_buffer:
+      self.assertEqual(operations_buffer.metrics["spilled_operations"], 10)
+      self.assertTrue(operations_buffer.flush())
+    self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[:10])
+
+  def test_rejected_operations_dropped(self):
+    with OperationsBuffer(self.client, max_delay=10) as operations_buffer:
+      operations_buffer.push("unknown_agent", OPERATIONS[0])
+      self.assertTrue(operations_buffer.flush())
+      self.assertEqual(operations_buffer.metrics["dropped_operations"], 1)
+      self.assertIsInstance(operations_buffer.last_error, craftai.errors.CraftAiNotFoundError)
+
+  def test_unreadable_spilled_lines_moved_aside(self):
+    spill_path = os.path.join(self.directory, "spill.jsonl")
+    with open(spill_path, "w") as f:
+      f.write(json.dumps({"agent_id": "agent_1", "operations": OPERATIONS[:5]}) + "\n")
+      f.write("\n")
+      f.write('{"agent_id": "agent_1", "operat\n')
+      f.write(json.dumps({"agent_id": "agent_1", "operations": OPERATIONS[5:10]}) + "\n")
+
+    with OperationsBuffer(self.client, spill_path=spill_path) as operations_buffer:
+      self.assertEqual(operations_buffer.metrics["spilled_operations"], 10)
+      self.assertTrue(operations_buffer.flush())
+      self.assertEqual(operations_buffer.metrics["corrupt_spilled_lines"], 1)
+    self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[:10])
+    with open(spill_path + ".corrupt") as f:
+      self.assertEqual(f.read(), '{"agent_id": "agent_1", "operat\n')
+
+  def test_unexpected_errors_not_stopping_thread(self):
+    with OperationsBuffer(BrokenOnceClient(self.server.client_config()),
+                          max_delay=10) as operations_buffer:
+      operations_buffer.push("agent_1", OPERATIONS[0])
+      self.assertTrue(operations_buffer.flush())
+      self.assertIsInstance(operations_buffer.last_error, RuntimeError)
+      for operation in OPERATIONS[1:10]:
+        operations_buffer.push("agent_1", operation)
+      self.assertTrue(operations_buffer.flush())
+      self.assertEqual(operations_buffer.metrics["dropped_operations"], 1)
+    self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[1:10])
+
+  def test_failed_operations_dropped_on_close(self):
+    self.server.inject_errors(500, endpoint="agents/context")
+    operations_buffer = OperationsBuffer(self.client, max_delay=10, retry_interval=60)
+    for operation in OPERATIONS[:10]:
+      operations_buffer.push("agent_1", operation)
+    with self.assertLogs("craftai.buffer", "WARNING"):
+      self.assertFalse(operations_buffer.close())
+    self.assertEqual(operations_buffer.metrics["dropped_operations"], 10)
+    self.assertEqual(operations_buffer.metrics["spilled_operations"], 0)
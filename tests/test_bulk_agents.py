@@ -0,0 +1,54 @@
+import unittest
+
+import craftai
+
+from . import settings
+from .data import valid_data, invalid_data
+
+class TestBulkAgents(unittest.TestCase):
+  """Checks that the client succeeds when handling many agents at once"""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.client = craftai.Client(settings.CRAFT_CFG)
+    cls.agent_ids = [
+      "{}_bulk_{}_{}".format(valid_data.VALID_ID, i, settings.RUN_ID) for i in range(5)
+    ]
+
+  def setUp(self):
+    list(self.client.delete_agents(self.agent_ids))
+
+  def tearDown(self):
+    list(self.client.delete_agents(self.agent_ids))
+
+  def test_bulk_agents_lifecycle(self):
+    """create_agents, get_agents, get_decision_trees and delete_agents should
+    succeed when given correct agents
+
+    They should yield a result for each agent, failures being reported by
+    agent instead of interrupting the others.
+    """
+    created = list(self.client.create_agents(
+      [{"configuration": valid_data.VALID_CONFIGURATION, "id": agent_id}
+       for agent_id in self.agent_ids],
+      concurrency=3))
+    self.assertEqual(sorted(result["agent_id"] for result in created), sorted(self.agent_ids))
+    for result in created:
+      self.assertEqual(result["agent"]["id"], result["agent_id"])
+
+    for agent_id in self.agent_ids:
+      self.client.add_operations(agent_id, valid_data.VALID_OPERATIONS_SET)
+
+    agents = list(self.client.get_agents(self.agent_ids + [invalid_data.UNKNOWN_ID]))
+    errors = [result for result in agents if "error" in result]
+    self.assertEqual(len(agents), len(self.agent_ids) + 1)
+    self.assertEqual([result["agent_id"] for result in errors], [invalid_data.UNKNOWN_ID])
+    self.assertIsInstance(errors[0]["error"], craftai.errors.CraftAiNotFoundError)
+
+    trees = list(self.client.get_decision_trees(self.agent_ids,
+                                                valid_data.VALID_TIMESTAMP))
+    for result in trees:
+      self.assertIsInstance(result["decision_tree"], dict)
+
+    deleted = list(self.client.delete_agents(self.agent_ids))
+    self.assertEqual(sorted(result["agent_id"] for result in deleted), sorted(self.agent_ids))
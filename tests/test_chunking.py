@@ -0,0 +1,69 @@
+import unittest
+
+import craftai
+from craftai.chunking import AdaptiveChunkSizer, FixedChunkSizer
+from craftai.testing import FakeServer
+
+from .test_fake_server import CONFIGURATION, OPERATIONS
+
+class TestChunkSizers(unittest.TestCase):
+
+  def test_fixed_sizer(self):
+    sizer = FixedChunkSizer(200)
+    sizer.record(200, 10000, 0.1)
+    sizer.record(50, 2500, 0.1)
+    self.assertEqual(sizer.size, 200)
+    self.assertEqual(sizer.sizes, [200, 50])
+    self.assertFalse(sizer.can_split(200))
+
+  def test_adaptive_sizer_targets_bytes(self):
+    sizer = AdaptiveChunkSizer(200, 10, 10000, 100000, 10.)
+    # 100 bytes per operation, sent very fast
+    for _ in range(10):
+      sizer.record(sizer.size, sizer.size * 100, 0.001)
+    self.assertEqual(sizer.size, 1000)
+
+  def test_adaptive_sizer_targets_latency(self):
+    sizer = AdaptiveChunkSizer(200, 10, 10000, 100000, 1.)
+    # 100 bytes per operation, 10000 bytes per second
+    for _ in range(10):
+      sizer.record(sizer.size, sizer.size * 100, sizer.size / 100.)
+    self.assertEqual(sizer.size, 100)
+
+  def test_adaptive_sizer_bounds(self):
+    sizer = AdaptiveChunkSizer(200, 50, 300, 10 ** 9, 100.)
+    for _ in range(10):
+      sizer.record(sizer.size, sizer.size, 0.001)
+    self.assertEqual(sizer.size, 300)
+    for _ in range(10):
+      sizer.back_off()
+    self.assertEqual(sizer.size, 50)
+    self.assertFalse(sizer.can_split(50))
+    self.assertTrue(sizer.can_split(51))
+
+class TestChunksBackOff(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer().start()
+    self.client = craftai.Client(self.server.client_config(operationsAdaptiveChunks=True,
+                                                           operationsChunksSize=200))
+    self.client.create_agent(CONFIGURATION, "my_agent")
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_too_large_chunk_split(self):
+    self.server.inject_errors(413, endpoint="agents/context")
+    result = self.client.add_operations("my_agent", OPERATIONS[:400])
+    # The rejected chunk is sent again in two halves
+    self.assertEqual(result["chunksSizes"][:2], [100, 100])
+    self.assertEqual(sum(result["chunksSizes"]), 400)
+    self.assertEqual(self.server.requests_counts["agents/context"],
+                     1 + len(result["chunksSizes"]))
+    self.assertEqual(self.client.get_operations_list("my_agent"), OPERATIONS[:400])
+
+  def test_gateway_timeout_not_resent(self):
+    self.server.inject_errors(504, endpoint="agents/context")
+    self.assertRaises(craftai.errors.CraftAiError,
+                      self.client.add_operations, "my_agent", OPERATIONS[:200])
+    self.assertEqual(self.server.requests_counts["agents/context"], 1)
@@ -0,0 +1,47 @@
+import json
+import unittest
+
+import craftai
+from craftai.compression import compress, decompress
+from craftai.testing import fake_token
+
+TOKEN = fake_token("owner", "project", "http://localhost")
+
+PAYLOAD = json.dumps([{"timestamp": 1458741230 + i, "context": {"presence": "occupant"}}
+                      for i in range(100)]).encode("utf-8")
+
+class TestCompression(unittest.TestCase):
+
+  def test_compress_roundtrip(self):
+    for encoding in ["gzip", "deflate"]:
+      compressed = compress(PAYLOAD, encoding, 6)
+      self.assertLess(len(compressed), len(PAYLOAD))
+      self.assertEqual(decompress(compressed, encoding), PAYLOAD)
+
+  def test_gzip_header(self):
+    self.assertEqual(compress(PAYLOAD, "gzip", 6)[:2], b"\x1f\x8b")
+
+  def test_payload_compressed_above_threshold(self):
+    client = craftai.Client({"token": TOKEN, "compression": "gzip"})
+    data, headers = client._encode_payload(PAYLOAD, {}) #pylint: disable=W0212
+    self.assertEqual(headers["Content-Encoding"], "gzip")
+    self.assertEqual(decompress(data, "gzip"), PAYLOAD)
+    stats = client.stats
+    self.assertEqual(stats["bytes_sent_raw"], len(PAYLOAD))
+    self.assertEqual(stats["bytes_sent_wire"], len(data))
+
+  def test_payload_untouched_below_threshold(self):
+    client = craftai.Client({
+      "token": TOKEN,
+      "compression": "deflate",
+      "compressionThreshold": len(PAYLOAD) + 1
+    })
+    data, headers = client._encode_payload(PAYLOAD, {}) #pylint: disable=W0212
+    self.assertEqual(data, PAYLOAD)
+    self.assertFalse("Content-Encoding" in headers)
+
+  def test_invalid_compression(self):
+    self.assertRaises(
+      craftai.errors.CraftAiBadRequestError,
+      craftai.Client,
+      {"token": TOKEN, "compression": "brotli"})
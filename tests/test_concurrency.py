@@ -0,0 +1,47 @@
+import threading
+import time
+import unittest
+
+from craftai.concurrency import parallel_imap, parallel_map
+from craftai.errors import CraftAiNotFoundError
+
+class TestParallelMap(unittest.TestCase):
+
+  def test_keeps_order(self):
+    def slow_square(value):
+      time.sleep(0.01 * (10 - value))
+      return value * value
+    self.assertEqual(parallel_map(slow_square, range(10), 4), [i * i for i in range(10)])
+
+  def test_concurrency_cap(self):
+    lock = threading.Lock()
+    running = {"current": 0, "max": 0}
+    def track(_):
+      with lock:
+        running["current"] += 1
+        running["max"] = max(running["max"], running["current"])
+      time.sleep(0.01)
+      with lock:
+        running["current"] -= 1
+    parallel_map(track, range(20), 3)
+    self.assertLessEqual(running["max"], 3)
+
+  def test_raises_errors(self):
+    def fail(value):
+      if value == 3:
+        raise ValueError("failure")
+      return value
+    self.assertRaises(ValueError, parallel_map, fail, range(5), 2)
+
+class TestParallelImap(unittest.TestCase):
+
+  def test_collects_errors(self):
+    def fail(value):
+      if value % 3 == 0:
+        raise CraftAiNotFoundError("failure")
+      return value * 2
+    results = sorted(parallel_imap(fail, range(10), 4), key=lambda result: result[0])
+    self.assertEqual([result[1] for result in results if result[2] is None],
+                     [i * 2 for i in range(10) if i % 3])
+    for item, _, error in results:
+      self.assertEqual(isinstance(error, CraftAiNotFoundError), item % 3 == 0)
@@ -0,0 +1,55 @@
+import unittest
+
+import craftai
+from craftai.conditional import ValidatorsStore, conditional_headers
+from craftai.testing import FakeServer
+
+from .test_fake_server import CONFIGURATION, OPERATIONS
+
+class TestValidatorsStore(unittest.TestCase):
+
+  def test_stores_responses_with_validators(self):
+    store = ValidatorsStore(10)
+    store.set("/a", {"ETag": "\"abc\""}, [1])
+    store.set("/b", {"Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}, [2])
+    store.set("/c", {}, [3])
+    self.assertEqual(conditional_headers(store.get("/a")), {"If-None-Match": "\"abc\""})
+    self.assertEqual(conditional_headers(store.get("/b")),
+                     {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    self.assertEqual(store.get("/a")[2], [1])
+    self.assertIsNone(store.get("/c"))
+
+  def test_least_recently_used_dropped(self):
+    store = ValidatorsStore(2)
+    store.set("/a", {"ETag": "a"}, "a")
+    store.set("/b", {"ETag": "b"}, "b")
+    store.get("/a")
+    store.set("/c", {"ETag": "c"}, "c")
+    self.assertIsNone(store.get("/b"))
+    self.assertIsNotNone(store.get("/a"))
+    self.assertIsNotNone(store.get("/c"))
+
+  def test_response_without_validators_forgotten(self):
+    store = ValidatorsStore(2)
+    store.set("/a", {"ETag": "a"}, "a")
+    store.set("/a", {}, "a")
+    self.assertIsNone(store.get("/a"))
+
+class TestConditionalRequests(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer().start()
+    self.client = craftai.Client(self.server.client_config(conditionalRequests=True))
+    self.client.create_agent(CONFIGURATION, "my_agent")
+    self.client.add_operations("my_agent", OPERATIONS[:100])
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_not_modified_response(self):
+    timestamp = OPERATIONS[99]["timestamp"]
+    decision_tree = self.client.get_decision_tree("my_agent", timestamp)
+    # The stored body isn't decoded again
+    self.assertIs(self.client.get_decision_tree("my_agent", timestamp), decision_tree)
+    self.assertEqual(self.client.stats["conditional_hits"], 1)
+    self.assertEqual(self.client.stats["conditional_misses"], 1)
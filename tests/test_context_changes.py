@@ -0,0 +1,136 @@
+import random
+import unittest
+
+import pandas as pd
+
+import craftai
+import craftai.pandas
+from craftai.context_changes import ChangesFilter, SentContexts
+from craftai.testing import FakeServer
+
+from .test_fake_server import CONFIGURATION
+
+def sensor_operations(count, seed=0):
+  """Full contexts reported periodically, most properties unchanged"""
+  rand = random.Random(seed)
+  context = {"presence": "none", "lightIntensity": 0.5, "lightbulbColor": "black"}
+  operations = []
+  for i in range(count):
+    if rand.random() < 0.2:
+      context = dict(context, presence=rand.choice(["none", "occupant"]))
+      context["lightbulbColor"] = "red" if context["presence"] == "occupant" else "black"
+    if rand.random() < 0.1:
+      context = dict(context, lightIntensity=rand.choice([0.1, 0.5, 0.9]))
+    operations.append({"timestamp": 1458741230 + 10 * i, "context": dict(context)})
+  return operations
+
+class TestChangesFilter(unittest.TestCase):
+
+  def test_unchanged_properties_dropped(self):
+    changes_filter = ChangesFilter()
+    operations = list(changes_filter.filter([
+      {"timestamp": 1, "context": {"a": 1, "b": "x"}},
+      {"timestamp": 2, "context": {"a": 1, "b": "y"}},
+      {"timestamp": 3, "context": {"a": 1, "b": "y"}},
+      {"timestamp": 4, "context": {"a": 1.0, "b": "y"}}
+    ]))
+    self.assertEqual(operations, [
+      {"timestamp": 1, "context": {"a": 1, "b": "x"}},
+      {"timestamp": 2, "context": {"b": "y"}},
+      {"timestamp": 4, "context": {"a": 1.0}}
+    ])
+    self.assertEqual(changes_filter.dropped_operations, 1)
+    self.assertEqual(changes_filter.dropped_properties, 4)
+    self.assertEqual(changes_filter.context, {"a": 1.0, "b": "y"})
+
+  def test_stops_on_out_of_order_operations(self):
+    changes_filter = ChangesFilter(10, {"a": 1})
+    operations = [{"timestamp": 11, "context": {"a": 1}},
+                  {"timestamp": 5, "context": {"a": 1}},
+                  {"timestamp": 12, "context": {"a": 1}}]
+    self.assertEqual(list(changes_filter.filter(operations)), operations[1:])
+    self.assertFalse(changes_filter.enabled)
+
+  def test_state_forgotten_on_failures(self):
+    sent_contexts = SentContexts()
+
+    def send(agent_id, sent=True):
+      changes_filter = sent_contexts.begin(agent_id)
+      list(changes_filter.filter([{"timestamp": 1, "context": {"a": 1}}]))
+      sent_contexts.end(agent_id, changes_filter, sent)
+
+    def context(agent_id):
+      changes_filter = sent_contexts.begin(agent_id)
+      sent_contexts.end(agent_id, changes_filter, False)
+      return changes_filter.context
+
+    send("agent")
+    self.assertEqual(context("agent"), {"a": 1})
+    send("agent", sent=False)
+    self.assertEqual(context("agent"), {})
+
+    send("agent")
+    changes_filter = sent_contexts.begin("agent")
+    concurrent_filter = sent_contexts.begin("agent")
+    self.assertFalse(concurrent_filter.enabled)
+    sent_contexts.end("agent", concurrent_filter, True)
+    sent_contexts.end("agent", changes_filter, True)
+    self.assertEqual(context("agent"), {})
+
+class TestChangesOnlyOperations(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer().start()
+    self.client = craftai.Client(self.server.client_config())
+    self.changes_client = craftai.Client(self.server.client_config(operationsChangesOnly=True))
+    self.client.create_agent(CONFIGURATION, "full")
+    self.changes_client.create_agent(CONFIGURATION, "changes")
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_same_context_states(self):
+    operations = sensor_operations(1000)
+    for start in range(0, 1000, 100):
+      self.client.add_operations("full", operations[start:start + 100])
+      self.changes_client.add_operations("changes", operations[start:start + 100])
+
+    sent_operations = self.client.get_operations_list("changes")
+    self.assertLess(len(sent_operations), len(operations) / 2)
+    self.assertEqual(self.changes_client.stats["unchanged_operations_dropped"],
+                     len(operations) - len(sent_operations))
+    for operation in operations[::37]:
+      self.assertEqual(
+        self.client.get_context_state("changes", operation["timestamp"]),
+        self.client.get_context_state("full", operation["timestamp"]))
+
+  def test_unchanged_operations_not_sent(self):
+    operations = sensor_operations(10)
+    self.changes_client.add_operations("changes", operations[:1])
+    requests_count = self.server.requests_counts["agents/context"]
+    self.changes_client.add_operations("changes", [dict(operations[0], timestamp=1458741300)])
+    self.assertEqual(self.server.requests_counts["agents/context"], requests_count)
+
+  def test_full_context_sent_after_recreation(self):
+    operations = sensor_operations(10)
+    self.changes_client.add_operations("changes", operations[:1])
+    self.changes_client.delete_agent("changes")
+    self.changes_client.create_agent(CONFIGURATION, "changes")
+    self.changes_client.add_operations("changes", operations[1:2])
+    self.assertEqual(self.client.get_operations_list("changes"), operations[1:2])
+
+  def test_pandas_dataframe(self):
+    operations = sensor_operations(200)
+    df = pd.DataFrame([operation["context"] for operation in operations],
+                      index=pd.to_datetime([operation["timestamp"] for operation in operations],
+                                           unit="s"))
+    pandas_client = craftai.pandas.Client(
+      self.server.client_config(operationsChangesOnly=True))
+    pandas_client.add_operations("changes", df)
+    self.client.add_operations("full", operations)
+
+    self.assertLess(len(self.client.get_operations_list("changes")), len(operations) / 2)
+    for operation in operations[::11]:
+      self.assertEqual(
+        self.client.get_context_state("changes", operation["timestamp"]),
+        self.client.get_context_state("full", operation["timestamp"]))
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from craftai.context_state import ContextStates
+
+from .data import valid_data
+
+class TestContextStates(unittest.TestCase):
+
+  def test_state_at_timestamp(self):
+    context_states = ContextStates(valid_data.VALID_OPERATIONS_SET)
+    self.assertEqual(context_states.get(1458741241), {
+      "timestamp": 1458741241,
+      "context": {
+        "tz": "+02:00",
+        "presence": "none",
+        "lightIntensity": 0,
+        "lightbulbColor": "#ffffff"
+      }
+    })
+    self.assertEqual(context_states.get(valid_data.VALID_TIMESTAMP - 1)["context"], {})
+
+  def test_unsorted_operations(self):
+    operations = valid_data.VALID_OPERATIONS_SET[::-1]
+    self.assertEqual(ContextStates(operations).get(1458741300),
+                     ContextStates(valid_data.VALID_OPERATIONS_SET).get(1458741300))
+
+  def test_get_many_matches_get(self):
+    context_states = ContextStates(valid_data.VALID_OPERATIONS_SET)
+    timestamps = list(range(1458741225, 1458741270, 3)) + [1458741241, 1458741000]
+    self.assertEqual(context_states.get_many(timestamps),
+                     [context_states.get(timestamp) for timestamp in timestamps])
+    self.assertEqual(ContextStates([]).get_many([1, 2]),
+                     [{"timestamp": 1, "context": {}}, {"timestamp": 2, "context": {}}])
+
+  def test_from_arrays(self):
+    context_states = ContextStates.from_arrays(
+      np.array([10, 20, 30]),
+      {
+        "a": np.array([1., np.nan, 3.]),
+        "b": np.array(["x", "y", np.nan], dtype=object)
+      })
+    self.assertEqual(context_states.get(25)["context"], {"a": 1., "b": "y"})
+    self.assertEqual(context_states.get(30)["context"], {"a": 3., "b": "y"})
+
+  def test_from_arrays_keeps_types(self):
+    context_states = ContextStates.from_arrays(
+      np.array([10, 20, 30]),
+      {
+        "i": np.array([1, 2, 3]),
+        "o": np.array([4, np.nan, True], dtype=object)
+      })
+    context = context_states.get_many([30])[0]["context"]
+    self.assertEqual(context, {"i": 3, "o": True})
+    self.assertIs(type(context["i"]), int)
+    self.assertIs(type(context_states.get(20)["context"]["o"]), int)
@@ -0,0 +1,28 @@
+import time
+import unittest
+
+from craftai.deadline import Deadline, to_deadline
+from craftai.errors import CraftAiBadRequestError, CraftAiTimeoutError
+
+class TestDeadline(unittest.TestCase):
+
+  def test_timeout_capped_by_remaining_budget(self):
+    connect_timeout, read_timeout = Deadline(5).timeout(10., 60.)
+    self.assertLessEqual(connect_timeout, 5)
+    self.assertLessEqual(read_timeout, 5)
+
+  def test_timeout_not_extended_by_budget(self):
+    self.assertEqual(Deadline(100).timeout(1., 2.), (1., 2.))
+
+  def test_exceeded_deadline(self):
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    self.assertRaises(CraftAiTimeoutError, deadline.check)
+    self.assertRaises(CraftAiTimeoutError, deadline.timeout, 10., 60.)
+
+  def test_to_deadline(self):
+    deadline = Deadline(10)
+    self.assertIs(to_deadline(deadline), deadline)
+    self.assertIsNone(to_deadline(None))
+    self.assertIsInstance(to_deadline(2.5), Deadline)
+    self.assertRaises(CraftAiBadRequestError, to_deadline, "10")
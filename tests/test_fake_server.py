@@ -0,0 +1,112 @@
+import unittest
+
+import craftai
+from craftai.errors import CraftAiBadRequestError, CraftAiInternalError, CraftAiNotFoundError
+from craftai.errors import CraftAiTooManyRequestsError
+from craftai.testing import FakeServer
+
+CONFIGURATION = {
+  "context": {
+    "presence": {"type": "enum"},
+    "lightIntensity": {"type": "continuous"},
+    "lightbulbColor": {"type": "enum"}
+  },
+  "output": ["lightbulbColor"],
+  "time_quantum": 100
+}
+
+OPERATIONS = [
+  {
+    "timestamp": 1458741230 + 100 * i,
+    "context": {
+      "presence": ["none", "occupant"][i % 2],
+      "lightIntensity": float(i % 7),
+      "lightbulbColor": ["black", "red"][i % 2]
+    }
+  } for i in range(2500)
+]
+
+class TestFakeServer(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer(page_size=1000, retry_after=0).start()
+    self.client = craftai.Client(self.server.client_config(compression="gzip"))
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_agent_lifecycle(self):
+    agent = self.client.create_agent(CONFIGURATION, "my_agent")
+    self.assertEqual(agent["id"], "my_agent")
+    self.assertEqual(self.client.list_agents(), ["my_agent"])
+    self.assertRaises(CraftAiBadRequestError, self.client.create_agent,
+                      CONFIGURATION, "my_agent")
+    self.assertTrue(self.client.get_shared_agent_inspector_url("my_agent")
+                    .endswith("/inspector/my_agent"))
+    self.client.delete_agent("my_agent")
+    self.assertRaises(CraftAiNotFoundError, self.client.get_agent, "my_agent")
+
+  def test_operations(self):
+    self.client.create_agent(CONFIGURATION, "my_agent")
+    self.client.add_operations("my_agent", OPERATIONS)
+
+    agent = self.client.get_agent("my_agent")
+    self.assertEqual(agent["lastTimestamp"], OPERATIONS[-1]["timestamp"])
+    self.assertEqual(self.client.get_operations_list("my_agent"), OPERATIONS)
+    self.assertEqual(self.server.requests_counts["agents/context"], 13 + 3)
+    self.assertEqual(
+      self.client.get_operations_list("my_agent", start=OPERATIONS[10]["timestamp"],
+                                      end=OPERATIONS[20]["timestamp"]),
+      OPERATIONS[10:21])
+
+    state = self.client.get_context_state("my_agent", OPERATIONS[3]["timestamp"] + 1)
+    self.assertEqual(state["context"], OPERATIONS[3]["context"])
+
+  def test_pages_sharing_a_timestamp(self):
+    self.client.create_agent(CONFIGURATION, "my_agent")
+    operations = [dict(operation, timestamp=OPERATIONS[0]["timestamp"] + i // 1500 * 100)
+                  for i, operation in enumerate(OPERATIONS)]
+    self.client.add_operations("my_agent", operations)
+    self.assertEqual(self.client.get_operations_list("my_agent"), operations)
+    self.assertEqual(
+      self.client.get_operations_list("my_agent", start=operations[1500]["timestamp"]),
+      operations[1500:])
+
+  def test_decision_tree(self):
+    self.client.create_agent(CONFIGURATION, "my_agent")
+    self.client.add_operations("my_agent", OPERATIONS)
+    tree = self.client.get_decision_tree("my_agent", OPERATIONS[-1]["timestamp"])
+    decision = self.client.decide(tree, {"presence": "occupant", "lightIntensity": 3.})
+    self.assertEqual(decision["output"]["lightbulbColor"]["predicted_value"], "red")
+
+  def test_injected_errors(self):
+    self.client.create_agent(CONFIGURATION, "my_agent")
+    self.server.inject_errors(500, endpoint="agents/decision/tree")
+    self.client.get_agent("my_agent")
+    self.assertRaises(CraftAiInternalError, self.client.get_decision_tree, "my_agent", 0)
+
+  def test_rate_limited_requests_retried(self):
+    # Halving a high rate limit keeps the retries fast
+    client = craftai.Client(self.server.client_config(rateLimit=1000))
+    client.create_agent(CONFIGURATION, "my_agent")
+    self.server.inject_errors(429, count=2)
+    self.assertEqual(client.get_agent("my_agent")["id"], "my_agent")
+    self.assertEqual(client.stats["rate_limited_requests"], 2)
+
+    client = craftai.Client(self.server.client_config(rateLimit=1000, maxRetries=0))
+    self.server.inject_errors(429)
+    self.assertRaises(CraftAiTooManyRequestsError, client.get_agent, "my_agent")
+
+  def test_rate_recovers_on_successes_only(self):
+    client = craftai.Client(self.server.client_config(rateLimit=1000))
+    client.create_agent(CONFIGURATION, "my_agent")
+    self.server.inject_errors(429)
+    client.get_agent("my_agent")
+    bucket = client._rate_limiter._limits_for("agents")[0] #pylint: disable=W0212
+    rate = bucket.rate
+    self.server.inject_errors(500, count=3)
+    for _ in range(3):
+      self.assertRaises(CraftAiInternalError, client.get_agent, "my_agent")
+    self.assertEqual(bucket.rate, rate)
+    client.get_agent("my_agent")
+    self.assertGreater(bucket.rate, rate)
@@ -44,6 +44,24 @@ class TestGetContextStateSuccess(unittest.TestCase):
       context_state["timestamp"],
       valid_data.VALID_TIMESTAMP)
 
+  def test_get_context_states_with_correct_input(self):
+    """get_context_states should succeed when given proper IDs and timestamps.
+
+    It should give the same context states as get_context_state, in the
+    order of the given pairs, and report the failed pairs.
+    """
+    timestamps = [op["timestamp"] for op in valid_data.VALID_OPERATIONS_SET]
+    pairs = [(self.agent_id, timestamp) for timestamp in timestamps + timestamps[:2]]
+    pairs.append((invalid_data.UNKNOWN_ID, valid_data.VALID_TIMESTAMP))
+
+    context_states = self.client.get_context_states(pairs, concurrency=4)
+
+    self.assertEqual(len(context_states), len(pairs))
+    for (agent_id, timestamp), result in zip(pairs[:-1], context_states):
+      self.assertEqual(result["agent_id"], agent_id)
+      self.assertEqual(result["context_state"],
+                       self.client.get_context_state(agent_id, timestamp))
+    self.assertIsInstance(context_states[-1]["error"], craft_err.CraftAiError)
 
 class TestGetContextStateFailure(unittest.TestCase):
   """Checks that the client fails properly when getting an agent's context
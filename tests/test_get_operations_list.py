@@ -32,6 +32,27 @@ class TestGetOperationsListSuccess(unittest.TestCase):
     ops = self.client.get_operations_list(self.agent_id)
     self.assertIsInstance(ops, list)
 
+  def test_get_operations_list_in_parallel(self):
+    """get_operations_list should give the same result when parallelized
+
+    The operations list is retrieved by time windows, merged in order.
+    """
+    self.assertEqual(self.client.get_operations_list(self.agent_id, parallelism=3),
+                     self.client.get_operations_list(self.agent_id))
+
+  def test_iter_operations_with_correct_data(self):
+    """iter_operations should succeed when given a correct agent ID
+
+    It should yield chunks of operations, which together are the
+    operations list.
+    """
+    chunks = list(self.client.iter_operations(self.agent_id, chunk_size=2))
+    for chunk in chunks:
+      self.assertIsInstance(chunk, list)
+      self.assertLessEqual(len(chunk), 2)
+    self.assertEqual([operation for chunk in chunks for operation in chunk],
+                     self.client.get_operations_list(self.agent_id))
+
 
 class TestGetOperationsListFailure(unittest.TestCase):
   """Checks that the client fails properly when getting an agent with bad
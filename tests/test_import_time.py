@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+HEAVY_PACKAGES = ["requests", "urllib3", "pandas", "numpy", "tzlocal"]
+
+def imported_packages(statement):
+  """Runs the statement in a fresh interpreter and returns the heavy
+  packages it imported"""
+  script = "\n".join([
+    "import json, sys",
+    statement,
+    "print(json.dumps(sorted(set(name.split('.')[0] for name in sys.modules))))"
+  ])
+  output = subprocess.check_output([sys.executable, "-c", script], cwd=ROOT)
+  return [name for name in json.loads(output.decode("utf-8")) if name in HEAVY_PACKAGES]
+
+@unittest.skipIf(sys.version_info < (3, 7), "lazy imports need Python 3.7")
+class TestImportTime(unittest.TestCase):
+
+  def test_interpreter_import_is_slim(self):
+    self.assertEqual(imported_packages("from craftai import Interpreter, Time, errors"), [])
+
+  def test_decide_is_slim(self):
+    self.assertEqual(imported_packages("\n".join([
+      "from craftai import Interpreter, Time",
+      "tree = {'_version': '1.1.0', 'trees': {'o': {'predicted_value': 1}},",
+      "        'configuration': {'context': {'o': {'type': 'continuous'}}, 'output': ['o']}}",
+      "Interpreter.decide(tree, [{}, Time(1458741230, '+01:00')])"
+    ])), [])
+
+  def test_pandas_subpackage_is_lazy(self):
+    self.assertEqual(imported_packages("import craftai.pandas"), [])
+
+  def test_client_still_available(self):
+    self.assertIn("requests", imported_packages("from craftai import Client"))
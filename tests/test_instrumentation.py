@@ -0,0 +1,97 @@
+import unittest
+
+import craftai
+from craftai.errors import CraftAiBadRequestError, CraftAiNullDecisionError
+from craftai.instrumentation import Hooks, MetricsCollector
+from craftai.testing import FakeServer
+
+from .test_fake_server import CONFIGURATION, OPERATIONS
+
+TREE = {
+  "_version": "1.1.0",
+  "configuration": {
+    "context": {"presence": {"type": "enum"}, "lightbulbColor": {"type": "enum"}},
+    "output": ["lightbulbColor"]
+  },
+  "trees": {
+    "lightbulbColor": {
+      "children": [{
+        "predicted_value": "red",
+        "confidence": 0.9,
+        "decision_rule": {"property": "presence", "operator": "is", "operand": "occupant"}
+      }, {
+        "predicted_value": None,
+        "decision_rule": {"property": "presence", "operator": "is", "operand": "none"}
+      }]
+    }
+  }
+}
+
+class RecordingHooks(Hooks):
+  def __init__(self):
+    self.chunk_indices = []
+
+  def on_request_end(self, request, status, latency, bytes_sent, bytes_received,
+                     retries, error):
+    if request["chunk_index"] is not None:
+      self.chunk_indices.append(request["chunk_index"])
+
+class TestInstrumentation(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer(retry_after=0).start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_request_metrics(self):
+    metrics = MetricsCollector()
+    client = craftai.Client(self.server.client_config(hooks=metrics, rateLimit=1000))
+    client.create_agent(CONFIGURATION, "my_agent")
+    client.add_operations("my_agent", OPERATIONS[:1000])
+    self.server.inject_errors(429)
+    client.get_context_state("my_agent", OPERATIONS[10]["timestamp"])
+
+    self.assertEqual(metrics.value("craftai_requests_total", endpoint="context",
+                                   method="POST", status="201"), 5)
+    self.assertEqual(metrics.value("craftai_request_retries_total", endpoint="context"), 1)
+    self.assertEqual(metrics.value("craftai_requests_in_flight"), 0)
+    self.assertEqual(metrics.value("craftai_request_bytes_sent_total"),
+                     client.stats["bytes_sent_wire"])
+    self.assertEqual(metrics.value("craftai_request_bytes_received_total"),
+                     client.stats["bytes_received_wire"])
+    self.assertEqual(metrics.histogram("craftai_request_duration_seconds",
+                                       endpoint="context").count, 6)
+
+    text = metrics.to_prometheus()
+    self.assertIn("# TYPE craftai_request_duration_seconds histogram", text)
+    self.assertIn("craftai_requests_total{endpoint=\"agents\",method=\"POST\",status=\"201\"} 1",
+                  text)
+    self.assertIn("craftai_request_duration_seconds_bucket{endpoint=\"context\",le=\"+Inf\"} 6",
+                  text)
+
+  def test_chunk_indices(self):
+    hooks = RecordingHooks()
+    client = craftai.Client(self.server.client_config(hooks=hooks))
+    client.create_agent(CONFIGURATION, "my_agent")
+    client.add_operations("my_agent", OPERATIONS[:500])
+    self.assertEqual(hooks.chunk_indices, [0, 1, 2])
+
+  def test_invalid_hooks(self):
+    self.assertRaises(CraftAiBadRequestError, craftai.Client,
+                      self.server.client_config(hooks=object()))
+
+  def test_decide_metrics(self):
+    metrics = MetricsCollector()
+    craftai.Interpreter.set_hooks(metrics)
+    try:
+      craftai.Interpreter.decide(TREE, [{"presence": "occupant"}])
+      self.assertRaises(CraftAiNullDecisionError,
+                        craftai.Interpreter.decide, TREE, [{"presence": "none"}])
+    finally:
+      craftai.Interpreter.set_hooks(None)
+    craftai.Interpreter.decide(TREE, [{"presence": "occupant"}])
+
+    self.assertEqual(metrics.value("craftai_decisions_total", result="ok"), 1)
+    self.assertEqual(metrics.value("craftai_decisions_total", result="null"), 1)
+    self.assertEqual(metrics.histogram("craftai_decide_duration_seconds").count, 2)
@@ -0,0 +1,79 @@
+import json
+import unittest
+
+import numpy as np
+
+from craftai.errors import CraftAiBadRequestError
+from craftai.json_codec import get_codec, iter_json_array, JsonCodec
+
+OPERATIONS = [
+  {
+    "timestamp": np.int64(1458741230),
+    "context": {
+      "presence": "occupant",
+      "lightIntensity": np.float64(0.5),
+      "count": np.int32(3)
+    }
+  }
+]
+
+class TestJsonCodec(unittest.TestCase):
+
+  def test_auto_codec_roundtrip(self):
+    codec = get_codec()
+    data = codec.dumps(OPERATIONS)
+    self.assertIsInstance(data, bytes)
+    self.assertEqual(codec.loads(data), [
+      {
+        "timestamp": 1458741230,
+        "context": {
+          "presence": "occupant",
+          "lightIntensity": 0.5,
+          "count": 3
+        }
+      }
+    ])
+
+  def test_stdlib_codec_numpy_scalars(self):
+    codec = get_codec("json")
+    self.assertIsInstance(codec, JsonCodec)
+    self.assertEqual(codec.dumps({"a": np.int64(1), "b": np.bool_(True)}),
+                     b"{\"a\":1,\"b\":true}")
+
+  def test_unserializable_object(self):
+    self.assertRaises(TypeError, get_codec("json").dumps, {"a": object()})
+
+  def test_custom_codec(self):
+    codec = JsonCodec()
+    self.assertIs(get_codec(codec), codec)
+
+  def test_invalid_codec(self):
+    self.assertRaises(CraftAiBadRequestError, get_codec, "not_a_json_library")
+    self.assertRaises(CraftAiBadRequestError, get_codec, 42)
+
+class TestIterJsonArray(unittest.TestCase):
+
+  def test_chunked_decoding(self):
+    operations = [
+      {"timestamp": 1458741230 + i, "context": {"presence": u"\u00e9t\u00e9", "count": i * 11}}
+      for i in range(50)
+    ] + [12345, None]
+    data = json.dumps(operations).encode("utf-8")
+    for size in [1, 7, 64, len(data)]:
+      chunks = [data[i:i + size] for i in range(0, len(data), size)]
+      self.assertEqual(list(iter_json_array(chunks)), operations)
+
+  def test_numbers_cut_by_chunks(self):
+    data = b"[1.5, -2e3, 4.25E-1, 7]"
+    for i in range(1, len(data)):
+      self.assertEqual(list(iter_json_array([data[:i], data[i:]])), [1.5, -2e3, 0.425, 7])
+    self.assertEqual(list(iter_json_array([b"[1.", b"5]"])), [1.5])
+    self.assertEqual(list(iter_json_array([b"[1e", b"5]"])), [1e5])
+
+  def test_empty_array(self):
+    self.assertEqual(list(iter_json_array([b" [ ", b"] "])), [])
+
+  def test_invalid_arrays(self):
+    for data in [b"[1, 2", b"{\"a\": 1}", b"[{\"a\": }]", b"[1 2]", b"[1,]", b"[,1]",
+                 b"[1.]", b"[1e]", b"[1.2.3]", b"[1]]"]:
+      self.assertRaises(ValueError, list, iter_json_array([data]))
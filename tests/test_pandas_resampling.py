@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from craftai.errors import CraftAiBadRequestError
+from craftai.pandas import resample_operations
+
+CONFIGURATION = {
+  "context": {
+    "presence": {"type": "enum"},
+    "lightIntensity": {"type": "continuous"},
+    "tz": {"type": "timezone"}
+  },
+  "output": ["presence"],
+  "time_quantum": 10
+}
+
+def sensor_df(count):
+  """One row per second"""
+  return pd.DataFrame({
+    "presence": ["none", "occupant", "occupant", "none"] * (count // 4),
+    "lightIntensity": np.arange(count, dtype=float),
+    "tz": "+02:00"
+  }, index=pd.date_range("2020-01-01 00:00:01", periods=count, freq="1s"))
+
+class TestResampleOperations(unittest.TestCase):
+
+  def test_defaults_to_time_quantum(self):
+    resampled_df = resample_operations(sensor_df(40), CONFIGURATION)
+    self.assertEqual(list(resampled_df.columns), ["presence", "lightIntensity", "tz"])
+    self.assertEqual(list(resampled_df.index),
+                     list(pd.date_range("2020-01-01 00:00:10", periods=4, freq="10s")))
+    # The interval ending at 10s holds the values at 1s to 10s
+    self.assertEqual(list(resampled_df["lightIntensity"]), [4.5, 14.5, 24.5, 34.5])
+    self.assertEqual(list(resampled_df["presence"]), ["occupant", "none", "occupant", "none"])
+    self.assertEqual(list(resampled_df["tz"]), ["+02:00"] * 4)
+
+  def test_aggregations(self):
+    df = sensor_df(40)
+    # Nothing between 11s and 30s, no presence after
+    df = df[(df.index <= "2020-01-01 00:00:10") | (df.index > "2020-01-01 00:00:30")].copy()
+    df.loc[df.index > "2020-01-01 00:00:30", "presence"] = None
+    resampled_df = resample_operations(df, CONFIGURATION, interval=10, aggregations={
+      "presence": "ffill",
+      "lightIntensity": "max",
+      "tz": "first"
+    })
+    self.assertEqual(list(resampled_df.index),
+                     list(pd.to_datetime(["2020-01-01 00:00:10", "2020-01-01 00:00:40"])))
+    self.assertEqual(list(resampled_df["lightIntensity"]), [9., 39.])
+    self.assertEqual(list(resampled_df["presence"]), ["occupant", "occupant"])
+
+  def test_empty_intervals_dropped(self):
+    df = sensor_df(40)
+    df = df[(df.index <= "2020-01-01 00:00:10") | (df.index > "2020-01-01 00:00:30")]
+    resampled_df = resample_operations(df, CONFIGURATION, interval=20)
+    self.assertEqual(list(resampled_df.index),
+                     list(pd.to_datetime(["2020-01-01 00:00:20", "2020-01-01 00:00:40"])))
+
+  def test_invalid_resampling(self):
+    df = sensor_df(40)
+    self.assertRaises(CraftAiBadRequestError, resample_operations, df, CONFIGURATION, 5)
+    self.assertRaises(CraftAiBadRequestError, resample_operations, df, CONFIGURATION,
+                      aggregations={"presence": "mean"})
+    self.assertRaises(CraftAiBadRequestError, resample_operations, df, CONFIGURATION,
+                      aggregations={"lightIntensity": "sum"})
+    self.assertRaises(CraftAiBadRequestError, resample_operations,
+                      df.assign(unknown=1), CONFIGURATION)
+    self.assertRaises(CraftAiBadRequestError, resample_operations,
+                      df.reset_index(drop=True), CONFIGURATION)
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from craftai.context_state import ContextStates
+from craftai.pandas.store import OperationsStore
+
+OPERATIONS = [
+  {
+    "timestamp": 1458741230 + 10 * i,
+    "context": dict(
+      [("lightIntensity", i * 0.5), ("occupants", i % 4), ("lightOn", i % 2 == 0)] +
+      ([("presence", ["occupant", "player"][i % 2])] if i % 3 == 0 else []) +
+      ([("tz", "+02:00")] if i == 0 else [])
+    )
+  } for i in range(50)
+]
+
+class FakeClient(object):
+  """Serves a growing operations list in chunks, like `iter_operations`"""
+  def __init__(self):
+    self.operations = []
+    self.starts = []
+
+  def iter_operations(self, agent_id, start=None, end=None, deadline=None):
+    #pylint: disable=W0613
+    self.starts.append(start)
+    operations = [operation for operation in self.operations
+                  if start is None or operation["timestamp"] >= start]
+    for i in range(0, len(operations), 7):
+      yield operations[i:i + 7]
+
+class TestOperationsStore(unittest.TestCase):
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.client = FakeClient()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def check_store(self, store):
+    self.client.operations = OPERATIONS[:30]
+    self.assertEqual(store.sync("agent"), 30)
+    self.client.operations = OPERATIONS
+    self.assertEqual(store.sync("agent"), 20)
+    self.assertEqual(store.sync("agent"), 0)
+    self.assertEqual(self.client.starts, [None, OPERATIONS[29]["timestamp"],
+                                          OPERATIONS[49]["timestamp"]])
+
+    df = store.read("agent")
+    self.assertEqual(len(df), 50)
+    self.assertEqual(df["lightIntensity"].tolist(), [i * 0.5 for i in range(50)])
+    self.assertEqual(df["presence"].notnull().tolist(), [i % 3 == 0 for i in range(50)])
+    self.assertEqual(df["presence"].iloc[3], "player")
+    self.assertEqual(df["tz"].notnull().sum(), 1)
+    self.assertEqual(df.first_valid_index(), pd.Timestamp("2016-03-23 13:53:50"))
+    self.assertEqual(df["occupants"].dtype, np.int64)
+    self.assertEqual(df["lightOn"].dtype, np.bool_)
+
+    timestamps, values = store.read_arrays("agent",
+                                           OPERATIONS[25]["timestamp"],
+                                           OPERATIONS[34]["timestamp"])
+    self.assertEqual(timestamps.tolist(), [op["timestamp"] for op in OPERATIONS[25:35]])
+    np.testing.assert_array_equal(values["lightIntensity"], [i * 0.5 for i in range(25, 35)])
+
+  def test_compressed_store(self):
+    self.check_store(OperationsStore(self.client, self.path, compress=True, segment_size=20))
+
+  def test_memory_mapped_store(self):
+    self.check_store(OperationsStore(self.client, self.path))
+
+  def test_empty_store(self):
+    store = OperationsStore(self.client, self.path)
+    self.assertIsNone(store.last_timestamp("agent"))
+    self.assertEqual(len(store.read("agent")), 0)
+
+  def test_operations_added_at_last_timestamp(self):
+    store = OperationsStore(self.client, self.path)
+    last_timestamp = OPERATIONS[9]["timestamp"]
+    self.client.operations = OPERATIONS[:10]
+    self.assertEqual(store.sync("agent"), 10)
+    self.client.operations = OPERATIONS[:10] + [
+      {"timestamp": last_timestamp, "context": {"lightIntensity": 42.}}] + OPERATIONS[10:12]
+    self.assertEqual(store.sync("agent"), 3)
+    self.assertEqual(store.read("agent")["lightIntensity"].tolist(),
+                     [i * 0.5 for i in range(10)] + [42., 5., 5.5])
+    # Integers mixed with missing values keep their type
+    context_states = ContextStates.from_arrays(*store.read_arrays("agent"))
+    occupants = context_states.get(last_timestamp)["context"]["occupants"]
+    self.assertEqual(occupants, OPERATIONS[9]["context"]["occupants"])
+    self.assertIs(type(occupants), int)
+
+  def test_interrupted_segment_write_ignored(self):
+    store = OperationsStore(self.client, self.path)
+    # Left by a sync interrupted before saving the manifest
+    os.makedirs(os.path.join(self.path, "agent", "00000000"))
+    self.client.operations = OPERATIONS[:10]
+    self.assertEqual(store.sync("agent"), 10)
+    self.assertEqual(len(store.read("agent")), 10)
@@ -0,0 +1,98 @@
+import threading
+import time
+import unittest
+
+from email.utils import formatdate
+
+from craftai.deadline import Deadline
+from craftai.errors import CraftAiTimeoutError
+from craftai.rate_limit import InFlightGovernor, RateLimiter, TokenBucket
+from craftai.rate_limit import endpoint_class, parse_retry_after
+
+class TestRateLimit(unittest.TestCase):
+
+  def test_token_bucket_paces_requests(self):
+    bucket = TokenBucket(rate=10, burst=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    self.assertEqual(waits[:2], [0., 0.])
+    self.assertAlmostEqual(waits[2], 0.1, places=2)
+    self.assertAlmostEqual(waits[3], 0.2, places=2)
+
+  def test_token_bucket_unlimited_until_rate_limited(self):
+    bucket = TokenBucket()
+    for _ in range(20):
+      self.assertEqual(bucket.reserve(), 0.)
+    bucket.on_rate_limited(0.5)
+    # Halved from the 20 requests sent during the last second
+    self.assertEqual(bucket.rate, 10.)
+    self.assertGreaterEqual(bucket.reserve(), 0.4)
+
+  def test_token_bucket_recovers_up_to_its_rate(self):
+    bucket = TokenBucket(rate=4)
+    bucket.on_rate_limited(0)
+    self.assertEqual(bucket.rate, 2)
+    for _ in range(1000):
+      bucket.on_success()
+    self.assertEqual(bucket.rate, 4)
+
+  def test_token_bucket_decreases_once_per_interval(self):
+    bucket = TokenBucket(rate=8)
+    for _ in range(5):
+      bucket.on_rate_limited(0)
+    self.assertEqual(bucket.rate, 4)
+
+  def test_in_flight_governor(self):
+    governor = InFlightGovernor(2)
+    self.assertTrue(governor.acquire())
+    self.assertTrue(governor.acquire())
+    self.assertFalse(governor.acquire(timeout=0.01))
+    threading.Timer(0.05, governor.release).start()
+    self.assertTrue(governor.acquire(timeout=1))
+
+  def test_rate_limiter_deadline(self):
+    limiter = RateLimiter(rate=1)
+    limiter.acquire("context")
+    limiter.release("context")
+    start = time.time()
+    self.assertRaises(CraftAiTimeoutError, limiter.acquire, "context", Deadline(0.1))
+    self.assertLess(time.time() - start, 0.1)
+
+  def test_token_kept_on_deadline(self):
+    limiter = RateLimiter(rate=10)
+    for _ in range(10):
+      limiter.acquire("context")
+      limiter.release("context")
+    for _ in range(5):
+      self.assertRaises(CraftAiTimeoutError, limiter.acquire, "context", Deadline(0.01))
+    # Waiting for a single token, the timed out acquisitions didn't take any
+    start = time.time()
+    limiter.acquire("context")
+    self.assertLess(time.time() - start, 0.3)
+
+  def test_token_bucket_cancel(self):
+    bucket = TokenBucket(rate=10, burst=1)
+    self.assertEqual(bucket.reserve(), 0.)
+    self.assertIsNone(bucket.reserve(max_wait=0.01))
+    bucket.cancel()
+    self.assertEqual(bucket.reserve(), 0.)
+
+  def test_rate_limiter_per_endpoint(self):
+    limiter = RateLimiter(rate=1, per_endpoint=True)
+    limiter.acquire("context", Deadline(0.1))
+    limiter.acquire("decision", Deadline(0.1))
+
+  def test_parse_retry_after(self):
+    self.assertEqual(parse_retry_after("2"), 2.)
+    self.assertEqual(parse_retry_after(None), 1.)
+    self.assertEqual(parse_retry_after("garbage"), 1.)
+    self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 30, usegmt=True)),
+                           30, delta=2)
+
+  def test_endpoint_class(self):
+    base = "https://beta.craft.ai/api/v1/owner/project/agents"
+    self.assertEqual(endpoint_class(base), "agents")
+    self.assertEqual(endpoint_class(base + "/my_agent"), "agents")
+    self.assertEqual(endpoint_class(base + "/my_agent/context?start=1"), "context")
+    self.assertEqual(endpoint_class(base + "/my_agent/context/state?t=1"), "context")
+    self.assertEqual(endpoint_class(base + "/my_agent/decision/tree?t=1"), "decision")
+    self.assertEqual(endpoint_class(base + "/my_agent/shared"), "shared")
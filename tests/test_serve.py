@@ -0,0 +1,141 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import craftai
+from craftai.errors import CraftAiDecisionError, CraftAiNotFoundError, CraftAiNullDecisionError
+from craftai.errors import CraftAiTimeoutError, CraftAiUnknownError
+from craftai.serve import DecideClient, DecisionServer
+from craftai.testing import FakeServer, generate_tree
+
+from .test_fake_server import CONFIGURATION, OPERATIONS
+
+TREE = generate_tree(CONFIGURATION, OPERATIONS)
+TIMESTAMP = OPERATIONS[-1]["timestamp"]
+ARGS = [{"presence": "none", "lightIntensity": 1.}]
+
+def random_args(rand):
+  args = [{"presence": rand.choice(["none", "occupant", "unknown"]),
+           "lightIntensity": rand.random() * 7}]
+  if rand.random() < 0.1:
+    del args[0]["lightIntensity"]
+  return args
+
+class TestDecideBatch(unittest.TestCase):
+
+  def test_same_results_as_decide(self):
+    rand = random.Random(0)
+    args_list = [random_args(rand) for _ in range(500)]
+
+    expected = []
+    for args in args_list:
+      try:
+        expected.append(craftai.Interpreter.decide(TREE, [dict(args[0])]))
+      except CraftAiDecisionError as e:
+        expected.append((type(e), e.message))
+
+    results = craftai.Interpreter.decide_batch(TREE, [[dict(args[0])] for args in args_list])
+    self.assertEqual([(type(result), result.message)
+                      if isinstance(result, CraftAiDecisionError) else result
+                      for result in results],
+                     expected)
+    self.assertTrue(any(isinstance(result, CraftAiNullDecisionError) for result in results))
+
+class TestDecisionServer(unittest.TestCase):
+
+  def setUp(self):
+    self.api = FakeServer().start()
+    self.api.set_tree("my_agent", TREE)
+    client = craftai.Client(self.api.client_config())
+    client.create_agent(CONFIGURATION, "my_agent")
+    self.client = client
+
+  def tearDown(self):
+    self.api.stop()
+
+  def check_concurrent_decisions(self, server):
+    decide_client = DecideClient(server.address)
+    rand = random.Random(1)
+    args_list = [random_args(rand) for _ in range(200)]
+    results = [None] * len(args_list)
+
+    def decide(worker):
+      for i in range(worker, len(args_list), 8):
+        try:
+          results[i] = decide_client.decide("my_agent", args_list[i][0], timestamp=TIMESTAMP)
+        except CraftAiDecisionError as e:
+          results[i] = (type(e), e.message)
+
+    workers = [threading.Thread(target=decide, args=(worker,)) for worker in range(8)]
+    for worker in workers:
+      worker.start()
+    for worker in workers:
+      worker.join()
+
+    expected = [(type(result), result.message)
+                if isinstance(result, CraftAiDecisionError) else result
+                for result in craftai.Interpreter.decide_batch(TREE, args_list)]
+    self.assertEqual(results, expected)
+    self.assertEqual(server.stats["requests"], len(args_list))
+    self.assertLess(server.stats["batches"], len(args_list))
+    # The tree is downloaded once for all the decisions
+    self.assertEqual(self.api.requests_counts["agents/decision/tree"], 1)
+
+  def test_tcp(self):
+    with DecisionServer(self.client, port=0, batch_window=0.01) as server:
+      self.check_concurrent_decisions(server)
+      self.assertRaises(CraftAiNotFoundError, DecideClient(server.address).decide,
+                        "unknown_agent", {"presence": "none"})
+
+  @unittest.skipIf(not hasattr(__import__("socket"), "AF_UNIX"), "no Unix sockets")
+  def test_unix_socket(self):
+    directory = tempfile.mkdtemp()
+    try:
+      with DecisionServer(self.client, unix_socket=os.path.join(directory, "craftai.sock"),
+                          batch_window=0.01) as server:
+        self.check_concurrent_decisions(server)
+    finally:
+      shutil.rmtree(directory)
+
+  def test_cold_tree_not_blocking(self):
+    self.client.create_agent(CONFIGURATION, "slow_agent")
+    self.api.set_tree("slow_agent", TREE)
+    self.api.latency = lambda method, path: 0.5 if "slow_agent" in path else 0.
+    with DecisionServer(self.client, port=0) as server:
+      server.decide("my_agent", TIMESTAMP, ARGS)
+      slow_results = []
+      slow = threading.Thread(target=lambda: slow_results.append(
+        server.decide("slow_agent", TIMESTAMP, ARGS)))
+      slow.start()
+      time.sleep(0.05)
+      start = time.time()
+      result = server.decide("my_agent", TIMESTAMP, ARGS)
+      self.assertLess(time.time() - start, 0.25)
+      self.assertRaises(CraftAiTimeoutError, server.decide, "slow_agent", TIMESTAMP,
+                        ARGS, 0.05)
+      slow.join()
+    self.assertEqual(slow_results, [result])
+
+  def test_unexpected_errors_answered(self):
+    def get_decision_tree(*_):
+      raise ValueError("Unexpected")
+    with DecisionServer(self.client, port=0) as server:
+      server.client.get_decision_tree = get_decision_tree
+      for _ in range(2):
+        self.assertRaises(CraftAiUnknownError, DecideClient(server.address).decide,
+                          "my_agent", ARGS[0], timestamp=TIMESTAMP)
+
+  def test_previous_tree_served_while_downloading(self):
+    with DecisionServer(self.client, port=0) as server:
+      result = server.decide("my_agent", TIMESTAMP, ARGS)
+      self.api.latency = lambda method, path: 0.5 if "decision" in path else 0.
+      next_timestamp = TIMESTAMP + server.client.config["decisionTreeCacheBucket"]
+      start = time.time()
+      self.assertEqual(server.decide("my_agent", next_timestamp, ARGS), result)
+      self.assertLess(time.time() - start, 0.25)
+      time.sleep(0.6)
+    self.assertEqual(self.api.requests_counts["agents/decision/tree"], 2)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import craftai
+from craftai.local_http import JSONConnection, JSONHandler, make_server
+from craftai.sidecar import OperationsSidecar
+from craftai.testing import FakeServer
+
+from .test_fake_server import CONFIGURATION, OPERATIONS
+
+@unittest.skipIf(not hasattr(socket, "AF_UNIX"), "no Unix sockets")
+class TestOperationsSidecar(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FakeServer().start()
+    self.client = craftai.Client(self.server.client_config())
+    self.client.create_agent(CONFIGURATION, "agent_1")
+    self.directory = tempfile.mkdtemp()
+    self.socket_path = os.path.join(self.directory, "sidecar.sock")
+    self.sidecar = OperationsSidecar(self.client, unix_socket=self.socket_path,
+                                     max_delay=10).start()
+    self.local_client = craftai.Client(
+      self.server.client_config(operationsSidecar=self.socket_path))
+
+  def tearDown(self):
+    self.sidecar.stop()
+    self.server.stop()
+    shutil.rmtree(self.directory)
+
+  def test_operations_merged_by_timestamp(self):
+    # Workers interleave their operations for the same agent
+    def work(offset):
+      local_client = craftai.Client(
+        self.server.client_config(operationsSidecar=self.socket_path))
+      for start in range(offset, 800, 40):
+        local_client.add_operations("agent_1", OPERATIONS[start:start + 10])
+
+    workers = [threading.Thread(target=work, args=(offset,)) for offset in range(0, 40, 10)]
+    for worker in workers:
+      worker.start()
+    for worker in workers:
+      worker.join()
+    self.assertEqual(self.server.requests_counts.get("agents/context", 0), 0)
+
+    self.assertTrue(self.sidecar.buffer.flush())
+    self.assertEqual(self.server.requests_counts["agents/context"], 1)
+    self.assertEqual(self.sidecar.stats, {"requests": 80, "operations": 800})
+    self.assertEqual(self.client.get_operations_list("agent_1"), OPERATIONS[:800])
+
+  def test_operations_posted_by_chunks(self):
+    local_client = craftai.Client(self.server.client_config(
+      operationsSidecar=self.socket_path, operationsChunksSize=100))
+    local_client.add_operations("agent_1", (operation for operation in OPERATIONS[:250]))
+    self.assertEqual(self.sidecar.stats, {"requests": 3, "operations": 250})
+
+  def test_invalid_operations_rejected(self):
+    self.assertRaises(craftai.errors.CraftAiBadRequestError,
+                      self.local_client.add_operations, "agent_1", [{"context": {}}])
+    self.assertEqual(self.sidecar.stats["operations"], 0)
+
+  def test_other_project_rejected(self):
+    other_client = craftai.Client(self.server.client_config(
+      project="other", operationsSidecar=self.socket_path))
+    self.assertRaises(craftai.errors.CraftAiBadRequestError,
+                      other_client.add_operations, "agent_1", OPERATIONS[:1])
+
+  def test_unreachable_sidecar(self):
+    local_client = craftai.Client(self.server.client_config(
+      operationsSidecar=os.path.join(self.directory, "missing.sock")))
+    self.assertRaises(craftai.errors.CraftAiNetworkError,
+                      local_client.add_operations, "agent_1", OPERATIONS[:1])
+
+class _SlowHandler(JSONHandler):
+  def do_POST(self): #pylint: disable=C0103
+    self.server.posts += 1
+    body = self.read_json()
+    time.sleep(body.get("sleep", 0))
+    # The connection is closed without telling the client
+    self.close_connection = True #pylint: disable=W0201
+    self.respond(200, body)
+
+class TestJSONConnection(unittest.TestCase):
+
+  def setUp(self):
+    self.httpd = make_server(_SlowHandler, "127.0.0.1", 0)
+    self.httpd.posts = 0
+    self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.1,))
+    self.thread.start()
+    self.connection = JSONConnection("http://127.0.0.1:{}".format(self.httpd.server_address[1]),
+                                     10.)
+
+  def tearDown(self):
+    self.httpd.shutdown()
+    self.thread.join()
+    self.httpd.server_close()
+
+  def test_closed_connection_reopened(self):
+    for i in range(3):
+      self.assertEqual(self.connection.post("/", {"i": i}), (200, {"i": i}))
+    self.assertEqual(self.httpd.posts, 3)
+
+  def test_timed_out_request_not_sent_again(self):
+    self.assertRaises(craftai.errors.CraftAiTimeoutError,
+                      self.connection.post, "/", {"sleep": 0.3}, 0.05)
+    time.sleep(0.3)
+    self.assertEqual(self.httpd.posts, 1)
@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+
+from craftai.deadline import Deadline
+from craftai.errors import CraftAiTimeoutError
+from craftai.singleflight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+
+  def run_concurrently(self, single_flight, function, count=10):
+    results = []
+    def target():
+      try:
+        results.append(single_flight.call("key", function))
+      except ValueError as e:
+        results.append(e)
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    return results
+
+  def test_concurrent_calls_shared(self):
+    calls = []
+    def function():
+      calls.append(1)
+      time.sleep(0.1)
+      return "result"
+    results = self.run_concurrently(SingleFlight(), function)
+    self.assertEqual(len(calls), 1)
+    self.assertEqual(sorted(results), [("result", False)] + [("result", True)] * 9)
+
+  def test_errors_shared(self):
+    def function():
+      time.sleep(0.1)
+      raise ValueError("failure")
+    results = self.run_concurrently(SingleFlight(), function)
+    self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+  def test_sequential_calls_not_shared(self):
+    single_flight = SingleFlight()
+    self.assertEqual(single_flight.call("key", lambda: 1), (1, False))
+    self.assertEqual(single_flight.call("key", lambda: 2), (2, False))
+
+  def test_waiters_bounded_by_deadline(self):
+    single_flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=single_flight.call, args=("key", release.wait))
+    leader.start()
+    time.sleep(0.05)
+    try:
+      self.assertRaises(CraftAiTimeoutError, single_flight.call, "key", lambda: 1,
+                        Deadline(0.05))
+    finally:
+      release.set()
+      leader.join()
+
+  def test_interruptions_shared(self):
+    def function():
+      time.sleep(0.1)
+      raise KeyboardInterrupt()
+    results = []
+    def target():
+      try:
+        results.append(single_flight.call("key", function))
+      except KeyboardInterrupt as e:
+        results.append(e)
+    single_flight = SingleFlight()
+    threads = [threading.Thread(target=target) for _ in range(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(len(results), 5)
+    self.assertTrue(all(isinstance(result, KeyboardInterrupt) for result in results))
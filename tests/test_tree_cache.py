@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+import craftai
+from craftai.testing import fake_token
+from craftai.tree_cache import DiskTreeCache, MemoryTreeCache
+
+TOKEN = fake_token("owner", "project", "http://localhost")
+
+TREE = {"_version": "1.1.0", "trees": {}, "configuration": {}}
+
+class CountingClient(craftai.Client):
+  """Client serving trees without the API, counting the retrievals"""
+  def __init__(self, cfg):
+    super(CountingClient, self).__init__(cfg)
+    self.retrievals = 0
+
+  def _get_decision_tree(self, _agent_id, timestamp, _deadline):
+    self.retrievals += 1
+    return dict(TREE, timestamp=timestamp)
+
+class TestTreeCaches(unittest.TestCase):
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_caches(self):
+    for cache in [MemoryTreeCache(), DiskTreeCache(self.path)]:
+      self.assertIsNone(cache.get(("agent/1", 12)))
+      cache.set(("agent/1", 12), TREE, 42.)
+      cache.set(("agent_2", 12), TREE, 43.)
+      self.assertEqual(cache.get(("agent/1", 12)), (TREE, 42.))
+      cache.invalidate("agent/1")
+      self.assertIsNone(cache.get(("agent/1", 12)))
+      self.assertEqual(cache.get(("agent_2", 12)), (TREE, 43.))
+
+  def test_least_recently_used_evicted(self):
+    cache = MemoryTreeCache(max_entries=2)
+    cache.set(("agent", 1), TREE, 42.)
+    cache.set(("agent", 2), TREE, 42.)
+    cache.get(("agent", 1))
+    cache.set(("agent", 3), TREE, 42.)
+    self.assertIsNone(cache.get(("agent", 2)))
+    self.assertEqual(cache.get(("agent", 1)), (TREE, 42.))
+    self.assertEqual(cache.get(("agent", 3)), (TREE, 42.))
+
+class TestClientTreeCache(unittest.TestCase):
+
+  def test_cached_by_bucket(self):
+    client = CountingClient({
+      "token": TOKEN,
+      "decisionTreeCache": MemoryTreeCache(),
+      "decisionTreeCacheBucket": 100
+    })
+    self.assertEqual(client.get_decision_tree("agent", 1000)["timestamp"], 1000)
+    self.assertEqual(client.get_decision_tree("agent", 1099)["timestamp"], 1000)
+    self.assertEqual(client.get_decision_tree("agent", 1100)["timestamp"], 1100)
+    self.assertEqual(client.retrievals, 2)
+    self.assertEqual(client.stats["decision_tree_cache_hits"], 1)
+    self.assertEqual(client.cached_decision_tree("agent", 1150)["timestamp"], 1100)
+    self.assertIsNone(client.cached_decision_tree("agent", 1200))
+    self.assertEqual(client.retrievals, 2)
+
+  def test_stale_tree_refreshed_in_background(self):
+    cache = MemoryTreeCache()
+    client = CountingClient({
+      "token": TOKEN,
+      "decisionTreeCache": cache,
+      "decisionTreeCacheTtl": 10
+    })
+    cache.set(("agent", 0), TREE, time.time() - 20)
+    self.assertEqual(client.get_decision_tree("agent", 10), TREE)
+    for _ in range(100):
+      if cache.get(("agent", 0))[0] != TREE:
+        break
+      time.sleep(0.01)
+    self.assertEqual(cache.get(("agent", 0))[0]["timestamp"], 10)
+    self.assertEqual(client.retrievals, 1)
+
+  def test_refresh_errors_counted(self):
+    cache = MemoryTreeCache()
+    client = CountingClient({
+      "token": TOKEN,
+      "decisionTreeCache": cache,
+      "decisionTreeCacheTtl": 10
+    })
+    def broken_get(_agent_id, _timestamp, _deadline):
+      raise ValueError("Unexpected tree")
+    client._get_decision_tree = broken_get #pylint: disable=W0212
+    cache.set(("agent", 0), TREE, time.time() - 20)
+    self.assertEqual(client.get_decision_tree("agent", 10), TREE)
+    for _ in range(100):
+      if client.stats["decision_tree_cache_refresh_errors"]:
+        break
+      time.sleep(0.01)
+    self.assertEqual(client.stats["decision_tree_cache_refresh_errors"], 1)
+    self.assertEqual(cache.get(("agent", 0))[0], TREE)
+
+  def test_invalidation(self):
+    client = CountingClient({"token": TOKEN, "decisionTreeCache": MemoryTreeCache()})
+    client.get_decision_tree("agent", 1000)
+    client._invalidate_decision_trees("agent") #pylint: disable=W0212
+    client.get_decision_tree("agent", 1000)
+    self.assertEqual(client.retrievals, 2)